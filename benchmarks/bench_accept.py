@@ -0,0 +1,89 @@
+"""Benchmark connection storm: time to accept N simultaneous clients
+
+All clients start non-blocking connect at once (as CI jobs reconnecting
+after restart), measured is time until server accepted all of them.
+
+Configurations:
+- single: backlog 1 and one accept per wakeup (previous behaviour)
+- batch: default backlog and all pending connections accepted per wakeup
+- batch-N: default backlog, at most N connections accepted per wakeup
+
+Usage: python -m benchmarks.bench_accept [--clients N,N] [--backend NAME]
+"""
+
+import argparse as _argparse
+import logging as _logging
+import os as _os
+import socket as _socket
+import threading as _threading
+import time as _time
+
+import benchmarks.bench_event_loop as _bench_event_loop
+import ser2tcp.serial_proxy as _serial_proxy
+
+TIMEOUT = 10
+
+CONFIGURATIONS = {
+    'single': {'accept_batch': 1, 'socket_options': {'backlog': 1}},
+    'batch': {},
+    'batch-16': {'accept_batch': 16},
+}
+
+
+def run_storm(backend, configuration, clients_count):
+    """Return (seconds to accept all clients or None, accepted count)"""
+    master, slave, path = _bench_event_loop.open_pty()
+    server_config = {'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0}
+    server_config.update(CONFIGURATIONS[configuration])
+    config = {
+        'serial': {'port': path, 'baudrate': 115200},
+        'servers': [server_config],
+    }
+    proxy = _serial_proxy.SerialProxy(config, _logging.getLogger('bench'))
+    manager = _bench_event_loop.create_manager(backend)
+    manager.add_server(proxy)
+    address = proxy.servers[0]._socket.getsockname()
+    thread = _threading.Thread(target=manager.run, daemon=True)
+    thread.start()
+    clients = []
+    start = _time.perf_counter()
+    for _ in range(clients_count):
+        client = _socket.socket()
+        client.setblocking(False)
+        client.connect_ex(address)
+        clients.append(client)
+    elapsed = None
+    while _time.perf_counter() - start < TIMEOUT:
+        if proxy.total_connections() >= clients_count:
+            elapsed = _time.perf_counter() - start
+            break
+        _time.sleep(.001)
+    accepted = proxy.total_connections()
+    for client in clients:
+        client.close()
+    manager.stop()
+    thread.join()
+    _os.close(master)
+    _os.close(slave)
+    return elapsed, accepted
+
+
+def main():
+    """Run benchmark for all configurations"""
+    parser = _argparse.ArgumentParser()
+    parser.add_argument('--clients', default='10,100,200')
+    parser.add_argument('--backend', default='selectors')
+    args = parser.parse_args()
+    print(
+        f"{'configuration':14} {'clients':>8} {'accepted':>9} "
+        f"{'accept ms':>10}")
+    for clients in [int(i) for i in args.clients.split(',')]:
+        for configuration in CONFIGURATIONS:
+            elapsed, accepted = run_storm(args.backend, configuration, clients)
+            result = f"{elapsed * 1000:10.1f}" if elapsed is not None \
+                else f"{'timeout':>10}"
+            print(f"{configuration:14} {clients:8} {accepted:9} {result}")
+
+
+if __name__ == '__main__':
+    main()
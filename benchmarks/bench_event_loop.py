@@ -0,0 +1,131 @@
+"""Benchmark event loop backends: serial -> TCP fan-out throughput
+
+Serial port is emulated by pty pair (Linux/macOS), data written to pty
+master is forwarded by ser2tcp to all connected TCP clients.
+
+Usage: python -m benchmarks.bench_event_loop [--size MB] [--clients N,N]
+"""
+
+import argparse as _argparse
+import asyncio as _asyncio
+import logging as _logging
+import os as _os
+import selectors as _selectors
+import socket as _socket
+import threading as _threading
+import time as _time
+import tty as _tty
+
+import ser2tcp.serial_proxy as _serial_proxy
+import ser2tcp.server_manager as _server_manager
+import ser2tcp.server_manager_asyncio as _server_manager_asyncio
+
+CHUNK = 4096
+
+
+def create_manager(backend):
+    """Create servers manager for backend name"""
+    if backend == 'asyncio':
+        return _server_manager_asyncio.AsyncioServersManager(
+            loop=_asyncio.new_event_loop())
+    if backend == 'uvloop':
+        import uvloop as _uvloop  # pylint: disable=C0415
+        return _server_manager_asyncio.AsyncioServersManager(
+            loop=_uvloop.new_event_loop())
+    return _server_manager.ServersManager(backend)
+
+
+def available_backends():
+    """Return list of backends available on this system"""
+    backends = ['select', 'selectors', 'asyncio']
+    try:
+        import uvloop as _uvloop  # pylint: disable=C0415,W0611
+        backends.append('uvloop')
+    except ImportError:
+        pass
+    return backends
+
+
+def open_pty():
+    """Return (master fd, slave device path) of raw pty pair"""
+    master, slave = _os.openpty()
+    _tty.setraw(master)
+    path = _os.ttyname(slave)
+    return master, slave, path
+
+
+def receive_all(clients, total):
+    """Read from all clients until each received total bytes"""
+    selector = _selectors.DefaultSelector()
+    received = {}
+    for client in clients:
+        client.setblocking(False)
+        selector.register(client, _selectors.EVENT_READ)
+        received[client] = 0
+    remaining = len(clients)
+    while remaining:
+        for key, _ in selector.select(5):
+            data = key.fileobj.recv(65536)
+            if not data:
+                raise RuntimeError("client disconnected")
+            received[key.fileobj] += len(data)
+            if received[key.fileobj] >= total:
+                selector.unregister(key.fileobj)
+                remaining -= 1
+    selector.close()
+
+
+def run_fanout(backend, clients_count, size):
+    """Return seconds to deliver size bytes from serial to all clients"""
+    master, slave, path = open_pty()
+    config = {
+        'serial': {'port': path, 'baudrate': 115200},
+        'servers': [{
+            'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0}],
+    }
+    log = _logging.getLogger('bench')
+    proxy = _serial_proxy.SerialProxy(config, log)
+    manager = create_manager(backend)
+    manager.add_server(proxy)
+    address = proxy.servers[0]._socket.getsockname()
+    thread = _threading.Thread(target=manager.run, daemon=True)
+    thread.start()
+    clients = [
+        _socket.create_connection(address) for _ in range(clients_count)]
+    while proxy.total_connections() < clients_count:
+        _time.sleep(.01)
+    payload = bytes(range(256)) * (CHUNK // 256)
+    start = _time.perf_counter()
+    writer = _threading.Thread(target=lambda: [
+        _os.write(master, payload) for _ in range(size // CHUNK)])
+    writer.start()
+    receive_all(clients, size // CHUNK * CHUNK)
+    elapsed = _time.perf_counter() - start
+    writer.join()
+    for client in clients:
+        client.close()
+    manager.stop()
+    thread.join()
+    _os.close(master)
+    _os.close(slave)
+    return elapsed
+
+
+def main():
+    """Run benchmark for all backends"""
+    parser = _argparse.ArgumentParser()
+    parser.add_argument('--size', type=float, default=4, help="MB")
+    parser.add_argument('--clients', default='1,10,50')
+    args = parser.parse_args()
+    size = int(args.size * 1024 * 1024)
+    print(f"{'backend':10} {'clients':>8} {'MB/s':>10} {'fan-out MB/s':>14}")
+    for clients in [int(i) for i in args.clients.split(',')]:
+        for backend in available_backends():
+            elapsed = run_fanout(backend, clients, size)
+            rate = size / elapsed / 1024 / 1024
+            print(f"{backend:10} {clients:8} {rate:10.1f} "
+                f"{rate * clients:14.1f}")
+
+
+if __name__ == '__main__':
+    main()
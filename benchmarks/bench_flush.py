@@ -0,0 +1,119 @@
+"""Benchmark Connection.flush: bytearray buffer vs chunks with sendmsg
+
+Output buffer of one connection is filled with small chunks (as read from
+serial port) up to buffer_limit, then drained through socketpair read by
+other thread. Measured are wall time and CPU time of sending thread.
+
+Implementations:
+- bytearray: previous implementation, extend() and del buf[:sent]
+- chunks: deque of chunks, send() of first chunk (joined small chunks)
+- sendmsg: deque of chunks, sendmsg() with up to IOV_MAX chunks
+
+Usage: python -m benchmarks.bench_flush [--chunk BYTES] [--limits K,K]
+"""
+
+import argparse as _argparse
+import logging as _logging
+import socket as _socket
+import threading as _threading
+import time as _time
+
+import ser2tcp.connection as _connection
+
+TOTAL = 64 * 1024 * 1024
+
+
+class BytearrayConnection(_connection.Connection):
+    """Connection with previous bytearray output buffer"""
+
+    def __init__(self, connection, buffer_limit=None, log=None):
+        super().__init__(connection, buffer_limit=buffer_limit, log=log)
+        self._out_buffer = bytearray()
+
+    def send(self, data):
+        if self._buffer_limit \
+                and len(self._out_buffer) + len(data) > self._buffer_limit:
+            return None
+        self._out_buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        sent = self._socket.send(self._out_buffer)
+        del self._out_buffer[:sent]
+        return sent
+
+    def has_pending_data(self):
+        return bool(self._out_buffer)
+
+
+class ChunksConnection(_connection.Connection):
+    """Connection with chunks but without sendmsg()"""
+
+    SENDMSG = False
+
+
+IMPLEMENTATIONS = {
+    'bytearray': BytearrayConnection,
+    'chunks': ChunksConnection,
+    'sendmsg': _connection.Connection,
+}
+
+
+def drain(sock, total):
+    """Receive total bytes"""
+    buf = bytearray(1024 * 1024)
+    while total > 0:
+        received = sock.recv_into(buf)
+        if not received:
+            break
+        total -= received
+
+
+def run(implementation, buffer_limit, chunk_size):
+    """Return (wall seconds, cpu seconds) to send TOTAL bytes"""
+    sock_a, sock_b = _socket.socketpair()
+    con = IMPLEMENTATIONS[implementation](
+        (sock_a, ('bench', 0)), buffer_limit=buffer_limit,
+        log=_logging.getLogger('bench'))
+    chunk = bytes(chunk_size)
+    chunks_per_fill = buffer_limit // chunk_size
+    fills = max(1, TOTAL // (chunks_per_fill * chunk_size))
+    reader = _threading.Thread(
+        target=drain, args=(sock_b, fills * chunks_per_fill * chunk_size))
+    reader.start()
+    start = _time.perf_counter()
+    start_cpu = _time.thread_time()
+    for _ in range(fills):
+        for _ in range(chunks_per_fill):
+            con.send(chunk)
+        while con.has_pending_data():
+            con.flush()
+    cpu = _time.thread_time() - start_cpu
+    wall = _time.perf_counter() - start
+    reader.join()
+    sock_a.close()
+    sock_b.close()
+    return wall, cpu, fills * chunks_per_fill * chunk_size
+
+
+def main():
+    """Run benchmark for all implementations and buffer limits"""
+    parser = _argparse.ArgumentParser()
+    parser.add_argument('--chunk', type=int, default=256, help="bytes")
+    parser.add_argument(
+        '--limits', default='64,1024,16384', help="buffer_limit in KiB")
+    args = parser.parse_args()
+    print(
+        f"{'implementation':15} {'limit KiB':>10} {'MB/s':>8} "
+        f"{'CPU s/GB':>9}")
+    for limit in [int(i) * 1024 for i in args.limits.split(',')]:
+        for implementation in IMPLEMENTATIONS:
+            wall, cpu, size = run(implementation, limit, args.chunk)
+            print(
+                f"{implementation:15} {limit // 1024:10} "
+                f"{size / wall / 1024 / 1024:8.1f} "
+                f"{cpu / size * 1024 ** 3:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
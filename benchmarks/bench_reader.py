@@ -0,0 +1,193 @@
+"""Benchmark reading serial ports without file descriptor
+
+Ports without fileno() (RFC 2217, loop://, Windows) are emulated by
+in-memory port with blocking read() and in_waiting, feeder thread writes
+data to all ports. Measured are wall time and CPU time (all threads) until
+event loop received all data, and CPU time of 1 second without data.
+
+Implementations:
+- thread: previous implementation, reader thread and socketpair per port
+- pool: shared reader pool, one thread and event loop wakeup
+
+Usage: python -m benchmarks.bench_reader [--ports N,N] [--size KB]
+"""
+
+import argparse as _argparse
+import collections as _collections
+import socket as _socket
+import threading as _threading
+import time as _time
+
+import ser2tcp.read_buffer as _read_buffer
+import ser2tcp.reader_pool as _reader_pool
+import ser2tcp.server_manager as _server_manager
+
+CHUNK = 256  # bytes written to port at once (as received from device)
+IDLE_TIME = 1.
+
+
+class MemoryPort():
+    """Serial port without file descriptor, data fed by feed()"""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._cond = _threading.Condition()
+        self._open = True
+
+    @property
+    def in_waiting(self):
+        """Return number of waiting bytes"""
+        return len(self._data)
+
+    def feed(self, data):
+        """Data received from device"""
+        with self._cond:
+            self._data.extend(data)
+            self._cond.notify()
+
+    def read(self, size=1):
+        """Blocking read of at least one byte, empty if closed"""
+        with self._cond:
+            while not self._data and self._open:
+                self._cond.wait()
+            data = bytes(self._data[:size])
+            del self._data[:size]
+            return data
+
+    def close(self):
+        """Close port, wake blocked read()"""
+        with self._cond:
+            self._open = False
+            self._cond.notify()
+
+
+class ThreadBridge():
+    """Previous implementation: reader thread and socketpair per port"""
+
+    def __init__(self, port, loop, on_data):
+        self._port = port
+        self._running = True
+        self._sock_r, self._sock_w = _socket.socketpair()
+        self._sock_r.setblocking(False)
+        self._read_buffer = _read_buffer.ReadBuffer()
+        self._on_data = on_data
+        self._loop = loop
+        loop.register(self._sock_r, self._process)
+        self._thread = _threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            data = self._port.read(size=max(1, self._port.in_waiting))
+            if data:
+                self._sock_w.sendall(data)
+
+    def _process(self):
+        while True:
+            try:
+                view = self._read_buffer.recv_into(self._sock_r)
+            except BlockingIOError:
+                return
+            self._on_data(bytes(view))
+
+    def close(self):
+        """Stop thread and close socketpair"""
+        self._running = False
+        self._port.close()
+        self._thread.join()
+        self._loop.unregister(self._sock_r)
+        self._sock_r.close()
+        self._sock_w.close()
+
+
+class PoolBridge():
+    """Shared reader pool"""
+
+    def __init__(self, port, loop, on_data):
+        self._port = port
+        self._on_data = on_data
+        self._pool = _reader_pool.shared_pool()
+        self._reader = self._pool.add(port, loop, self._process)
+
+    def _process(self):
+        while True:
+            data = self._reader.read()
+            if data is None:
+                return
+            self._on_data(data)
+
+    def close(self):
+        """Remove port from pool"""
+        self._pool.remove(self._reader)
+        self._port.close()
+
+
+BRIDGES = {
+    'thread': ThreadBridge,
+    'pool': PoolBridge,
+}
+
+
+def feed(ports, size):
+    """Write size bytes to every port in CHUNK pieces"""
+    chunk = b'x' * CHUNK
+    for _ in range(size // CHUNK):
+        for port in ports:
+            port.feed(chunk)
+
+
+def run(bridge_name, ports_count, size):
+    """Return (wall s, CPU s, idle CPU s, wakeups) of one run"""
+    manager = _server_manager.ServersManager()
+    received = _collections.Counter()
+    wakeups = 0
+
+    def on_data(data):
+        received['bytes'] += len(data)
+
+    ports = [MemoryPort() for _ in range(ports_count)]
+    bridges = []
+    for port in ports:
+        bridges.append(BRIDGES[bridge_name](port, manager, on_data))
+    total = ports_count * size
+    cpu_start = _time.process_time()
+    start = _time.perf_counter()
+    feeder = _threading.Thread(target=feed, args=(ports, size))
+    feeder.start()
+    while received['bytes'] < total:
+        manager.process()
+        wakeups += 1
+    elapsed = _time.perf_counter() - start
+    cpu = _time.process_time() - cpu_start
+    feeder.join()
+    idle_start = _time.process_time()
+    _time.sleep(IDLE_TIME)
+    idle = _time.process_time() - idle_start
+    for bridge in bridges:
+        bridge.close()
+    manager.close()
+    return elapsed, cpu, idle, wakeups
+
+
+def main():
+    """Run benchmark for all implementations"""
+    parser = _argparse.ArgumentParser()
+    parser.add_argument('--ports', default='8,64')
+    parser.add_argument('--size', type=int, default=256, help='KB per port')
+    args = parser.parse_args()
+    size = args.size * 1024
+    print(
+        f"{'bridge':8} {'ports':>6} {'MB/s':>8} {'cpu s':>7} "
+        f"{'idle cpu %':>11} {'loop wakeups':>13} {'threads':>8}")
+    for ports in [int(i) for i in args.ports.split(',')]:
+        for name in BRIDGES:
+            threads = ports if name == 'thread' else 1
+            elapsed, cpu, idle, wakeups = run(name, ports, size)
+            speed = ports * size / elapsed / 1e6
+            print(
+                f"{name:8} {ports:6} {speed:8.1f} {cpu:7.2f} "
+                f"{idle / IDLE_TIME * 100:11.1f} {wakeups:13} {threads:8}")
+
+
+if __name__ == '__main__':
+    main()
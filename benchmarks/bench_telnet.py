@@ -0,0 +1,118 @@
+"""Benchmark telnet parser ConnectionTelnet.on_received
+
+Received data are parsed in chunks (as read from socket) and forwarded to
+serial proxy stub, which only counts bytes. Measured is throughput of
+received data in MB/s.
+
+Inputs:
+- text: printable text with IAC IAC every ~1 kB (typical terminal input)
+- binary: random bytes (escaped IAC in every ~128 bytes on average)
+- all_iac: only escaped IAC (worst case, binary upload of 0xff bytes)
+
+Implementations:
+- pop: previous implementation, bytearray with pop(0) and del data[:i]
+- offset: single pass over memoryview with matched data runs
+
+Usage: python -m benchmarks.bench_telnet [--chunk BYTES] [--size MB]
+"""
+
+import argparse as _argparse
+import logging as _logging
+import random as _random
+import socket as _socket
+import time as _time
+
+import ser2tcp.connection_telnet as _connection_telnet
+
+
+class SerialStub():
+    """Serial proxy counting sent bytes"""
+
+    def __init__(self):
+        self.size = 0
+
+    def send(self, data, source=None, priority=0):
+        """Count data sent to serial port"""
+        self.size += len(data)
+
+
+class PopTelnet(_connection_telnet.ConnectionTelnet):
+    """Previous implementation with pop(0) and del data[:index + 1]"""
+
+    def on_received(self, data):
+        data = bytearray(data)
+        while data:
+            if self._telnet_iac:
+                self._telnet_iac = False
+                self._process_iac(data.pop(0))
+                continue
+            if self._telnet_state in self.TELNET_OPTION_CODES:
+                self._telnet_command(self._telnet_state, data.pop(0))
+                self._telnet_state = None
+                continue
+            if self.TELNET_IAC in data:
+                index = data.index(self.TELNET_IAC)
+                if index > 0:
+                    self._send_data(data[:index])
+                del data[:index + 1]
+                self._telnet_iac = True
+            else:
+                self._send_data(data)
+                break
+
+
+IMPLEMENTATIONS = {
+    'pop': PopTelnet,
+    'offset': _connection_telnet.ConnectionTelnet,
+}
+
+
+def make_input(name, size):
+    """Return escaped telnet stream of about size bytes"""
+    rnd = _random.Random(0)
+    if name == 'text':
+        line = b'The quick brown fox jumps over the lazy dog 0123456789\r\n'
+        data = bytearray()
+        while len(data) < size:
+            data += line * 18 + b'\xff'
+        data = bytes(data[:size])
+    elif name == 'binary':
+        data = bytes(rnd.getrandbits(8) for _ in range(size))
+    else:
+        data = b'\xff' * (size // 2)
+    return data.replace(b'\xff', b'\xff\xff')[:size]
+
+
+def run(impl_name, data, chunk):
+    """Return MB/s of parsing data in chunks"""
+    sock_a, sock_b = _socket.socketpair()
+    serial = SerialStub()
+    con = IMPLEMENTATIONS[impl_name](
+        (sock_a, ('127.0.0.1', 0)), serial, log=_logging.getLogger('bench'))
+    view = memoryview(data)
+    start = _time.perf_counter()
+    for pos in range(0, len(data), chunk):
+        con.on_received(view[pos:pos + chunk])
+    elapsed = _time.perf_counter() - start
+    con.close()
+    sock_b.close()
+    return len(data) / elapsed / 1e6
+
+
+def main():
+    """Run benchmark for all inputs and implementations"""
+    parser = _argparse.ArgumentParser()
+    parser.add_argument('--chunk', type=int, default=4096)
+    parser.add_argument('--size', type=int, default=4, help='MB of input')
+    args = parser.parse_args()
+    size = args.size * 1024 * 1024
+    print(f"{'input':8} {'parser':8} {'MB/s':>10}")
+    for name in ('text', 'binary', 'all_iac'):
+        data = make_input(name, size)
+        for impl_name in IMPLEMENTATIONS:
+            speed = run(impl_name, data, args.chunk)
+            print(f"{name:8} {impl_name:8} {speed:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
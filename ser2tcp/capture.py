@@ -0,0 +1,307 @@
+"""Capture - serial traffic recorded to segment files on disk
+
+Segment file is sequence of records, record header '<dBI' is time of
+reception (Unix time), direction (1=TX, 2=RX) and data length, data
+follow. Sparse index file next to segment has entries '<dQ' (time, offset
+of record) written at segment start and every index_interval bytes, so
+time range is found by binary search of segment names and index entries.
+Segment name is its start time in microseconds, sorted names are sorted
+by time.
+"""
+
+import bisect as _bisect
+import collections as _collections
+import logging as _logging
+import os as _os
+import struct as _struct
+import threading as _threading
+import time as _time
+
+RECORD = _struct.Struct('<dBI')
+INDEX_ENTRY = _struct.Struct('<dQ')
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+SEGMENT_SIZE = 16777216
+SEGMENT_TIME = 3600.
+INDEX_INTERVAL = 65536
+READ_LIMIT = 16777216  # max bytes of records returned by read_range()
+
+
+def validate_config(config):
+    """Validate capture of port config, return error string or None"""
+    if 'capture' not in config:
+        return None
+    capture = config['capture']
+    if not isinstance(capture, dict):
+        return 'capture must be object'
+    if not isinstance(capture.get('path'), str) or not capture['path']:
+        return 'capture.path required'
+    for key in ('segment_size', 'index_interval'):
+        value = capture.get(key, 1)
+        if isinstance(value, bool) or not isinstance(value, int) \
+                or value <= 0:
+            return f'capture.{key} must be positive integer'
+    value = capture.get('segment_time', 1)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) \
+            or value <= 0:
+        return 'capture.segment_time must be positive number'
+    value = capture.get('max_segments', 0)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        return 'capture.max_segments must be non-negative integer'
+    return None
+
+
+def _segment_name(start):
+    """Return file name of segment started at start (microseconds)"""
+    return f'{start:016d}{SEGMENT_SUFFIX}'
+
+
+def _segments(path):
+    """Return sorted start times (microseconds) of segments in directory"""
+    starts = []
+    for name in _os.listdir(path):
+        if name.endswith(SEGMENT_SUFFIX) \
+                and name[:-len(SEGMENT_SUFFIX)].isdigit():
+            starts.append(int(name[:-len(SEGMENT_SUFFIX)]))
+    starts.sort()
+    return starts
+
+
+def _find_offset(index_path, since):
+    """Return offset of indexed record before since (binary search)"""
+    try:
+        index = open(index_path, 'rb')  # pylint: disable=R1732
+    except FileNotFoundError:
+        return 0
+    with index:
+        count = _os.fstat(index.fileno()).st_size // INDEX_ENTRY.size
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            index.seek(middle * INDEX_ENTRY.size)
+            when, _ = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+            if when < since:
+                low = middle + 1
+            else:
+                high = middle
+        if not low:
+            return 0
+        index.seek((low - 1) * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))[1]
+
+
+def read_range(path, since=None, until=None, limit=READ_LIMIT):
+    """Return records received between since and until (Unix time)
+
+    Result is in segment record format, at most limit bytes.
+    """
+    try:
+        starts = _segments(path)
+    except FileNotFoundError:
+        return b''
+    first = 0
+    if since is not None:
+        first = max(_bisect.bisect_right(starts, int(since * 1e6)) - 1, 0)
+    result = bytearray()
+    for start in starts[first:]:
+        if until is not None and start > until * 1e6:
+            break
+        segment_path = _os.path.join(path, _segment_name(start))
+        offset = 0
+        if since is not None:
+            offset = _find_offset(
+                segment_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, since)
+        with open(segment_path, 'rb') as segment:
+            segment.seek(offset)
+            while True:
+                header = segment.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    break  # end of segment or record being written
+                when, _, length = RECORD.unpack(header)
+                data = segment.read(length)
+                if len(data) < length:
+                    break
+                if until is not None and when > until:
+                    return bytes(result)
+                if since is not None and when < since:
+                    continue
+                if len(result) + RECORD.size + length > limit:
+                    return bytes(result)
+                result += header
+                result += data
+    return bytes(result)
+
+
+def parse_records(data):
+    """Return list of (time, direction, data) from records"""
+    records = []
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        when, direction, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        records.append((when, direction, bytes(data[offset:offset + length])))
+        offset += length
+    return records
+
+
+class Capture():
+    """Records serial traffic to segment files by background thread
+
+    record() is called from event loop (monitor callback) and only queues
+    data, writer thread packs queued records to one buffer and writes it
+    by one call every FLUSH_INTERVAL or when BATCH_SIZE bytes are queued.
+    Data over MAX_PENDING queued bytes are dropped (slow disk).
+    """
+
+    FLUSH_INTERVAL = .2
+    BATCH_SIZE = 65536
+    MAX_PENDING = 4194304
+    CLOSE_TIMEOUT = 2.
+
+    def __init__(self, config, log=None):
+        self._log = log if log else _logging.Logger(self.__class__.__name__)
+        self._path = config['path']
+        self._segment_size = config.get('segment_size', SEGMENT_SIZE)
+        self._segment_time = config.get('segment_time', SEGMENT_TIME)
+        self._index_interval = config.get('index_interval', INDEX_INTERVAL)
+        self._max_segments = config.get('max_segments', 0)
+        _os.makedirs(self._path, exist_ok=True)
+        self._lock = _threading.Lock()
+        self._wakeup = _threading.Event()
+        self._pending = _collections.deque()
+        self._pending_size = 0
+        self._running = True
+        self._records = 0
+        self._written = 0
+        self._dropped = 0
+        self._segment = None
+        self._index = None
+        self._segment_start = 0
+        self._segment_bytes = 0
+        self._indexed = 0  # offset of last index entry
+        self._thread = _threading.Thread(
+            target=self._run, name='ser2tcp-capture', daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self):
+        """Return capture directory"""
+        return self._path
+
+    @property
+    def stats(self):
+        """Return capture counters"""
+        return {
+            'path': self._path,
+            'records': self._records,
+            'bytes': self._written,
+            'pending': self._pending_size,
+            'dropped': self._dropped,
+        }
+
+    def record(self, direction, data):
+        """Queue data for writing (event loop)"""
+        with self._lock:
+            if not self._running \
+                    or self._pending_size + len(data) > self.MAX_PENDING:
+                self._dropped += len(data)
+                return
+            self._pending.append((_time.time(), direction, data))
+            self._pending_size += len(data)
+            wake = self._pending_size >= self.BATCH_SIZE
+        if wake:
+            self._wakeup.set()
+
+    def _run(self):
+        """Writer thread: write queued records until closed"""
+        while True:
+            self._wakeup.wait(self.FLUSH_INTERVAL)
+            self._wakeup.clear()
+            with self._lock:
+                batch = self._pending
+                self._pending = _collections.deque()
+                self._pending_size = 0
+                running = self._running
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as err:
+                    self._log.warning("Capture %s: %s", self._path, err)
+                    with self._lock:
+                        self._dropped += sum(len(rec[2]) for rec in batch)
+                    self._close_segment()
+            if not running:
+                self._close_segment()
+                return
+
+    def _write(self, batch):
+        """Pack records, write them and index entries, rotate segments"""
+        data = bytearray()
+        index = bytearray()
+        for when, direction, chunk in batch:
+            if self._segment is None \
+                    or self._segment_bytes >= self._segment_size \
+                    or when - self._segment_start >= self._segment_time:
+                self._flush(data, index)
+                self._rotate(when)
+            offset = self._segment_bytes
+            if not offset or offset - self._indexed >= self._index_interval:
+                index += INDEX_ENTRY.pack(when, offset)
+                self._indexed = offset
+            data += RECORD.pack(when, direction, len(chunk))
+            data += chunk
+            self._segment_bytes += RECORD.size + len(chunk)
+            self._records += 1
+        self._flush(data, index)
+
+    def _flush(self, data, index):
+        """Write packed records before index entries pointing to them"""
+        if data:
+            self._segment.write(data)
+            self._written += len(data)
+            data.clear()
+        if index:
+            self._index.write(index)
+            index.clear()
+
+    def _rotate(self, when):
+        """Close segment and start new one, remove segments over limit"""
+        self._close_segment()
+        starts = _segments(self._path)
+        start = int(when * 1e6)
+        if starts and start <= starts[-1]:
+            start = starts[-1] + 1
+        base = _os.path.join(self._path, _segment_name(start))
+        # unbuffered, each batch is written by one call
+        self._segment = open(base, 'ab', buffering=0)  # pylint: disable=R1732
+        self._index = open(  # pylint: disable=R1732
+            base[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, 'ab', buffering=0)
+        self._segment_start = when
+        self._segment_bytes = 0
+        self._indexed = 0
+        if self._max_segments:
+            starts.append(start)
+            for old in starts[:-self._max_segments]:
+                old_path = _os.path.join(self._path, _segment_name(old))
+                for name in (
+                        old_path,
+                        old_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                    try:
+                        _os.remove(name)
+                    except FileNotFoundError:
+                        pass
+
+    def _close_segment(self):
+        """Close current segment and index files"""
+        for file in (self._segment, self._index):
+            if file is not None:
+                file.close()
+        self._segment = None
+        self._index = None
+
+    def close(self):
+        """Write queued records and stop writer thread"""
+        with self._lock:
+            self._running = False
+        self._wakeup.set()
+        self._thread.join(self.CLOSE_TIMEOUT)
@@ -0,0 +1,108 @@
+"""Coalescer - batching of serial data forwarded to clients of one server"""
+
+MODES = ('latency', 'throughput')
+DEFAULT_MODE = 'latency'
+DEFAULT_COALESCE_BYTES = 4096
+DEFAULT_COALESCE_US = 1000
+
+
+def validate_config(config):
+    """Validate mode configuration of server, return error string or None"""
+    mode = config.get('mode', DEFAULT_MODE)
+    if mode not in MODES:
+        return f'Unknown mode: {mode} (expected {" or ".join(MODES)})'
+    for key in ('coalesce_bytes', 'coalesce_us'):
+        if key in config:
+            value = config[key]
+            if isinstance(value, bool) or not isinstance(value, int) \
+                    or value <= 0:
+                return f'{key} must be positive integer'
+    return None
+
+
+class Coalescer():
+    """Forward data immediately (latency) or in batches (throughput)
+
+    In throughput mode data are collected until coalesce_bytes are
+    pending or coalesce_us microseconds elapsed from first pending data,
+    then they are sent by one call. Without event loop (no timers) data
+    are always sent immediately.
+    """
+
+    def __init__(self, config, send):
+        self._mode = config.get('mode', DEFAULT_MODE)
+        self._max_bytes = config.get('coalesce_bytes', DEFAULT_COALESCE_BYTES)
+        self._delay = config.get('coalesce_us', DEFAULT_COALESCE_US) / 1e6
+        self._send = send
+        self._loop = None
+        self._timer = None
+        self._chunks = []
+        self._size = 0
+        self._batches = 0
+        self._bytes = 0
+        self._max_batch = 0
+
+    @property
+    def mode(self):
+        """Return mode name"""
+        return self._mode
+
+    def attach(self, loop):
+        """Set event loop used for coalescing timer"""
+        self._loop = loop
+
+    def push(self, data):
+        """Send data now or add them to pending batch"""
+        if self._mode == 'latency' or not self._loop:
+            self._emit(data)
+            return
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self._max_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self._delay, self.flush)
+
+    def flush(self):
+        """Send pending batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._chunks:
+            return
+        if len(self._chunks) == 1:
+            data = self._chunks[0]
+        else:
+            data = b''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        self._emit(data)
+
+    def _emit(self, data):
+        """Send one batch and count it"""
+        size = len(data)
+        self._batches += 1
+        self._bytes += size
+        if size > self._max_batch:
+            self._max_batch = size
+        self._send(data)
+
+    def stats(self):
+        """Return mode and statistics of sent batches"""
+        return {
+            'mode': self._mode,
+            'batches': self._batches,
+            'bytes': self._bytes,
+            'avg_batch': self._bytes // self._batches if self._batches else 0,
+            'max_batch': self._max_batch,
+        }
+
+    def close(self):
+        """Cancel timer and drop pending data"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._chunks = []
+        self._size = 0
@@ -1,22 +1,60 @@
 """Connection"""
 
+import collections as _collections
+import itertools as _itertools
 import logging as _logging
+import os as _os
+import ssl as _ssl
 import time as _time
 
+import ser2tcp.read_buffer as _read_buffer
+
+
+def _iov_max():
+    """Return max number of buffers for sendmsg()"""
+    try:
+        value = _os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+        value = -1
+    return value if value > 0 else 16  # 16 is minimum required by POSIX
+
 
 class Connection():
-    """Connection"""
+    """Connection
+
+    Output buffer is queue of immutable chunks, data broadcast from serial
+    port are shared by all connections (no copy per client). Pending size
+    is how far client lags behind serial port, buffer_limit limits it and
+    send_timeout expires when it is not reduced in time.
+    """
 
     DEFAULT_SEND_TIMEOUT = 5.0
     DEFAULT_BUFFER_LIMIT = None
+    FLUSH_SIZE = 65536  # max bytes joined from small chunks for one send
+    IOV_MAX = _iov_max()  # max chunks in one sendmsg
+    SENDMSG = True  # scatter-gather send if socket supports it
+    ENCODING = 'raw'  # connections with same encoding share escaped data
+
+    # close() from __del__ can run on object whose __init__ failed
+    _socket = None
+    _loop = None
+    _send_timer = None
 
     def __init__(
             self, connection, send_timeout=None, buffer_limit=None,
             log=None):
         self._log = log if log else _logging.Logger(self.__class__.__name__)
         self._socket, self._addr = connection
-        self._out_buffer = bytearray()
+        self._out_chunks = _collections.deque()
+        self._out_offset = 0  # bytes of first chunk already sent
+        self._out_size = 0
+        self._sendmsg = self.SENDMSG and hasattr(self._socket, 'sendmsg')
+        self._read_buffer = _read_buffer.ReadBuffer()
         self._last_write_time = _time.time()
+        self._loop = None
+        self._on_timeout = None
+        self._send_timer = None
+        self.tx_priority = 0  # set by server, used by serial TX arbiter
         if send_timeout is not None:
             self._send_timeout = send_timeout
         else:
@@ -33,8 +71,49 @@ class Connection():
         """Return reference to socket"""
         return self._socket
 
+    def receive(self):
+        """Receive data into reusable buffer, valid until next receive"""
+        return self._read_buffer.recv_into(self._socket)
+
+    def pending_input(self):
+        """Return number of received bytes buffered above socket"""
+        return 0
+
+    def attach(self, loop, on_timeout=None):
+        """Set event loop used to toggle write interest
+
+        on_timeout(connection) is called from loop timer when send timeout
+        expires.
+        """
+        self._loop = loop
+        self._on_timeout = on_timeout
+        if self._out_chunks:
+            loop.set_write(self._socket, True)
+            self._start_send_timer()
+
+    def _start_send_timer(self):
+        """Schedule send timeout check, one timer per connection"""
+        if self._send_timer is not None or not self._on_timeout:
+            return
+        delay = self._last_write_time + self._send_timeout - _time.time()
+        self._send_timer = self._loop.call_later(
+            max(0, delay), self._check_send_timeout)
+
+    def _check_send_timeout(self):
+        """Timer callback, reschedule if data was sent meanwhile"""
+        self._send_timer = None
+        if not self._socket or not self._out_chunks:
+            return
+        if self.is_stale():
+            self._on_timeout(self)
+        else:
+            self._start_send_timer()
+
     def close(self):
         """Close connection"""
+        if self._send_timer is not None:
+            self._send_timer.cancel()
+            self._send_timer = None
         if self._socket:
             self._socket.close()
             self._socket = None
@@ -52,38 +131,106 @@ class Connection():
         """Return formatted address string"""
         return "%s:%d" % self._addr
 
+    @staticmethod
+    def encode(data):
+        """Return data as sent to client of this ENCODING"""
+        return data
+
+    def send_encoded(self, data):
+        """Queue data already encoded by encode() (broadcast)"""
+        return self.send(data)
+
     def send(self, data):
-        """Add data to output buffer, return number of bytes added"""
+        """Queue data to output buffer, return number of bytes added
+
+        Queued bytes object is shared, not copied, mutable data are copied.
+        """
         if not self._socket:
             return None
-        new_size = len(self._out_buffer) + len(data)
-        if self._buffer_limit and new_size > self._buffer_limit:
+        size = len(data)
+        if self._buffer_limit and self._out_size + size > self._buffer_limit:
             return None
-        if not self._out_buffer:
+        if not size:
+            return 0
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        if not self._out_chunks:
             # Reset timeout when buffer becomes non-empty
             self._last_write_time = _time.time()
-        self._out_buffer.extend(data)
-        return len(data)
+            if self._loop:
+                self._loop.set_write(self._socket, True)
+                self._start_send_timer()
+        self._out_chunks.append(data)
+        self._out_size += size
+        return size
+
+    def _pending_data(self):
+        """Return pending data for one send
+
+        For sockets without sendmsg() (SSL): rest of first chunk as
+        memoryview, if it is small, following chunks are joined to it up
+        to FLUSH_SIZE.
+        """
+        data = self._out_chunks[0]
+        if self._out_offset:
+            data = memoryview(data)[self._out_offset:]
+        if len(self._out_chunks) == 1 or len(data) >= self.FLUSH_SIZE:
+            return data
+        parts = [data]
+        size = len(data)
+        for chunk in _itertools.islice(self._out_chunks, 1, None):
+            if size >= self.FLUSH_SIZE:
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        return b''.join(parts)
+
+    def _send_chunks(self):
+        """Send up to IOV_MAX pending chunks by one sendmsg() call"""
+        buffers = list(_itertools.islice(self._out_chunks, self.IOV_MAX))
+        if self._out_offset:
+            buffers[0] = memoryview(buffers[0])[self._out_offset:]
+        return self._socket.sendmsg(buffers)
+
+    def _consume(self, size):
+        """Remove size sent bytes from output queue"""
+        self._out_size -= size
+        size += self._out_offset
+        while self._out_chunks and size >= len(self._out_chunks[0]):
+            size -= len(self._out_chunks.popleft())
+        self._out_offset = size
 
     def flush(self):
         """Flush output buffer, return number of bytes sent or None on error"""
-        if not self._socket or not self._out_buffer:
+        if not self._socket or not self._out_chunks:
             return 0
         try:
-            sent = self._socket.send(self._out_buffer)
+            if self._sendmsg:
+                sent = self._send_chunks()
+            else:
+                sent = self._socket.send(self._pending_data())
             if sent > 0:
-                del self._out_buffer[:sent]
+                self._consume(sent)
                 self._last_write_time = _time.time()
+                if not self._out_chunks and self._loop:
+                    self._loop.set_write(self._socket, False)
             return sent
-        except OSError:
+        except (_ssl.SSLWantWriteError, _ssl.SSLWantReadError):
+            return 0  # TLS layer is not ready, retry on next event
+        except OSError as err:
+            self._log.info("(%s): write error: %s", self.address_str(), err)
             return None
 
     def has_pending_data(self):
         """Return True if there is data in output buffer"""
-        return bool(self._out_buffer)
+        return bool(self._out_chunks)
+
+    def pending_size(self):
+        """Return number of bytes waiting in output buffer"""
+        return self._out_size
 
     def is_stale(self):
         """Return True if send timeout expired"""
-        if not self._out_buffer:
+        if not self._out_chunks:
             return False
         return _time.time() - self._last_write_time > self._send_timeout
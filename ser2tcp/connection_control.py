@@ -1,5 +1,7 @@
 """Connection control protocol - serial signal control via 0xFF escape"""
 
+import re as _re
+
 # Escape protocol:
 # FF FF  = literal 0xFF byte
 # FF 00  = RTS low
@@ -22,6 +24,44 @@ REPORT_MASK = 0x3F
 SIGNAL_NAMES = ('rts', 'dtr', 'cts', 'dsr', 'ri', 'cd')
 SIGNAL_BITS = {name: i for i, name in enumerate(SIGNAL_NAMES)}
 
+# report frame for every filtered bitmask, shared by all connections
+REPORT_FRAMES = tuple(
+    bytes((ESCAPE, REPORT_BASE | bitmask))
+    for bitmask in range(REPORT_MASK + 1))
+
+_ESCAPE_RUN = _re.compile(rb'\xff+')
+
+
+def signal_mask(signals):
+    """Return bitmask of signal names (unknown names are ignored)"""
+    mask = 0
+    for name in signals:
+        bit = SIGNAL_BITS.get(name.lower())
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def data_runs(view, pos):
+    """Return end of data from pos and list of unescaped runs
+
+    Data end by escape of command (odd 0xFF in sequence of 0xFF) or by
+    end of chunk. Sequence of 2*n 0xFF is n data bytes, so runs are
+    slices of view of received data, it is searched without copy.
+    """
+    runs = []
+    while True:
+        match = _ESCAPE_RUN.search(view, pos)
+        if match is None:
+            runs.append(view[pos:])
+            return len(view), runs
+        index, end = match.span()
+        count = end - index
+        runs.append(view[pos:index + count // 2])
+        if count % 2:
+            return end - 1, runs
+        pos = end
+
 
 def wrap_control(connection_class, control_config, data_enabled=True):
     """Wrap a connection class with control protocol handling.
@@ -33,6 +73,7 @@ def wrap_control(connection_class, control_config, data_enabled=True):
     """
     signals = control_config.get('signals', [])
     signal_set = set(s.lower() for s in signals)
+    report_mask = signal_mask(signal_set)
     rts_enabled = bool(control_config.get('rts'))
     dtr_enabled = bool(control_config.get('dtr'))
     forward_data = data_enabled
@@ -43,55 +84,72 @@ def wrap_control(connection_class, control_config, data_enabled=True):
             super().__init__(*args, **kwargs)
             self._ctl_escape = False
             self._ctl_signals = signal_set
+            self._ctl_report_mask = report_mask
             self._ctl_rts = rts_enabled
             self._ctl_dtr = dtr_enabled
             self._ctl_data = forward_data
 
+        ENCODING = 'control'
+
+        @staticmethod
+        def encode(data):
+            """Return data with 0xFF escaped"""
+            return data.replace(b'\xff', b'\xff\xff')
+
         def send(self, data):
             """Send data with 0xFF escaped (skipped when data disabled)"""
             if not self._ctl_data:
                 return 0
-            return super().send(data.replace(b'\xff', b'\xff\xff'))
+            return super().send(self.encode(data))
+
+        def send_encoded(self, data):
+            """Send data with 0xFF already escaped"""
+            if not self._ctl_data:
+                return 0
+            return super().send(data)
 
         def send_signal_report(self, bitmask):
-            """Send signal report FF 8x"""
-            # Filter bitmask to only configured signals
-            filtered = 0
-            for name in self._ctl_signals:
-                bit = SIGNAL_BITS.get(name)
-                if bit is not None and bitmask & (1 << bit):
-                    filtered |= (1 << bit)
+            """Send signal report FF 8x of configured signals"""
             return super().send(
-                bytes((ESCAPE, REPORT_BASE | (filtered & REPORT_MASK))))
+                REPORT_FRAMES[bitmask & self._ctl_report_mask])
 
         def on_received(self, data):
-            """Parse escape sequences, forward clean data to serial"""
-            data = bytearray(data)
-            clean = bytearray()
-            while data:
+            """Parse escape sequences, forward clean data to serial
+
+            One pass over data, data between commands are slices of
+            received data, joined only when there are more of them.
+            """
+            data = bytes(data)  # receive buffer is reused
+            view = memoryview(data)
+            size = len(data)
+            clean = []
+            pos = 0
+            while pos < size:
                 if self._ctl_escape:
                     self._ctl_escape = False
-                    cmd = data.pop(0)
-                    self._process_control_cmd(cmd, clean)
+                    self._process_control_cmd(data[pos], clean)
+                    pos += 1
                     continue
-                if ESCAPE in data:
-                    index = data.index(ESCAPE)
-                    if self._ctl_data and index > 0:
-                        clean.extend(data[:index])
-                    del data[:index + 1]
+                end, runs = data_runs(view, pos)
+                if self._ctl_data:
+                    clean.extend(run for run in runs if run)
+                if end < size:
+                    # escape of command
                     self._ctl_escape = True
-                else:
-                    if self._ctl_data:
-                        clean.extend(data)
-                    break
-            if clean:
-                self._serial.send(bytes(clean))
+                    end += 1
+                pos = end
+            if len(clean) == 1:
+                self._serial.send(clean[0], self, self.tx_priority)
+            elif clean:
+                self._serial.send(
+                    b''.join(clean), self, self.tx_priority)
 
         def _process_control_cmd(self, cmd, clean):
             """Process a control command byte after 0xFF escape"""
             if cmd == ESCAPE:
                 # FF FF = literal 0xFF
-                clean.append(ESCAPE)
+                if self._ctl_data:
+                    clean.append(b'\xff')
             elif cmd == CMD_RTS_LOW:
                 if self._ctl_rts:
                     self._serial.set_rts(False)
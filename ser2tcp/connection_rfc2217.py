@@ -0,0 +1,262 @@
+"""Connection RFC 2217 - serial port control over telnet (COM-PORT-OPTION)"""
+
+import struct as _struct
+
+import serial as _serial
+
+import ser2tcp.connection_control as _control
+import ser2tcp.connection_telnet as _connection_telnet
+
+# RFC 2217 : https://datatracker.ietf.org/doc/html/rfc2217.html
+COM_PORT_OPTION = 0x2c
+SERVER_OFFSET = 100  # server answers command + 100
+
+SET_BAUDRATE = 1
+SET_DATASIZE = 2
+SET_PARITY = 3
+SET_STOPSIZE = 4
+SET_CONTROL = 5
+NOTIFY_LINESTATE = 6
+NOTIFY_MODEMSTATE = 7
+FLOWCONTROL_SUSPEND = 8
+FLOWCONTROL_RESUME = 9
+SET_LINESTATE_MASK = 10
+SET_MODEMSTATE_MASK = 11
+PURGE_DATA = 12
+
+PARITY = {
+    1: _serial.PARITY_NONE,
+    2: _serial.PARITY_ODD,
+    3: _serial.PARITY_EVEN,
+    4: _serial.PARITY_MARK,
+    5: _serial.PARITY_SPACE,
+}
+STOPBITS = {
+    1: _serial.STOPBITS_ONE,
+    2: _serial.STOPBITS_TWO,
+    3: _serial.STOPBITS_ONE_POINT_FIVE,
+}
+
+# SET-CONTROL values
+CONTROL_FLOW_REQUEST = 0
+CONTROL_FLOW_NONE = 1
+CONTROL_FLOW_XONXOFF = 2
+CONTROL_FLOW_HARDWARE = 3
+CONTROL_BREAK_REQUEST = 4
+CONTROL_BREAK_ON = 5
+CONTROL_BREAK_OFF = 6
+CONTROL_DTR_REQUEST = 7
+CONTROL_DTR_ON = 8
+CONTROL_DTR_OFF = 9
+CONTROL_RTS_REQUEST = 10
+CONTROL_RTS_ON = 11
+CONTROL_RTS_OFF = 12
+CONTROL_FLOW_IN_REQUEST = 13
+CONTROL_FLOW_IN_NONE = 14
+CONTROL_FLOW_IN_HARDWARE = 16
+
+# NOTIFY-MODEMSTATE bits of signals, change bits are state bits >> 4
+MODEMSTATE_BITS = (('cts', 0x10), ('dsr', 0x20), ('ri', 0x40), ('cd', 0x80))
+MODEMSTATE_RI = 0x40
+
+# modem state of every signal bitmask of connection_control
+MODEMSTATE = tuple(
+    sum(
+        bit for name, bit in MODEMSTATE_BITS
+        if bitmask & (1 << _control.SIGNAL_BITS[name]))
+    for bitmask in range(_control.REPORT_MASK + 1))
+
+
+def validate_config(config):
+    """Validate rfc2217 of server config, return error string or None"""
+    if 'rfc2217' not in config:
+        return None
+    if not isinstance(config['rfc2217'], bool):
+        return 'rfc2217 must be boolean'
+    if config['rfc2217'] and config.get('protocol', '').upper() != 'TELNET':
+        return 'rfc2217 requires telnet protocol'
+    return None
+
+
+class ConnectionRfc2217(_connection_telnet.ConnectionTelnet):
+    """Telnet connection with RFC 2217 serial port control
+
+    Port settings, signals and purge requests are applied to serial
+    proxy (shared by all clients of port) and answered by actual value.
+    Modem state is pushed by send_signal_report() when signals change.
+    """
+
+    TELNET_REQUESTS = _connection_telnet.ConnectionTelnet.TELNET_REQUESTS \
+        + ((_connection_telnet.ConnectionTelnet.TELNET_WILL, COM_PORT_OPTION),)
+    TELNET_LOCAL_OPTIONS = \
+        _connection_telnet.ConnectionTelnet.TELNET_LOCAL_OPTIONS \
+        | {COM_PORT_OPTION}
+    TELNET_REMOTE_OPTIONS = \
+        _connection_telnet.ConnectionTelnet.TELNET_REMOTE_OPTIONS \
+        | {COM_PORT_OPTION}
+
+    def __init__(self, *args, **kwargs):
+        self._rfc2217 = False  # client accepted COM-PORT-OPTION
+        self._modem_state = 0
+        self._modem_mask = 0xff
+        self._line_mask = 0
+        super().__init__(*args, **kwargs)
+        self._commands = {
+            SET_BAUDRATE: self._set_baudrate,
+            SET_DATASIZE: self._set_datasize,
+            SET_PARITY: self._set_parity,
+            SET_STOPSIZE: self._set_stopsize,
+            SET_CONTROL: self._set_control,
+            NOTIFY_LINESTATE: self._notify_linestate,
+            NOTIFY_MODEMSTATE: self._notify_modemstate,
+            SET_LINESTATE_MASK: self._set_linestate_mask,
+            SET_MODEMSTATE_MASK: self._set_modemstate_mask,
+            PURGE_DATA: self._purge_data,
+        }
+
+    def _send_com_port(self, command, value):
+        """Send COM-PORT-OPTION subnegotiation answer to client"""
+        super().send_encoded(
+            bytes((
+                self.TELNET_IAC, self.TELNET_SB, COM_PORT_OPTION,
+                command + SERVER_OFFSET))
+            + self.encode(value)
+            + bytes((self.TELNET_IAC, self.TELNET_SE)))
+
+    def _telnet_option_enabled(self, command, option):
+        if option == COM_PORT_OPTION and not self._rfc2217:
+            self._rfc2217 = True
+            self._log.info("(%s:%d) RFC 2217 enabled", *self._addr)
+            self._send_modem_state(self._serial.get_signals(), force=True)
+
+    def _telnet_subnegotiation(self, subnegotiation):
+        if len(subnegotiation) < 2 or subnegotiation[0] != COM_PORT_OPTION:
+            super()._telnet_subnegotiation(subnegotiation)
+            return
+        command = subnegotiation[1]
+        value = bytes(subnegotiation[2:])
+        handler = self._commands.get(command)
+        if handler is None:
+            self._log.debug(
+                "(%s:%d) RFC 2217 command %d not supported",
+                *self._addr, command)
+            return
+        try:
+            handler(value)
+        except (IndexError, _struct.error):
+            self._log.warning(
+                "(%s:%d) RFC 2217 command %d invalid value: %s",
+                *self._addr, command, value.hex())
+
+    def _set_baudrate(self, value):
+        baudrate, = _struct.unpack('!I', value[:4])
+        if baudrate:
+            self._serial.set_port_setting('baudrate', baudrate)
+        baudrate = self._serial.get_port_setting('baudrate') or 0
+        self._send_com_port(SET_BAUDRATE, _struct.pack('!I', baudrate))
+
+    def _set_datasize(self, value):
+        if value[0]:
+            self._serial.set_port_setting('bytesize', value[0])
+        bytesize = self._serial.get_port_setting('bytesize') or 0
+        self._send_com_port(SET_DATASIZE, bytes((bytesize,)))
+
+    def _set_choice(self, command, name, choices, value):
+        """Set parity or stop bits, answer code of actual setting"""
+        if value[0] in choices:
+            self._serial.set_port_setting(name, choices[value[0]])
+        setting = self._serial.get_port_setting(name)
+        codes = [code for code, item in choices.items() if item == setting]
+        self._send_com_port(command, bytes((codes[0] if codes else 0,)))
+
+    def _set_parity(self, value):
+        self._set_choice(SET_PARITY, 'parity', PARITY, value)
+
+    def _set_stopsize(self, value):
+        self._set_choice(SET_STOPSIZE, 'stopbits', STOPBITS, value)
+
+    def _flow_control(self):
+        """Return SET-CONTROL code of outbound flow control"""
+        if self._serial.get_port_setting('rtscts'):
+            return CONTROL_FLOW_HARDWARE
+        if self._serial.get_port_setting('xonxoff'):
+            return CONTROL_FLOW_XONXOFF
+        return CONTROL_FLOW_NONE
+
+    def _set_control(self, value):
+        """Flow control, break, DTR and RTS, answer actual state"""
+        code = value[0]
+        if code in (CONTROL_FLOW_NONE, CONTROL_FLOW_XONXOFF,
+                    CONTROL_FLOW_HARDWARE):
+            self._serial.set_port_setting(
+                'xonxoff', code == CONTROL_FLOW_XONXOFF)
+            self._serial.set_port_setting(
+                'rtscts', code == CONTROL_FLOW_HARDWARE)
+            code = self._flow_control()
+        elif code == CONTROL_FLOW_REQUEST:
+            code = self._flow_control()
+        elif CONTROL_BREAK_REQUEST <= code <= CONTROL_BREAK_OFF:
+            if code != CONTROL_BREAK_REQUEST:
+                self._serial.set_port_setting(
+                    'break_condition', code == CONTROL_BREAK_ON)
+            code = CONTROL_BREAK_ON \
+                if self._serial.get_port_setting('break_condition') \
+                else CONTROL_BREAK_OFF
+        elif CONTROL_DTR_REQUEST <= code <= CONTROL_RTS_OFF:
+            if code in (CONTROL_DTR_ON, CONTROL_DTR_OFF):
+                self._serial.set_dtr(code == CONTROL_DTR_ON)
+            elif code in (CONTROL_RTS_ON, CONTROL_RTS_OFF):
+                self._serial.set_rts(code == CONTROL_RTS_ON)
+            signals = self._serial.get_signals()
+            if code <= CONTROL_DTR_OFF:
+                on = signals & (1 << _control.SIGNAL_BITS['dtr'])
+                code = CONTROL_DTR_ON if on else CONTROL_DTR_OFF
+            else:
+                on = signals & (1 << _control.SIGNAL_BITS['rts'])
+                code = CONTROL_RTS_ON if on else CONTROL_RTS_OFF
+        elif CONTROL_FLOW_IN_REQUEST <= code <= CONTROL_FLOW_IN_HARDWARE:
+            code = CONTROL_FLOW_IN_NONE  # inbound flow is not supported
+        else:
+            code = self._flow_control()  # DCD/DTR/DSR flow not supported
+        self._send_com_port(SET_CONTROL, bytes((code,)))
+
+    def _notify_linestate(self, _value):
+        """Line state is not available by pyserial, answer empty state"""
+        self._send_com_port(NOTIFY_LINESTATE, b'\x00')
+
+    def _notify_modemstate(self, _value):
+        """Client polls modem state"""
+        self._send_modem_state(self._serial.get_signals(), force=True)
+
+    def _set_linestate_mask(self, value):
+        self._line_mask = value[0]
+        self._send_com_port(SET_LINESTATE_MASK, value[:1])
+
+    def _set_modemstate_mask(self, value):
+        self._modem_mask = value[0]
+        self._send_com_port(SET_MODEMSTATE_MASK, value[:1])
+
+    def _purge_data(self, value):
+        """1 = receive buffer, 2 = transmit buffer, 3 = both"""
+        self._serial.purge(receive=bool(value[0] & 1),
+                           transmit=bool(value[0] & 2))
+        self._send_com_port(PURGE_DATA, value[:1])
+
+    def _send_modem_state(self, bitmask, force=False):
+        """Send NOTIFY-MODEMSTATE with change bits if state changed"""
+        state = MODEMSTATE[bitmask & _control.REPORT_MASK]
+        changed = state ^ self._modem_state
+        if not changed and not force:
+            return
+        if self._modem_state & MODEMSTATE_RI and not state & MODEMSTATE_RI:
+            changed |= MODEMSTATE_RI  # trailing edge of ring
+        else:
+            changed &= ~MODEMSTATE_RI
+        self._modem_state = state
+        value = (state | changed >> 4) & self._modem_mask
+        if self._rfc2217 and (value or force):
+            self._send_com_port(NOTIFY_MODEMSTATE, bytes((value,)))
+
+    def send_signal_report(self, bitmask):
+        """Push modem state to client when signals changed"""
+        self._send_modem_state(bitmask)
@@ -10,20 +10,68 @@ class SslHandshakeError(Exception):
 
 
 class ConnectionSsl(_connection_tcp.ConnectionTcp):
-    """SSL/TLS connection"""
+    """SSL/TLS connection
+
+    Handshake is not done on connect, server continues it by
+    do_handshake() when socket is ready, so slow client does not block
+    event loop.
+    """
+
+    SENDMSG = False  # SSLSocket does not implement sendmsg()
 
     def __init__(
             self, connection, ser, send_timeout=None, buffer_limit=None,
             log=None, ssl_context=None):
         sock, addr = connection
         self._socket = None
+        self._handshake_done = False
+        self._handshake_write = False
         try:
-            ssl_sock = ssl_context.wrap_socket(sock, server_side=True)
-        except _ssl.SSLError as err:
+            sock.setblocking(False)
+            ssl_sock = ssl_context.wrap_socket(
+                sock, server_side=True, do_handshake_on_connect=False)
+        except (_ssl.SSLError, OSError) as err:
             sock.close()
             raise SslHandshakeError(f"SSL handshake failed: {err}") from err
         super().__init__(
             (ssl_sock, addr), ser, send_timeout, buffer_limit, log)
 
+    def pending_input(self):
+        """Return number of decrypted bytes buffered by SSL socket"""
+        return self._socket.pending() if self._socket else 0
+
     def _log_connected(self):
-        self._log.info("Client connected: %s SSL", self.address_str())
+        if self._handshake_done:
+            self._log.info("Client connected: %s SSL", self.address_str())
+
+    @property
+    def handshake_done(self):
+        """Return True when TLS handshake is complete"""
+        return self._handshake_done
+
+    @property
+    def handshake_wants_write(self):
+        """Return True when handshake waits for writable socket"""
+        return self._handshake_write
+
+    def do_handshake(self):
+        """Continue TLS handshake, return True when it is complete
+
+        False means handshake waits for socket readable (or writable, see
+        handshake_wants_write). Raise SslHandshakeError on failure.
+        """
+        try:
+            self._socket.do_handshake()
+        except _ssl.SSLWantReadError:
+            self._handshake_write = False
+            return False
+        except _ssl.SSLWantWriteError:
+            self._handshake_write = True
+            return False
+        except (_ssl.SSLError, OSError) as err:
+            raise SslHandshakeError(f"SSL handshake failed: {err}") from err
+        self._handshake_done = True
+        self._handshake_write = False
+        # socket stays non-blocking, partial TLS record must not block loop
+        self._log_connected()
+        return True
@@ -19,4 +19,4 @@ class ConnectionTcp(_connection.Connection):
     def on_received(self, data):
         """Received data from client"""
         if data:
-            self._serial.send(data)
+            self._serial.send(data, self, self.tx_priority)
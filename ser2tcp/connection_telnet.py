@@ -1,6 +1,7 @@
 """Connection Telnet"""
 
 import ser2tcp.connection as _connection
+import ser2tcp.connection_control as _connection_control
 
 
 class ConnectionTelnet(_connection.Connection):
@@ -31,22 +32,57 @@ class ConnectionTelnet(_connection.Connection):
         TELNET_DONT: 'DONT',
     }
 
+    # Options : https://www.iana.org/assignments/telnet-options
+    TELNET_BINARY = 0x00
+    TELNET_ECHO = 0x01
+    TELNET_SGA = 0x03  # Suppress go ahead
+    TELNET_LINEMODE = 0x22
+
+    # options requested on connect (command, option)
+    TELNET_REQUESTS = (
+        (TELNET_DO, TELNET_LINEMODE),
+        (TELNET_WILL, TELNET_ECHO),
+    )
+    # options performed by server (accepted DO)
+    TELNET_LOCAL_OPTIONS = frozenset((TELNET_BINARY, TELNET_ECHO, TELNET_SGA))
+    # options performed by client (accepted WILL)
+    TELNET_REMOTE_OPTIONS = frozenset(
+        (TELNET_BINARY, TELNET_SGA, TELNET_LINEMODE))
+
     def __init__(
             self, connection, ser, send_timeout=None, buffer_limit=None,
             log=None):
         super().__init__(connection, send_timeout, buffer_limit, log)
         self._serial = ser
+        # option: True enabled, False requested by server
+        self._telnet_local = {}
+        self._telnet_remote = {}
         # Send initial telnet negotiation
-        self.send(bytes((self.TELNET_IAC, self.TELNET_DO, 0x22)))
-        self.send(bytes((self.TELNET_IAC, self.TELNET_WILL, 0x01)))
+        for command, option in self.TELNET_REQUESTS:
+            if command == self.TELNET_DO:
+                self._telnet_remote[option] = False
+            else:
+                self._telnet_local[option] = False
+            self._send_option(command, option)
         self._telnet_iac = False
         self._telnet_state = None
         self._subnegotiation_frame = None
         self._log.info("Client connected: %s:%d TELNET", *self._addr)
 
+    ENCODING = 'iac'
+
+    @staticmethod
+    def encode(data):
+        """Return data with IAC bytes escaped"""
+        return data.replace(b'\xff', b'\xff\xff')
+
     def send(self, data):
         """Send data to client, escape IAC bytes"""
-        return super().send(data.replace(b'\xff', b'\xff\xff'))
+        return super().send(self.encode(data))
+
+    def send_encoded(self, data):
+        """Send data with IAC already escaped"""
+        return super().send(data)
 
     def _telnet_subnegotiation(self, subnegotiation):
         """Process subnegotiation frame"""
@@ -54,15 +90,47 @@ class ConnectionTelnet(_connection.Connection):
             "(%s:%d) received TELNET SUBNEGOTIATION: %s",
             *self._addr, ' '.join(['%02x' % i for i in subnegotiation]))
 
+    def _send_option(self, command, option):
+        """Send telnet command WILL, WONT, DO or DONT (not escaped)"""
+        super().send(bytes((self.TELNET_IAC, command, option)))
+
     def _telnet_command(self, command, value):
-        """Process telnet command"""
+        """Process telnet command, answer option negotiation
+
+        Answer is sent only when option state changes (RFC 1143), so
+        acknowledgement of own request is not answered again.
+        """
         self._log.debug(
             "(%s:%d) received TELNET COMMAND: %s 0x%02x",
             *self._addr, self.TELNET_OPTION_CODES[command], value)
+        if command in (self.TELNET_WILL, self.TELNET_WONT):
+            options, accepted = self._telnet_remote, self.TELNET_REMOTE_OPTIONS
+            enable, disable = self.TELNET_DO, self.TELNET_DONT
+        else:
+            options, accepted = self._telnet_local, self.TELNET_LOCAL_OPTIONS
+            enable, disable = self.TELNET_WILL, self.TELNET_WONT
+        state = options.get(value)
+        if command in (self.TELNET_WILL, self.TELNET_DO):
+            if state:
+                return
+            if value not in accepted:
+                self._send_option(disable, value)
+                return
+            options[value] = True
+            if state is None:
+                self._send_option(enable, value)
+            self._telnet_option_enabled(command, value)
+        elif state is not None:
+            del options[value]
+            if state:
+                self._send_option(disable, value)
+
+    def _telnet_option_enabled(self, command, option):
+        """Option was enabled by WILL (client) or DO (server)"""
 
     def _send_data(self, data):
         if self._telnet_state is None:
-            self._serial.send(data)
+            self._serial.send(data, self, self.tx_priority)
         elif self._telnet_state == self.TELNET_SB:
             self._subnegotiation_frame.extend(data)
 
@@ -73,9 +141,13 @@ class ConnectionTelnet(_connection.Connection):
             self._telnet_state = state
             self._subnegotiation_frame = bytearray()
         elif state == self.TELNET_SE:
-            self._telnet_subnegotiation(self._subnegotiation_frame)
+            if self._subnegotiation_frame is None:
+                self._log.warning(
+                    "(%s:%d) received TELNET SE without SB", *self._addr)
+            else:
+                self._telnet_subnegotiation(self._subnegotiation_frame)
             self._subnegotiation_frame = None
-            state = None
+            self._telnet_state = None
         elif state == self.TELNET_IAC:
             self._send_data(bytes((state, )))
         else:
@@ -84,28 +156,36 @@ class ConnectionTelnet(_connection.Connection):
                 *self._addr, state)
 
     def on_received(self, data):
-        """Received data from client"""
-        data = bytearray(data)
-        while data:
+        """Received data from client
+
+        One pass over data, parser state is kept between calls. Data
+        between commands are searched in received buffer and forwarded
+        as its slices, escaped IAC IAC are joined by one copy.
+        """
+        view = memoryview(data)
+        size = len(view)
+        pos = 0
+        while pos < size:
             if self._telnet_iac:
                 # IAC byte was received
                 self._telnet_iac = False
-                self._process_iac(data.pop(0))
+                self._process_iac(view[pos])
+                pos += 1
                 continue
             if self._telnet_state in self.TELNET_OPTION_CODES:
-                self._telnet_command(self._telnet_state, data.pop(0))
+                self._telnet_command(self._telnet_state, view[pos])
                 self._telnet_state = None
+                pos += 1
                 continue
-            # NO state
-            if self.TELNET_IAC in data:
-                # find index of IAC
-                index = data.index(self.TELNET_IAC)
-                if index > 0:
-                    # send data before IAC
-                    self._send_data(data[:index])
-                # remove data + IAC
-                del data[:index + 1]
-                self._telnet_iac = True
-            else:
+            end, runs = _connection_control.data_runs(view, pos)
+            if len(runs) > 1:
+                self._send_data(b''.join(runs))
+            elif pos == 0 and end == size:
                 self._send_data(data)
-                break
+            elif end > pos:
+                self._send_data(runs[0])
+            if end < size:
+                # IAC of command
+                self._telnet_iac = True
+                end += 1
+            pos = end
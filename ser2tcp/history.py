@@ -0,0 +1,172 @@
+"""History of data received from serial port"""
+
+import collections as _collections
+import time as _time
+
+LINES_SIZE = 1048576  # max bytes of history limited only by lines
+
+
+def _is_count(value):
+    """True if value is non-negative integer"""
+    return not isinstance(value, bool) and isinstance(value, int) \
+        and value >= 0
+
+
+def validate_config(config):
+    """Validate history of port config, return error string or None"""
+    for key in ('history', 'history_lines'):
+        if key in config and not _is_count(config[key]):
+            return f'{key} must be non-negative integer'
+    return None
+
+
+def validate_replay(config):
+    """Validate replay of server config, return error string or None"""
+    replay = config.get('replay', True)
+    if isinstance(replay, bool):
+        return None
+    if not isinstance(replay, dict) \
+            or not set(replay).issubset(('bytes', 'seconds')):
+        return 'replay must be true, false or {"bytes", "seconds"}'
+    if 'bytes' in replay and not _is_count(replay['bytes']):
+        return 'replay.bytes must be non-negative integer'
+    if 'seconds' in replay:
+        value = replay['seconds']
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or value < 0:
+            return 'replay.seconds must be non-negative number'
+    return None
+
+
+def replay_options(config):
+    """Return select() arguments of server replay config, None if disabled"""
+    replay = config.get('replay', True)
+    if replay is False:
+        return None
+    if replay is True:
+        return {}
+    return {
+        'max_bytes': replay.get('bytes'),
+        'seconds': replay.get('seconds'),
+    }
+
+
+class History():
+    """Bounded history of data received from serial port
+
+    Chunks are kept as they were read (shared with connections, not
+    copied), oldest are dropped when size in bytes or number of lines is
+    exceeded. History limited only by lines is capped at LINES_SIZE bytes.
+    Size and lines 0 disable history.
+    """
+
+    def __init__(self, size=0, lines=0):
+        if lines and not size:
+            size = LINES_SIZE
+        self._size = size
+        self._max_lines = lines
+        self._chunks = _collections.deque()  # [time, bytes, newlines]
+        self._total = 0
+        self._lines = 0
+
+    @property
+    def size(self):
+        """Return maximum history size in bytes"""
+        return self._size
+
+    @property
+    def total(self):
+        """Return bytes kept in history"""
+        return self._total
+
+    @property
+    def stats(self):
+        """Return history size and content"""
+        return {
+            'size': self._size,
+            'lines': self._max_lines,
+            'bytes': self._total,
+            'oldest': round(self._chunks[0][0], 3) if self._chunks else None,
+        }
+
+    def append(self, data):
+        """Add data read from serial port"""
+        if not self._size or not data:
+            return
+        newlines = data.count(b'\n') if self._max_lines else 0
+        self._chunks.append([_time.time(), data, newlines])
+        self._total += len(data)
+        self._lines += newlines
+        if self._max_lines:
+            self._trim_lines()
+        self._trim_size()
+
+    def _cut(self, entry, offset):
+        """Drop first offset bytes of oldest chunk"""
+        chunk = entry[1][offset:]
+        newlines = chunk.count(b'\n') if self._max_lines else 0
+        self._total -= offset
+        self._lines -= entry[2] - newlines
+        entry[1] = chunk
+        entry[2] = newlines
+
+    def _drop(self):
+        """Drop oldest chunk"""
+        _, chunk, newlines = self._chunks.popleft()
+        self._total -= len(chunk)
+        self._lines -= newlines
+
+    def _trim_lines(self):
+        """Keep last max_lines complete lines and unfinished line"""
+        while self._lines > self._max_lines:
+            entry = self._chunks[0]
+            excess = self._lines - self._max_lines
+            if excess > entry[2] or (
+                    excess == entry[2] and entry[1].endswith(b'\n')):
+                self._drop()
+                continue
+            offset = 0
+            for _ in range(excess):
+                offset = entry[1].index(b'\n', offset) + 1
+            self._cut(entry, offset)
+
+    def _trim_size(self):
+        """Keep last size bytes"""
+        while self._total > self._size:
+            entry = self._chunks[0]
+            excess = self._total - self._size
+            if excess >= len(entry[1]):
+                self._drop()
+            else:
+                self._cut(entry, excess)
+
+    def select(self, max_bytes=None, since=None, until=None):
+        """Return list of chunks, oldest first
+
+        since and until are time.time() timestamps of reception, max_bytes
+        keeps only newest bytes. Chunks are shared, only first one can be
+        sliced.
+        """
+        chunks = [
+            chunk for when, chunk, _ in self._chunks
+            if (since is None or when >= since)
+            and (until is None or when <= until)]
+        if max_bytes is not None:
+            size = 0
+            for index in range(len(chunks) - 1, -1, -1):
+                size += len(chunks[index])
+                if size >= max_bytes:
+                    first = chunks[index][size - max_bytes:]
+                    chunks = ([first] if first else []) + chunks[index + 1:]
+                    break
+        return chunks
+
+    def chunks(self):
+        """Return list of all kept chunks, oldest first"""
+        return [chunk for _, chunk, _ in self._chunks]
+
+    def clear(self):
+        """Drop all history"""
+        self._chunks.clear()
+        self._total = 0
+        self._lines = 0
@@ -222,6 +222,11 @@ class SessionManager():
             config['tokens'] = list(self._tokens.values())
         return config
 
+    def next_expiry(self):
+        """Return time (time.time()) of nearest session expiry or None"""
+        return min(
+            (s['expires'] for s in self._sessions.values()), default=None)
+
     def cleanup(self):
         """Remove expired sessions"""
         now = _time.time()
@@ -5,17 +5,23 @@ import logging as _logging
 import os as _os
 import pathlib as _pathlib
 import ssl as _ssl
-
-import serial.tools.list_ports as _list_ports
+import time as _time
 
 import uhttp.server as _uhttp_server
 
+import ser2tcp.capture as _capture
+import ser2tcp.coalescer as _coalescer
+import ser2tcp.history as _history
 import ser2tcp.http_auth as _http_auth
 import ser2tcp.connection_control as _control
+import ser2tcp.connection_rfc2217 as _connection_rfc2217
 import ser2tcp.ip_filter as _ip_filter
+import ser2tcp.port_inventory as _port_inventory
 import ser2tcp.serial_proxy as _serial_proxy
 import ser2tcp.server as _server
 import ser2tcp.server_monitor as _server_monitor
+import ser2tcp.socket_options as _socket_options
+import ser2tcp.tx_arbiter as _tx_arbiter
 
 HTML_DIR = _pathlib.Path(__file__).parent / 'html'
 
@@ -25,10 +31,13 @@ class HttpServerWrapper():
 
     def __init__(self, configs, serial_proxies, log=None,
             config_path=None, configuration=None,
-            server_manager=None):
+            server_manager=None, proxy_factory=None, worker_pool=None):
         self._log = log if log else _logging.getLogger(__name__)
         self._serial_proxies = serial_proxies
         self._server_manager = server_manager
+        self._proxy_factory = proxy_factory
+        self._worker_pool = worker_pool
+        self._busy_proxies = set()  # proxies being closed or replaced
         self._config_path = config_path
         self._configuration = configuration if configuration else {}
         if isinstance(configs, dict):
@@ -53,6 +62,7 @@ class HttpServerWrapper():
         self._monitor_servers = {}  # port name -> ServerMonitor
         self._servers = []  # list of (HttpServer, IpFilter or None)
         self._pending_reload = False
+        self._session_timer = None
         for config in configs:
             address = config.get('address', '0.0.0.0')
             port = config.get('port', 8080)
@@ -211,17 +221,40 @@ class HttpServerWrapper():
 
 
     def process_stale(self):
-        """Cleanup expired sessions and handle pending reload"""
-        if self._auth:
+        """Remove closed WebSocket clients and handle pending reload"""
+        if self._auth and not self._server_manager:
             self._auth.cleanup()
+        for ws_server in self._get_ws_endpoints().values():
+            ws_server.process_stale()
         for monitor in list(self._monitor_servers.values()):
             monitor.process_stale()
         if self._pending_reload:
             self._pending_reload = False
             self.reload_http_servers()
 
+    def _schedule_session_cleanup(self):
+        """Schedule sessions cleanup timer to nearest session expiry"""
+        if not self._auth or not self._server_manager:
+            return
+        if self._session_timer is not None:
+            self._session_timer.cancel()
+            self._session_timer = None
+        expires = self._auth.next_expiry()
+        if expires is not None:
+            self._session_timer = self._server_manager.call_later(
+                max(0, expires - _time.time()), self._cleanup_sessions)
+
+    def _cleanup_sessions(self):
+        """Session expiry timer callback"""
+        self._session_timer = None
+        self._auth.cleanup()
+        self._schedule_session_cleanup()
+
     def close(self):
         """Close all HTTP servers"""
+        if self._session_timer is not None:
+            self._session_timer.cancel()
+            self._session_timer = None
         for server, _ in self._servers:
             server.close()
 
@@ -513,14 +546,24 @@ class HttpServerWrapper():
                         srv_info['port'] = server.config['port']
                     if 'ssl' in server.config:
                         srv_info['ssl'] = server.config['ssl']
+                    srv_info['socket_options'] = server.socket_options
                 if not server.data_enabled:
                     srv_info['data'] = False
                 if server.control:
                     srv_info['control'] = server.control
+                if server.config.get('rfc2217'):
+                    srv_info['rfc2217'] = True
                 if server.max_connections:
                     srv_info['max_connections'] = server.max_connections
+                srv_info['batch'] = server.batch_stats
                 servers.append(srv_info)
             port_info['servers'] = servers
+            port_info['read_stats'] = proxy.read_stats
+            port_info['tx'] = proxy.tx_stats
+            port_info['reconnect'] = proxy.reconnect_stats
+            port_info['history'] = proxy.history_stats
+            if proxy.capture_stats:
+                port_info['capture'] = proxy.capture_stats
             if proxy.is_connected:
                 bitmask = proxy.get_signals()
                 signals = {}
@@ -535,7 +578,7 @@ class HttpServerWrapper():
     def _handle_api_detect(self, client):
         """Return list of available serial ports"""
         ports = []
-        for port in _list_ports.comports():
+        for port in _port_inventory.shared_inventory().ports():
             info = {'device': port.device}
             if port.description and port.description != 'n/a':
                 info['description'] = port.description
@@ -605,6 +648,12 @@ class HttpServerWrapper():
         elif len(parts) == 2 and parts[1] == 'signals' \
                 and client.method == 'PUT':
             self._handle_api_set_signals(client, user, index)
+        elif len(parts) == 2 and parts[1] == 'history' \
+                and client.method == 'GET':
+            self._handle_api_history(client, index)
+        elif len(parts) == 2 and parts[1] == 'capture' \
+                and client.method == 'GET':
+            self._handle_api_capture(client, index)
         elif len(parts) == 4 and parts[1] == 'connections' \
                 and client.method == 'DELETE':
             try:
@@ -634,6 +683,34 @@ class HttpServerWrapper():
             max_conn = data['max_connections']
             if not isinstance(max_conn, int) or max_conn < 0:
                 return 'max_connections must be 0 or positive integer'
+        if 'drain_bytes' in data:
+            value = data['drain_bytes']
+            if isinstance(value, bool) or not isinstance(value, int) \
+                    or value <= 0:
+                return 'drain_bytes must be positive integer'
+        if 'tx_buffer_limit' in data:
+            value = data['tx_buffer_limit']
+            if isinstance(value, bool) or not isinstance(value, int) \
+                    or value <= 0:
+                return 'tx_buffer_limit must be positive integer'
+        if 'drain_time' in data:
+            value = data['drain_time']
+            if isinstance(value, bool) \
+                    or not isinstance(value, (int, float)) or value < 0:
+                return 'drain_time must be non-negative number'
+        for key in ('keep_open', 'persistent', 'reconnect'):
+            if key in data and not isinstance(data[key], bool):
+                return f'{key} must be true or false'
+        if 'reconnect_timeout' in data:
+            value = data['reconnect_timeout']
+            if isinstance(value, bool) \
+                    or not isinstance(value, (int, float)) or value < 0:
+                return 'reconnect_timeout must be non-negative number'
+        error = _tx_arbiter.validate_config(data) \
+            or _history.validate_config(data) \
+            or _capture.validate_config(data)
+        if error:
+            return error
         if 'servers' not in data or not isinstance(data['servers'], list):
             return 'servers list required'
         if not data['servers']:
@@ -682,6 +759,18 @@ class HttpServerWrapper():
                 max_conn = srv['max_connections']
                 if not isinstance(max_conn, int) or max_conn < 0:
                     return 'max_connections must be 0 or positive integer'
+            if 'accept_batch' in srv:
+                batch = srv['accept_batch']
+                if isinstance(batch, bool) or not isinstance(batch, int) \
+                        or batch < 0:
+                    return 'accept_batch must be 0 or positive integer'
+            error = _coalescer.validate_config(srv) \
+                or _socket_options.validate_config(srv) \
+                or _tx_arbiter.validate_priority(srv) \
+                or _history.validate_replay(srv) \
+                or _connection_rfc2217.validate_config(srv)
+            if error:
+                return error
         return None
 
     def _get_used_endpoints(self, exclude_index=None):
@@ -712,10 +801,45 @@ class HttpServerWrapper():
         return None
 
     def _create_proxy(self, config):
-        """Create SerialProxy from config"""
+        """Create SerialProxy from config (in worker process if configured)"""
+        if self._proxy_factory:
+            return self._proxy_factory(config)
         proxy = _serial_proxy.SerialProxy(config, self._log)
         return proxy
 
+    def _create_proxy_async(self, config, callback):
+        """Create proxy, callback(error, proxy) when it is ready
+
+        Worker process creates port while event loop continues, other
+        proxies are created immediately.
+        """
+        try:
+            if self._worker_pool:
+                self._worker_pool.create_proxy_async(config, callback)
+                return
+            proxy = self._create_proxy(config)
+        except (ValueError, KeyError, OSError, _server.ConfigError) as err:
+            callback(err, None)
+            return
+        callback(None, proxy)
+
+    def _close_proxy_async(self, proxy, callback):
+        """Close proxy, callback(error) when its sockets are released"""
+        try:
+            if self._worker_pool:
+                self._worker_pool.close_proxy_async(proxy, callback)
+                return
+            proxy.close()
+        except OSError as err:
+            callback(err)
+            return
+        callback(None)
+
+    @staticmethod
+    def _worker_error_status(err, status):
+        """Return HTTP status of proxy error, 504 for timed out worker"""
+        return 504 if isinstance(err, TimeoutError) else status
+
     def _handle_api_ports_add(self, client, user):
         """Add new port configuration"""
         if not self._require_admin(client, user):
@@ -727,22 +851,34 @@ class HttpServerWrapper():
         if error:
             self._error(client, error, 400)
             return
-        try:
-            proxy = self._create_proxy(data)
-        except (ValueError, KeyError, OSError, _server.ConfigError) as err:
-            self._error(client, str(err), 400)
-            return
-        self._serial_proxies.append(proxy)
-        if self._server_manager:
-            self._server_manager.add_server(proxy)
-        ports = self._get_ports_config()
-        ports.append(data)
-        if 'ports' not in self._configuration:
-            self._configuration['ports'] = ports
-        self._save_config()
-        self._log.info("Port added: %d", len(self._serial_proxies) - 1)
-        client.respond({'ok': True, 'index': len(self._serial_proxies) - 1},
-            status=201)
+
+        def created(err, proxy):
+            if err:
+                self._error(
+                    client, str(err), self._worker_error_status(err, 400))
+                return
+            self._serial_proxies.append(proxy)
+            if self._server_manager:
+                self._server_manager.add_server(proxy)
+            ports = self._get_ports_config()
+            ports.append(data)
+            if 'ports' not in self._configuration:
+                self._configuration['ports'] = ports
+            self._save_config()
+            self._log.info("Port added: %d", len(self._serial_proxies) - 1)
+            client.respond(
+                {'ok': True, 'index': len(self._serial_proxies) - 1},
+                status=201)
+        self._create_proxy_async(data, created)
+
+    def _lock_proxy(self, client, index):
+        """Return proxy at index marked busy, None if it is already busy"""
+        proxy = self._serial_proxies[index]
+        if proxy in self._busy_proxies:
+            self._error(client, 'Port is being changed', 409)
+            return None
+        self._busy_proxies.add(proxy)
+        return proxy
 
     def _handle_api_ports_update(self, client, user, index):
         """Update port configuration"""
@@ -759,31 +895,55 @@ class HttpServerWrapper():
         if error:
             self._error(client, error, 400)
             return
-        # Close old proxy first to release ports
-        old_proxy = self._serial_proxies[index]
-        old_proxy.close()
-        if self._server_manager:
-            self._server_manager.remove_server(old_proxy)
-        try:
-            new_proxy = self._create_proxy(data)
-        except (ValueError, KeyError, OSError, _server.ConfigError) as err:
-            # Rollback: recreate old proxy
-            try:
-                old_proxy = self._create_proxy(ports[index])
-                self._serial_proxies[index] = old_proxy
-                if self._server_manager:
-                    self._server_manager.add_server(old_proxy)
-            except Exception:
-                pass
-            self._error(client, str(err), 400)
+        old_proxy = self._lock_proxy(client, index)
+        if old_proxy is None:
             return
+        old_config = ports[index]
+
+        def closed(err):
+            if err:
+                self._busy_proxies.discard(old_proxy)
+                self._error(
+                    client, str(err), self._worker_error_status(err, 500))
+                return
+            if self._server_manager:
+                self._server_manager.remove_server(old_proxy)
+            self._create_proxy_async(data, created)
+
+        def created(err, new_proxy):
+            if err:
+                # Rollback: recreate old proxy
+                self._create_proxy_async(
+                    old_config,
+                    lambda _, proxy: restored(proxy, err))
+                return
+            position = self._replace_proxy(old_proxy, new_proxy, data)
+            self._save_config()
+            self._log.info("Port updated: %d", position)
+            client.respond({'ok': True})
+
+        def restored(proxy, err):
+            if proxy is not None:
+                self._replace_proxy(old_proxy, proxy)
+            self._busy_proxies.discard(old_proxy)
+            self._error(client, str(err), self._worker_error_status(err, 400))
+
+        # Close old proxy first to release ports
+        self._close_proxy_async(old_proxy, closed)
+
+    def _replace_proxy(self, old_proxy, new_proxy, config=None):
+        """Put new proxy (and its config) on position of old proxy
+
+        Other ports could be deleted meanwhile, return actual position.
+        """
+        self._busy_proxies.discard(old_proxy)
+        index = self._serial_proxies.index(old_proxy)
         if self._server_manager:
             self._server_manager.add_server(new_proxy)
         self._serial_proxies[index] = new_proxy
-        ports[index] = data
-        self._save_config()
-        self._log.info("Port updated: %d", index)
-        client.respond({'ok': True})
+        if config is not None:
+            self._get_ports_config()[index] = config
+        return index
 
     def _handle_api_ports_delete(self, client, user, index):
         """Delete port configuration"""
@@ -793,15 +953,25 @@ class HttpServerWrapper():
         if index < 0 or index >= len(ports):
             self._error(client, 'Port not found', 404)
             return
-        old_proxy = self._serial_proxies[index]
-        old_proxy.close()
-        if self._server_manager:
-            self._server_manager.remove_server(old_proxy)
-        del self._serial_proxies[index]
-        del ports[index]
-        self._save_config()
-        self._log.info("Port deleted: %d", index)
-        client.respond({'ok': True})
+        old_proxy = self._lock_proxy(client, index)
+        if old_proxy is None:
+            return
+
+        def closed(err):
+            self._busy_proxies.discard(old_proxy)
+            if err:
+                self._error(
+                    client, str(err), self._worker_error_status(err, 500))
+                return
+            if self._server_manager:
+                self._server_manager.remove_server(old_proxy)
+            position = self._serial_proxies.index(old_proxy)
+            del self._serial_proxies[position]
+            del self._get_ports_config()[position]
+            self._save_config()
+            self._log.info("Port deleted: %d", position)
+            client.respond({'ok': True})
+        self._close_proxy_async(old_proxy, closed)
 
     def _handle_api_set_signals(self, client, user, index):
         """Set RTS/DTR signals on a port"""
@@ -824,6 +994,58 @@ class HttpServerWrapper():
             proxy.set_dtr(bool(data['dtr']))
         client.respond({'ok': True})
 
+    def _handle_api_history(self, client, index):
+        """Download history of port, optionally range from/to and bytes"""
+        if index < 0 or index >= len(self._serial_proxies):
+            self._error(client, 'Port not found', 404)
+            return
+        proxy = self._serial_proxies[index]
+        query = client.query or {}
+        try:
+            since = float(query['from']) if 'from' in query else None
+            until = float(query['to']) if 'to' in query else None
+            max_bytes = int(query['bytes']) if 'bytes' in query else None
+        except ValueError:
+            self._error(client, 'Invalid history range', 400)
+            return
+        if max_bytes is not None and max_bytes < 0:
+            self._error(client, 'Invalid history range', 400)
+            return
+        try:
+            data = proxy.history_data(since, until, max_bytes)
+        except (ValueError, OSError) as err:
+            self._error(client, str(err), 503)
+            return
+        name = proxy.name or f'port{index}'
+        client.respond(data, headers={
+            'content-type': 'application/octet-stream',
+            'content-disposition': f'attachment; filename="{name}.log"',
+        })
+
+    def _handle_api_capture(self, client, index):
+        """Download captured records of port in time range from/to"""
+        if index < 0 or index >= len(self._serial_proxies):
+            self._error(client, 'Port not found', 404)
+            return
+        stats = self._serial_proxies[index].capture_stats
+        if not stats:
+            self._error(client, 'Capture not enabled', 404)
+            return
+        query = client.query or {}
+        try:
+            since = float(query['from']) if 'from' in query else None
+            until = float(query['to']) if 'to' in query else None
+        except ValueError:
+            self._error(client, 'Invalid capture range', 400)
+            return
+        try:
+            data = _capture.read_range(stats['path'], since, until)
+        except OSError as err:
+            self._error(client, str(err), 500)
+            return
+        client.respond(data, headers={
+            'content-type': 'application/octet-stream'})
+
     def _handle_api_disconnect(self, client, user, port_idx,
             srv_idx, con_idx):
         """Disconnect a specific client connection"""
@@ -860,6 +1082,7 @@ class HttpServerWrapper():
             self._error(client, f'Login failed: {login}', 401)
             return
         self._log.info("Login: %s", login)
+        self._schedule_session_cleanup()
         client.respond({'token': token})
 
     def _handle_api_logout(self, client):
@@ -941,6 +1164,7 @@ class HttpServerWrapper():
         self._log.info("User added: %s", data['login'])
         if is_first:
             token = auth.create_session(data['login'])
+            self._schedule_session_cleanup()
             client.respond({'ok': True, 'token': token}, status=201)
         else:
             client.respond({'ok': True}, status=201)
@@ -10,10 +10,10 @@ import os as _os
 import signal as _signal
 import socket as _socket
 
-import serial.tools.list_ports as _list_ports
-
+import ser2tcp.port_inventory as _port_inventory
 import ser2tcp.serial_proxy as _serial_proxy
 import ser2tcp.server_manager as _server_manager
+import ser2tcp.worker as _worker
 
 try:
     _about = _metadata.metadata("ser2tcp")
@@ -69,7 +69,7 @@ def create_default_config(config_path, log):
 def list_usb_devices():
     """List USB serial devices with match attributes"""
     devices = []
-    for port in _list_ports.comports():
+    for port in _port_inventory.shared_inventory().ports():
         if port.vid is not None:
             devices.append(port)
     if not devices:
@@ -121,7 +121,7 @@ def main():
         list_usb_devices()
         return
 
-    _logging.basicConfig(format='%(levelname).1s: %(message)s (%(filename)s:%(lineno)s)')
+    _logging.basicConfig(format=_worker.LOG_FORMAT)
     log = _logging.getLogger('ser2tcp')
     if args.quiet:
         log.setLevel(_logging.CRITICAL)
@@ -151,11 +151,33 @@ def main():
     if not ports and not http_config:
         raise SystemExit("No ports or HTTP server configured")
 
-    servers_manager = _server_manager.ServersManager()
+    event_loop = None
+    workers = 0
+    if isinstance(configuration, dict):
+        event_loop = configuration.get('event_loop')
+        workers = configuration.get('workers', 0)
+    if not isinstance(workers, int) or isinstance(workers, bool) \
+            or workers < 0:
+        raise SystemExit(f"Invalid workers count: {workers}")
+    try:
+        servers_manager = _server_manager.create_servers_manager(event_loop)
+    except ValueError as err:
+        raise SystemExit(err) from err
+    proxy_factory = None
+    worker_pool = None
+    if workers:
+        # supervisor mode: ports are served by worker processes
+        worker_pool = _worker.WorkerPool(workers, event_loop, log)
+        for worker in worker_pool.workers:
+            servers_manager.add_server(worker)
+        proxy_factory = worker_pool.create_proxy
     serial_proxies = []
     for config in ports:
         try:
-            proxy = _serial_proxy.SerialProxy(config, log)
+            if proxy_factory:
+                proxy = proxy_factory(config)
+            else:
+                proxy = _serial_proxy.SerialProxy(config, log)
         except Exception as err:
             log.error("Failed to create port: %s", err)
             continue
@@ -167,7 +189,8 @@ def main():
         http_server = _http_server.HttpServerWrapper(
             configuration['http'], serial_proxies, log,
             config_path=args.config, configuration=configuration,
-            server_manager=servers_manager)
+            server_manager=servers_manager, proxy_factory=proxy_factory,
+            worker_pool=worker_pool)
         servers_manager.add_server(http_server)
 
     _signal.signal(_signal.SIGTERM, servers_manager.stop)
@@ -0,0 +1,217 @@
+"""Cached inventory of serial ports (USB device enumeration)"""
+
+import socket as _socket
+import time as _time
+
+import serial.tools.list_ports as _list_ports
+
+INDEX_ATTRIBUTES = ('vid', 'pid', 'serial_number', 'location')
+HOTPLUG_SUBSYSTEMS = (b'tty', b'usb', b'usb-serial')
+WILDCARD_CHARS = '*?['
+NETLINK_KOBJECT_UEVENT = 15
+
+
+def index_value(attr, value):
+    """Return value normalized for matching (vid/pid as 0xXXXX, upper)"""
+    if attr in ('vid', 'pid') and isinstance(value, int):
+        value = f"0x{value:04X}"
+    return str(value).upper()
+
+
+class HotplugMonitor():
+    """Kernel uevents of tty and USB devices (Linux netlink)"""
+
+    RECV_SIZE = 8192
+
+    def __init__(self, sock):
+        self._socket = sock
+
+    def fileno(self):
+        """Return file descriptor of netlink socket (for event loop)"""
+        return self._socket.fileno()
+
+    @classmethod
+    def create(cls):
+        """Return monitor or None if netlink is not available"""
+        try:
+            sock = _socket.socket(
+                _socket.AF_NETLINK, _socket.SOCK_DGRAM,
+                NETLINK_KOBJECT_UEVENT)
+        except (AttributeError, OSError):
+            return None
+        try:
+            sock.bind((0, 1))  # kernel uevent multicast group
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            return None
+        return cls(sock)
+
+    @staticmethod
+    def _is_relevant(message):
+        """True if uevent is about tty or USB device"""
+        for field in message.split(b'\0'):
+            if field.startswith(b'SUBSYSTEM='):
+                return field[10:] in HOTPLUG_SUBSYSTEMS
+        return False
+
+    def changed(self):
+        """Read waiting uevents, True if some device was added or removed"""
+        changed = False
+        while True:
+            try:
+                message = self._socket.recv(self.RECV_SIZE)
+            except BlockingIOError:
+                return changed
+            except OSError:
+                return True  # ENOBUFS: events were lost
+            if not message:
+                return changed
+            if self._is_relevant(message):
+                changed = True
+
+    def close(self):
+        """Close netlink socket"""
+        self._socket.close()
+
+
+class PortInventory():
+    """Serial ports list with TTL and index of USB attributes
+
+    Enumeration (comports()) walks sysfs and can take tens of milliseconds,
+    result is shared by port matching, /api/detect and --usb. With hotplug
+    monitor cache is invalidated by uevents and HOTPLUG_TTL is only
+    safety net, otherwise it expires after TTL.
+
+    Listeners (ports waiting for device) are called on hotplug events,
+    monitor is watched in event loop while some listener is registered.
+    """
+
+    TTL = 2.
+    HOTPLUG_TTL = 60.
+    MISS_RESCAN = 1.  # min age of cache enumerated again on missed match
+
+    def __init__(self, ttl=None, monitor=None):
+        self._monitor = monitor
+        if ttl is None:
+            ttl = self.HOTPLUG_TTL if monitor else self.TTL
+        self._ttl = ttl
+        self._ports = None
+        self._index = {}  # attr -> normalized value -> [port_info]
+        self._expires = 0
+        self._scan_time = None
+        self._scans = 0
+        self._listeners = []
+        self._loop = None
+
+    @property
+    def scans(self):
+        """Return number of enumerations"""
+        return self._scans
+
+    def invalidate(self):
+        """Drop cached ports, next access enumerates again"""
+        self._ports = None
+
+    def rescan_missing(self):
+        """Matched device is missing, enumerate again if cache is not fresh
+
+        Lost uevent would hide device until HOTPLUG_TTL, enumeration is
+        rate-limited by MISS_RESCAN. Return True if ports were enumerated.
+        """
+        if self._ports is None or \
+                _time.monotonic() - self._scan_time < self.MISS_RESCAN:
+            return False
+        self._scan()
+        return True
+
+    @property
+    def has_monitor(self):
+        """True if hotplug events are available"""
+        return self._monitor is not None
+
+    def add_listener(self, loop, callback):
+        """Call callback in event loop after hotplug event"""
+        if callback in self._listeners:
+            return
+        self._listeners.append(callback)
+        if self._monitor and self._loop is None:
+            self._loop = loop
+            loop.register(self._monitor, self._process_hotplug)
+
+    def remove_listener(self, callback):
+        """Stop calling callback, stop watching monitor after last one"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+        if not self._listeners and self._loop is not None:
+            self._loop.unregister(self._monitor)
+            self._loop = None
+
+    def _process_hotplug(self):
+        """Monitor is readable (event loop)"""
+        if self._monitor.changed():
+            self._changed()
+
+    def _changed(self):
+        """Device added or removed, drop cache and notify listeners"""
+        self._ports = None
+        for callback in list(self._listeners):
+            callback()
+
+    def _is_valid(self):
+        """True if cached ports can be used"""
+        if self._monitor and self._monitor.changed():
+            self._ports = None
+            if self._loop is not None:
+                # events read outside of monitor handler
+                self._loop.call_later(0, self._changed)
+        return self._ports is not None and _time.monotonic() < self._expires
+
+    def _scan(self):
+        """Enumerate ports and build index"""
+        self._ports = list(_list_ports.comports())
+        self._scan_time = _time.monotonic()
+        self._expires = self._scan_time + self._ttl
+        self._scans += 1
+        self._index = {attr: {} for attr in INDEX_ATTRIBUTES}
+        for port_info in self._ports:
+            for attr in INDEX_ATTRIBUTES:
+                value = getattr(port_info, attr, None)
+                if value is not None:
+                    self._index[attr].setdefault(
+                        index_value(attr, value), []).append(port_info)
+
+    def ports(self):
+        """Return list of serial ports (ListPortInfo)"""
+        if not self._is_valid():
+            self._scan()
+        return self._ports
+
+    def candidates(self, match):
+        """Return ports which can match criteria
+
+        Criteria without wildcards on indexed attributes select ports from
+        index, caller still has to check all criteria.
+        """
+        ports = self.ports()
+        for attr, pattern in match.items():
+            pattern = str(pattern)
+            if attr not in self._index \
+                    or any(char in pattern for char in WILDCARD_CHARS):
+                continue
+            indexed = {
+                id(port) for port in self._index[attr].get(
+                    pattern.upper(), [])}
+            ports = [port for port in ports if id(port) in indexed]
+        return ports
+
+
+_INVENTORY = None
+
+
+def shared_inventory():
+    """Return inventory shared by whole process, created on first use"""
+    global _INVENTORY  # pylint: disable=W0603
+    if _INVENTORY is None:
+        _INVENTORY = PortInventory(monitor=HotplugMonitor.create())
+    return _INVENTORY
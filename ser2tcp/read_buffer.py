@@ -0,0 +1,52 @@
+"""Reusable adaptive receive buffer"""
+
+
+class ReadBuffer():
+    """Preallocated buffer for recv_into() with adaptive size
+
+    Size doubles when read fills whole buffer (up to max_size) and halves
+    after SHRINK_AFTER consecutive reads using less than quarter of it
+    (down to min_size). Returned memoryview is valid only until next read,
+    consumers keeping data must copy them.
+    """
+
+    MIN_SIZE = 4096
+    MAX_SIZE = 256 * 1024
+    SHRINK_AFTER = 16
+
+    def __init__(self, min_size=MIN_SIZE, max_size=MAX_SIZE):
+        self._min_size = min_size
+        self._max_size = max_size
+        self._small_reads = 0
+        self._view = None
+        self._resize(min_size)
+
+    @property
+    def size(self):
+        """Return current buffer size"""
+        return len(self._view)
+
+    def _resize(self, size):
+        """Allocate new buffer, views of previous one stay valid"""
+        self._view = memoryview(bytearray(size))
+        self._small_reads = 0
+
+    def _adapt(self, received):
+        """Grow or shrink buffer by size of last read"""
+        size = len(self._view)
+        if received >= size:
+            if size < self._max_size:
+                self._resize(min(size * 2, self._max_size))
+        elif received < size // 4 and size > self._min_size:
+            self._small_reads += 1
+            if self._small_reads >= self.SHRINK_AFTER:
+                self._resize(max(size // 2, self._min_size))
+        else:
+            self._small_reads = 0
+
+    def recv_into(self, sock):
+        """Receive from socket, return memoryview of received data"""
+        view = self._view
+        received = sock.recv_into(view)
+        self._adapt(received)
+        return view[:received]
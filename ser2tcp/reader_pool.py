@@ -0,0 +1,156 @@
+"""Shared reader thread for serial ports without file descriptor"""
+
+import collections as _collections
+import threading as _threading
+import time as _time
+
+import serial as _serial
+
+
+class PooledReader():
+    """Serial port serviced by ReaderPool
+
+    Pool thread appends read chunks into queue and schedules on_data()
+    into event loop, at most one scheduled call per port. Event loop
+    consumes chunks by read(), empty chunk means closed port. Port is not
+    read while MAX_PENDING chunks wait, so slow event loop is not flooded.
+    """
+
+    MAX_PENDING = 64
+
+    def __init__(self, serial, loop, on_data):
+        self._serial = serial
+        self._loop = loop
+        self._on_data = on_data
+        self._chunks = _collections.deque()
+        self._scheduled = False
+        self._closed = False
+        self.lock = _threading.Lock()  # held by pool thread while polling
+
+    @property
+    def closed(self):
+        """True if reader was removed from pool or port failed"""
+        return self._closed
+
+    @property
+    def pending(self):
+        """Return number of chunks waiting in queue"""
+        return len(self._chunks)
+
+    def poll(self):
+        """Read waiting data (pool thread), return True if read something"""
+        if len(self._chunks) >= self.MAX_PENDING:
+            return False
+        try:
+            waiting = self._serial.in_waiting
+            if not waiting:
+                return False
+            data = self._serial.read(size=waiting)
+        except (OSError, _serial.SerialException):
+            data = b''
+        if not data:
+            self._closed = True
+        self._chunks.append(data)
+        self._schedule()
+        return True
+
+    def _schedule(self):
+        """Schedule on_data() into event loop if not scheduled yet"""
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._dispatch)
+
+    def _dispatch(self):
+        """Call on_data() in event loop"""
+        # cleared before chunks are consumed, so chunk appended after this
+        # point schedules new call
+        self._scheduled = False
+        if self._chunks:
+            self._on_data()
+
+    def reschedule(self):
+        """Schedule on_data() again if chunks left (read budget exhausted)"""
+        if self._chunks and not self._scheduled:
+            self._scheduled = True
+            self._loop.call_later(0, self._dispatch)
+
+    def read(self):
+        """Return next chunk (event loop), None if queue is empty"""
+        try:
+            return self._chunks.popleft()
+        except IndexError:
+            return None
+
+    def close(self):
+        """Stop reading, called with lock held"""
+        self._closed = True
+        self._chunks.clear()
+
+
+class ReaderPool():
+    """One thread reading all serial ports without file descriptor
+
+    Ports (RFC 2217, loop://, ...) are polled for waiting data, while all
+    ports are idle poll interval grows from POLL_MIN up to POLL_MAX.
+    Thread is started with first port and ends after last one is removed.
+    """
+
+    POLL_MIN = .0005
+    POLL_MAX = .01
+
+    def __init__(self):
+        self._readers = []
+        self._lock = _threading.Lock()
+        self._thread = None
+
+    @property
+    def readers(self):
+        """Return number of serviced ports"""
+        return len(self._readers)
+
+    def add(self, serial, loop, on_data):
+        """Start reading serial port, return PooledReader"""
+        reader = PooledReader(serial, loop, on_data)
+        with self._lock:
+            self._readers.append(reader)
+            if self._thread is None:
+                self._thread = _threading.Thread(
+                    target=self._run, name='ser2tcp-reader', daemon=True)
+                self._thread.start()
+        return reader
+
+    def remove(self, reader):
+        """Stop reading serial port, port is not read after return"""
+        with self._lock:
+            if reader in self._readers:
+                self._readers.remove(reader)
+        with reader.lock:
+            reader.close()
+
+    def _run(self):
+        """Pool thread: poll all ports until none is left"""
+        interval = self.POLL_MIN
+        while True:
+            with self._lock:
+                readers = list(self._readers)
+                if not readers:
+                    self._thread = None
+                    return
+            active = False
+            for reader in readers:
+                with reader.lock:
+                    if not reader.closed and reader.poll():
+                        active = True
+            if active:
+                interval = self.POLL_MIN
+            else:
+                _time.sleep(interval)
+                interval = min(interval * 2, self.POLL_MAX)
+
+
+_POOL = ReaderPool()
+
+
+def shared_pool():
+    """Return reader pool shared by all serial proxies of process"""
+    return _POOL
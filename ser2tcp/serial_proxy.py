@@ -2,16 +2,19 @@
 
 import fnmatch as _fnmatch
 import logging as _logging
-import socket as _socket
-import threading as _threading
+import os as _os
 import time as _time
 
 import serial as _serial
-import serial.tools.list_ports as _list_ports
 
+import ser2tcp.capture as _capture
 import ser2tcp.connection_control as _control
+import ser2tcp.history as _history
+import ser2tcp.port_inventory as _port_inventory
+import ser2tcp.reader_pool as _reader_pool
 import ser2tcp.server as _server
 import ser2tcp.server_websocket as _server_websocket
+import ser2tcp.tx_arbiter as _tx_arbiter
 
 
 class SerialProxy():
@@ -37,21 +40,62 @@ class SerialProxy():
     MATCH_ATTRIBUTES = ('vid', 'pid', 'serial_number', 'manufacturer',
         'product', 'location', 'description', 'hwid')
 
+    DRAIN_BYTES = 65536  # max bytes read from serial port per wakeup
+    DRAIN_TIME = .005  # max seconds spent reading serial port per wakeup
+    TX_BUFFER_LIMIT = 65536  # queued bytes when clients stop being read
+    TX_QUEUE_MARGIN = 1048576  # default tx_queue_limit over buffer limit
+    TX_CLOSE_TIMEOUT = 1.  # max seconds to write queue after last client
+    RECONNECT_INTERVAL = 1.  # seconds between attempts to open missing device
+    RECONNECT_TIMEOUT = 30.  # seconds clients wait for device (reconnect)
+
     def __init__(self, config, log=None):
         self._log = log if log else _logging.Logger(self.__class__.__name__)
         self._serial = None
-        self._reader_thread = None
-        self._reader_sock_r = None
-        self._reader_sock_w = None
-        self._reader_running = False
+        self._reader = None  # PooledReader of port without file descriptor
+        self._loop = None
+        # persistent is alias of keep_open (warm port without clients)
+        self._keep_open = config.get(
+            'keep_open', config.get('persistent', False))
+        self._history = _history.History(
+            config.get('history', 0), config.get('history_lines', 0))
+        self._reconnect_timer = None
+        self._lost_time = None  # device lost, clients wait (reconnect)
+        self._capture = None
         self._servers = []
         self._monitors = []
         self._last_signals = 0
         self._last_signal_poll = 0
         self._signal_poll_interval = 0.1
+        self._signal_timer = None
         self._has_control_servers = False
         self._name = config.get('name', '')
         self._max_connections = config.get('max_connections', 0)
+        self._drain_bytes = config.get('drain_bytes', self.DRAIN_BYTES)
+        self._drain_time = config.get('drain_time', self.DRAIN_TIME)
+        self._wakeups = 0
+        self._reads = 0
+        self._read_bytes = 0
+        self._max_reads = 0
+        self._budget_hits = 0
+        self._tx_limit = config.get('tx_buffer_limit', self.TX_BUFFER_LIMIT)
+        self._tx_fd = None  # fd for non-blocking writes
+        self._tx_paused = False
+        self._tx_close_timer = None  # closing after queue is written
+        self._tx = _tx_arbiter.TxArbiter(
+            config.get('tx_policy', _tx_arbiter.DEFAULT_POLICY),
+            config.get('tx_lock_timeout'),
+            config.get(
+                'tx_queue_limit', self._tx_limit + self.TX_QUEUE_MARGIN))
+        error = _tx_arbiter.validate_config(config) \
+            or _history.validate_config(config) \
+            or _capture.validate_config(config)
+        if error:
+            raise ValueError(error)
+        self._reconnect = config.get('reconnect', False)
+        self._reconnect_timeout = config.get(
+            'reconnect_timeout', self.RECONNECT_TIMEOUT)
+        self._reopens = 0
+        self._last_downtime = None
         self._match = config['serial'].get('match')
         self._serial_config = self._init_serial_config(config['serial'])
         port = self._serial_config.get('port')
@@ -70,8 +114,13 @@ class SerialProxy():
             else:
                 self._servers.append(
                     _server.Server(server_config, self, log))
+        if 'capture' in config:
+            self._capture = _capture.Capture(config['capture'], self._log)
+            self._monitors.append(self._capture.record)
         # Detect control-enabled servers and set poll interval
         for server in self._servers:
+            if server.config.get('rfc2217'):
+                self._has_control_servers = True  # modem state notify
             if server.control:
                 self._has_control_servers = True
                 interval = server.control.get('poll_interval')
@@ -104,10 +153,10 @@ class SerialProxy():
         for key in match:
             if key not in self.MATCH_ATTRIBUTES:
                 raise ValueError(f"Unknown match attribute: {key}")
-        matched_ports = []
-        for port_info in _list_ports.comports():
-            if self._port_matches(port_info, match):
-                matched_ports.append(port_info.device)
+        inventory = _port_inventory.shared_inventory()
+        matched_ports = self._matched_ports(inventory, match)
+        if not matched_ports and inventory.rescan_missing():
+            matched_ports = self._matched_ports(inventory, match)
         if not matched_ports:
             raise ValueError(f"No device found matching: {match}")
         if len(matched_ports) > 1:
@@ -115,62 +164,71 @@ class SerialProxy():
                 f"Multiple devices match {match}: {matched_ports}")
         return matched_ports[0]
 
+    def _matched_ports(self, inventory, match):
+        """Return devices of inventory ports matching all criteria"""
+        return [
+            port_info.device for port_info in inventory.candidates(match)
+            if self._port_matches(port_info, match)]
+
     def _port_matches(self, port_info, match):
         """Check if port_info matches all criteria"""
         for attr, pattern in match.items():
             value = getattr(port_info, attr, None)
             if value is None:
                 return False
-            # Convert vid/pid to hex string for comparison
-            if attr in ('vid', 'pid') and isinstance(value, int):
-                value = f"0x{value:04X}"
-            else:
-                value = str(value)
-            # Case-insensitive wildcard matching
-            if not _fnmatch.fnmatch(value.upper(), str(pattern).upper()):
+            # Case-insensitive wildcard matching, vid/pid as hex string
+            value = _port_inventory.index_value(attr, value)
+            if not _fnmatch.fnmatch(value, str(pattern).upper()):
                 return False
         return True
 
     def __del__(self):
         self.close()
 
-    def _start_reader_thread_if_needed(self):
-        """Start reader thread if serial port doesn't support fileno()"""
+    def attach(self, loop):
+        """Register servers and serial port in event loop"""
+        self._loop = loop
+        for server in self._servers:
+            server.attach(loop)
+        if self._keep_open or self._reconnect:
+            _port_inventory.shared_inventory().add_listener(
+                loop, self._hotplug)
+        if self._serial:
+            self._register_serial()
+            self._start_signal_timer()
+        elif self._keep_open:
+            self._reopen()
+
+    def _register_serial(self):
+        """Register serial port in event loop
+
+        Port without file descriptor is read by shared reader pool.
+        """
+        if self._tx_fd is None:
+            self._reader = _reader_pool.shared_pool().add(
+                self._serial, self._loop, self._process_serial_data)
+            self._log.debug("Serial read by shared reader pool")
+            return
+        self._loop.register(
+            self._serial, self._process_serial_data,
+            self._process_serial_write)
+        if self._tx.size:
+            self._loop.set_write(self._serial, True)
+
+    def _unregister_serial(self):
+        """Unregister serial port from event loop or reader pool"""
+        if self._reader:
+            _reader_pool.shared_pool().remove(self._reader)
+            self._reader = None
+        elif self._loop:
+            self._loop.unregister(self._serial)
+
+    def _serial_fd(self):
+        """Return file descriptor of serial port, None if not supported"""
         try:
-            self._serial.fileno()
+            return self._serial.fileno()
         except OSError:
-            self._start_reader_thread()
-
-    def _serial_reader_run(self):
-        """Reader thread: read from serial, forward to socketpair"""
-        while self._reader_running:
-            try:
-                data = self._serial.read(size=max(1, self._serial.in_waiting))
-                if data:
-                    self._reader_sock_w.sendall(data)
-            except (OSError, _serial.SerialException):
-                break
-
-    def _start_reader_thread(self):
-        """Start reader thread with socketpair for select() compatibility"""
-        self._reader_sock_r, self._reader_sock_w = _socket.socketpair()
-        self._reader_running = True
-        self._reader_thread = _threading.Thread(
-            target=self._serial_reader_run, daemon=True)
-        self._reader_thread.start()
-        self._log.debug("Serial reader thread started")
-
-    def _stop_reader_thread(self):
-        """Stop reader thread and close socketpair"""
-        if self._reader_thread is None:
-            return
-        self._reader_running = False
-        self._reader_thread.join(timeout=2)
-        self._reader_sock_r.close()
-        self._reader_sock_w.close()
-        self._reader_thread = None
-        self._reader_sock_r = None
-        self._reader_sock_w = None
+            return None
 
     @property
     def name(self):
@@ -203,25 +261,60 @@ class SerialProxy():
         return self._max_connections
 
     def connect(self):
-        """Connect to serial port"""
-        if not self._serial:
-            if self._match:
-                try:
-                    self._serial_config['port'] = self.find_port_by_match(
-                        self._match)
-                except ValueError as err:
-                    self._log.warning(err)
-                    return False
+        """Connect to serial port
+
+        While device is missing in reconnect mode, new clients wait too.
+        """
+        if self._serial or self._lost_time is not None:
+            self._stop_tx_close()  # port is still closing, keep it open
+            return True
+        return self._open_port(_logging.WARNING)
+
+    def _open_port(self, level):
+        """Open serial port, log error with level, return True if opened"""
+        if self._match:
             try:
-                self._serial = _serial.Serial(**self._serial_config)
-            except (_serial.SerialException, OSError) as err:
-                self._log.warning(err)
+                self._serial_config['port'] = self.find_port_by_match(
+                    self._match)
+            except ValueError as err:
+                self._log.log(level, err)
                 return False
+        try:
+            self._serial = self._open_serial()
+        except (_serial.SerialException, OSError) as err:
+            self._log.log(level, err)
+            if self._match:
+                del self._serial_config['port']
+            return False
+        self._log.info(
+            "Serial %s connected", self._serial_config['port'])
+        self._tx_fd = self._serial_fd()
+        if self._tx_fd is not None:
+            _os.set_blocking(self._tx_fd, False)
+        if self._lost_time is not None:
+            self._last_downtime = _time.monotonic() - self._lost_time
+            self._reopens += 1
             self._log.info(
-                "Serial %s connected", self._serial_config['port'])
-            self._start_reader_thread_if_needed()
+                "Serial %s back after %.3f s, %d bytes queued",
+                self._serial_config['port'], self._last_downtime,
+                self._tx.size)
+        self._stop_reconnect()
+        if self._tx.size and self._tx_fd is None:
+            self._serial.write(self._tx.pop_all())
+            self._update_tx()
+        if self._loop:
+            self._register_serial()
+            self._start_signal_timer()
         return True
 
+    def _open_serial(self):
+        """Open serial port, port with '://' is pyserial URL (rfc2217://)"""
+        port = self._serial_config.get('port', '')
+        if '://' in port:
+            config = dict(self._serial_config)
+            return _serial.serial_for_url(config.pop('port'), **config)
+        return _serial.Serial(**self._serial_config)
+
     def has_connections(self):
         """Check if there are any active connections"""
         for server in self._servers:
@@ -240,32 +333,142 @@ class SerialProxy():
         return True
 
     def disconnect(self):
-        """Disconnect serial port, but if there are no active connections"""
-        if self._serial and not self.has_connections():
-            self._stop_reader_thread()
+        """Disconnect serial port, but if there are no active connections
+
+        With keep_open port stays open.
+        """
+        if self.has_connections() or self._keep_open:
+            return
+        if self._lost_time is not None:
+            self._stop_reconnect()  # last waiting client left
+            self._drop_tx()
+        if self._serial and self._tx.size and self._tx_fd is not None \
+                and self._loop:
+            self._start_tx_close()
+        elif self._serial:
+            self._close_serial()
+
+    def _start_tx_close(self):
+        """Close port when queue is written, at most after TX_CLOSE_TIMEOUT
+
+        Data received from clients before they disconnected are written
+        by writable events, the loop is not blocked.
+        """
+        if self._tx_close_timer is None:
+            self._tx_close_timer = self._loop.call_later(
+                self.TX_CLOSE_TIMEOUT, self._tx_close_expired)
+
+    def _stop_tx_close(self):
+        """Cancel pending close after queue is written"""
+        if self._tx_close_timer is not None:
+            self._tx_close_timer.cancel()
+            self._tx_close_timer = None
+
+    def _tx_close_expired(self):
+        """Queue was not written in TX_CLOSE_TIMEOUT, close port anyway"""
+        self._tx_close_timer = None
+        if self._serial:
+            self._close_serial()
+
+    def _close_serial(self, flush=True):
+        """Close serial port, flush=False when device is gone"""
+        self._stop_tx_close()
+        self._unregister_serial()
+        self._stop_signal_timer()
+        if flush:
+            self._close_tx()
+        else:
+            self._tx_fd = None
+        try:
             self._serial.close()
-            self._serial = None
-            self._log.info(
-                "Serial %s disconnected", self._serial_config['port'])
-            if getattr(self, '_match', None):
-                del self._serial_config['port']
+        except (OSError, _serial.SerialException):
+            pass
+        self._serial = None
+        self._log.info(
+            "Serial %s disconnected", self._serial_config['port'])
+        if getattr(self, '_match', None):
+            del self._serial_config['port']
 
     def close(self):
         """Close socket and all connections"""
         while self._servers:
             self._servers.pop().close()
+        self._drop_tx()
+        self._keep_open = False
+        self._stop_reconnect()
+        if self._loop:
+            _port_inventory.shared_inventory().remove_listener(self._hotplug)
+        if self._capture:
+            self.remove_monitor(self._capture.record)
+            self._capture.close()
+            self._capture = None
         self.disconnect()
 
+    @property
+    def reconnect_stats(self):
+        """Return keep_open/reconnect state"""
+        return {
+            'keep_open': self._keep_open,
+            'reconnect': self._reconnect,
+            'waiting': self._lost_time is not None,
+            'reopens': self._reopens,
+            'last_downtime': round(self._last_downtime, 3) \
+                if self._last_downtime is not None else None,
+        }
+
+    @property
+    def capture_stats(self):
+        """Return capture counters or None if capture is disabled"""
+        return self._capture.stats if self._capture else None
+
+    def _hotplug(self):
+        """Device added or removed, open missing device immediately"""
+        if not self._serial:
+            self._reopen()
+
+    def _reopen(self):
+        """Try to open missing device, schedule next attempt on failure"""
+        self._reconnect_timer = None
+        if self._serial:
+            return
+        if self._lost_time is not None and self._reconnect_timeout \
+                and _time.monotonic() - self._lost_time \
+                > self._reconnect_timeout:
+            self._log.warning(
+                "Serial %s not back in %s s, closing clients",
+                self._serial_config.get('port', self._match),
+                self._reconnect_timeout)
+            self._lost_time = None
+            self._drop_tx()
+            if self._tx_paused:
+                self._pause_clients(False)
+            for server in self._servers:
+                server.close_connections()
+        if self._lost_time is None and not self._keep_open:
+            return
+        inventory = _port_inventory.shared_inventory()
+        if self._match and not inventory.has_monitor:
+            inventory.invalidate()  # no hotplug events, scan on every try
+        if self._open_port(_logging.DEBUG):
+            return
+        if self._loop and self._reconnect_timer is None:
+            self._reconnect_timer = self._loop.call_later(
+                self.RECONNECT_INTERVAL, self._reopen)
+
+    def _stop_reconnect(self):
+        """Stop waiting for device"""
+        self._lost_time = None
+        if self._reconnect_timer is not None:
+            self._reconnect_timer.cancel()
+            self._reconnect_timer = None
+
     def read_sockets(self):
         """Return all sockets for reading"""
         sockets = []
         for server in self._servers:
             sockets += server.read_sockets()
-        if self._serial:
-            if self._reader_sock_r:
-                sockets.append(self._reader_sock_r)
-            else:
-                sockets.append(self._serial)
+        if self._serial and not self._reader:
+            sockets.append(self._serial)
         return sockets
 
     def write_sockets(self):
@@ -273,6 +476,8 @@ class SerialProxy():
         sockets = []
         for server in self._servers:
             sockets += server.write_sockets()
+        if self._tx.size:
+            sockets.append(self._serial)
         return sockets
 
     def send_to_connections(self, data):
@@ -280,37 +485,203 @@ class SerialProxy():
         for server in self._servers:
             server.send(data)
 
+    def replay(self, send, max_bytes=None, seconds=None):
+        """Call send() with history chunks for newly connected client
+
+        Replays last max_bytes and/or data received in last seconds.
+        """
+        since = _time.time() - seconds if seconds is not None else None
+        for chunk in self._history.select(max_bytes, since):
+            send(chunk)
+
+    def history_data(self, since=None, until=None, max_bytes=None):
+        """Return history received between since and until (time.time())"""
+        return b''.join(self._history.select(max_bytes, since, until))
+
+    @property
+    def history_stats(self):
+        """Return history size and content"""
+        return self._history.stats
+
+    @property
+    def read_stats(self):
+        """Return serial read counters"""
+        return {
+            'wakeups': self._wakeups,
+            'reads': self._reads,
+            'bytes': self._read_bytes,
+            'reads_per_wakeup': round(
+                self._reads / self._wakeups, 2) if self._wakeups else 0,
+            'bytes_per_read': \
+                self._read_bytes // self._reads if self._reads else 0,
+            'max_reads_per_wakeup': self._max_reads,
+            'budget_exhausted': self._budget_hits,
+        }
+
+    def _read_serial(self, first):
+        """Read waiting serial data, None if no more data are waiting
+
+        Empty data mean closed port, first read after wakeup can not be
+        empty (port is readable but has no data when unplugged).
+        """
+        if self._reader:
+            return self._reader.read()
+        waiting = self._serial.in_waiting
+        if not waiting and not first:
+            return None
+        return self._serial.read(size=waiting)
+
     def _process_serial_data(self):
-        """Read and forward serial data to connections"""
+        """Read and forward serial data to connections
+
+        Reads while data are waiting, up to drain_bytes or drain_time per
+        wakeup so one busy port does not starve others.
+        """
+        reads = 0
+        size = 0
+        deadline = _time.monotonic() + self._drain_time
         try:
-            if self._reader_sock_r:
-                data = self._reader_sock_r.recv(4096)
-            else:
-                data = self._serial.read(size=self._serial.in_waiting)
-            if data:
+            while True:
+                data = self._read_serial(first=not reads)
+                if data is None:
+                    break
+                if not data:
+                    raise OSError("Serial reader closed")
+                reads += 1
+                size += len(data)
                 self._log.debug("(%s): %s", self._serial_config['port'], data)
                 self.send_to_connections(data)
+                self._history.append(data)
                 self._notify_monitors(2, data)  # RX
-            else:
-                raise OSError("Serial reader closed")
+                if not self._serial:
+                    break  # disconnected when last client was removed
+                if size >= self._drain_bytes \
+                        or _time.monotonic() >= deadline:
+                    self._budget_hits += 1
+                    if self._reader:
+                        self._reader.reschedule()
+                    break
         except (OSError, _serial.SerialException) as err:
-            self._log.warning(err)
+            self._serial_error(err)
+        finally:
+            self._wakeups += 1
+            self._reads += reads
+            self._read_bytes += size
+            self._max_reads = max(self._max_reads, reads)
+
+    def _serial_error(self, err):
+        """Close all connections and serial port after serial error
+
+        In reconnect mode clients stay connected and data from them are
+        queued until device is back. With keep_open or reconnect device is
+        opened again when it appears.
+        """
+        self._log.warning(err)
+        if self._reconnect and self.has_connections():
+            self._close_serial(flush=False)
+            self._lost_time = _time.monotonic()
+        else:
+            self._drop_tx()
             for server in self._servers:
                 server.close_connections()
-            self.disconnect()
+            self._close_serial(flush=False)
+            if self._tx_paused:
+                self._pause_clients(False)
+        if self._lost_time is not None or self._keep_open:
+            self._reopen()
+
+    @property
+    def tx_stats(self):
+        """Return serial TX queue state"""
+        owner = self._tx.owner
+        return {
+            'pending': self._tx.size,
+            'paused': self._tx_paused,
+            'policy': self._tx.policy,
+            'lock_owner': self._source_name(owner) if owner else None,
+            'dropped': self._tx.dropped,
+        }
+
+    @staticmethod
+    def _source_name(source):
+        """Return address of client connection (TCP or WebSocket)"""
+        if hasattr(source, 'address_str'):
+            return source.address_str()
+        addr = getattr(source, 'addr', None)
+        if isinstance(addr, tuple) and len(addr) >= 2:
+            return '%s:%d' % (addr[0], addr[1])
+        return str(addr)
+
+    def _write_tx(self):
+        """Write queued data until queue is empty or port would block"""
+        while True:
+            data = self._tx.peek()
+            if data is None:
+                break
+            try:
+                written = _os.write(self._tx_fd, data)
+            except BlockingIOError:
+                break
+            self._tx.consume(written)
+
+    def _update_tx(self):
+        """Set write interest and client backpressure by queue size"""
+        if self._loop and self._serial:
+            self._loop.set_write(self._serial, bool(self._tx.size))
+        if not self._tx_paused and self._tx.size >= self._tx_limit:
+            self._pause_clients(True)
+        elif self._tx_paused and self._tx.size <= self._tx_limit // 2:
+            self._pause_clients(False)
+
+    def _pause_clients(self, paused):
+        """Stop or resume reading data from clients of all servers"""
+        self._log.debug(
+            "(%s): TX queue %d B, clients %s",
+            self._serial_config.get('port', self._match), self._tx.size,
+            'paused' if paused else 'resumed')
+        self._tx_paused = paused
+        for server in self._servers:
+            server.pause_reading(paused)
+
+    def _process_serial_write(self):
+        """Serial port is writable, write queued data"""
+        try:
+            self._write_tx()
+        except OSError as err:
+            self._serial_error(err)
+            return
+        self._update_tx()
+        if self._tx_close_timer is not None and not self._tx.size:
+            self._close_serial()
+
+    def _drop_tx(self):
+        """Drop queued data"""
+        self._tx.clear()
+
+    def _close_tx(self):
+        """Drop rest of queue and reset non-blocking TX state"""
+        if self._tx.size:
+            self._log.warning(
+                "(%s): %d queued bytes not written",
+                self._serial_config['port'], self._tx.size)
+        self._drop_tx()
+        self._tx_fd = None
+        if self._tx_paused:
+            self._pause_clients(False)
 
     def process_read(self, read_sockets):
         """Process sockets with read event"""
         for server in self._servers:
             server.process_read(read_sockets)
-        serial_sock = self._reader_sock_r or self._serial
-        if self._serial and serial_sock in read_sockets:
+        if self._serial and self._serial in read_sockets:
             self._process_serial_data()
 
     def process_write(self, write_sockets):
         """Process sockets with write event"""
         for server in self._servers:
             server.process_write(write_sockets)
+        if self._tx.size and self._serial in write_sockets:
+            self._process_serial_write()
 
     def process_stale(self):
         """Remove stale connections"""
@@ -320,16 +691,69 @@ class SerialProxy():
 
     def set_rts(self, value):
         """Set RTS signal and broadcast report to all clients"""
-        if self._serial:
-            self._serial.rts = value
+        if self._set_serial('rts', value):
             self._broadcast_signals()
 
     def set_dtr(self, value):
         """Set DTR signal and broadcast report to all clients"""
-        if self._serial:
-            self._serial.dtr = value
+        if self._set_serial('dtr', value):
             self._broadcast_signals()
 
+    def _set_serial(self, name, value):
+        """Set attribute of open serial port, return True if set"""
+        if not self._serial:
+            return False
+        previous = getattr(self._serial, name)
+        try:
+            setattr(self._serial, name, value)
+        except Exception as err:  # pylint: disable=W0718 (termios.error)
+            self._log.warning(
+                "(%s): %s=%s not set: %s",
+                self._serial_config['port'], name, value, err)
+            try:
+                # pyserial keeps value which was not applied
+                setattr(self._serial, name, previous)
+            except Exception:  # pylint: disable=W0718
+                pass
+            return False
+        return True
+
+    def get_port_setting(self, name):
+        """Return setting of serial port (baudrate, parity, ...)
+
+        Setting of configuration is returned while port is closed.
+        """
+        if self._serial:
+            return getattr(self._serial, name)
+        return self._serial_config.get(name)
+
+    def set_port_setting(self, name, value):
+        """Change setting of open serial port, return applied value
+
+        Changed setting is kept until port is closed, then configuration
+        applies again.
+        """
+        if self._set_serial(name, value):
+            self._log.info(
+                "(%s): %s set to %s", self._serial_config['port'], name, value)
+        return self.get_port_setting(name)
+
+    def purge(self, receive=False, transmit=False):
+        """Drop data in serial port buffers, transmit also TX queue"""
+        if transmit:
+            self._drop_tx()
+            self._update_tx()
+        if not self._serial:
+            return
+        try:
+            if receive:
+                self._serial.reset_input_buffer()
+            if transmit:
+                self._serial.reset_output_buffer()
+        except (OSError, _serial.SerialException) as err:
+            self._log.warning(
+                "(%s): purge failed: %s", self._serial_config['port'], err)
+
     def get_signals(self):
         """Get current signal states as bitmask"""
         if not self._serial:
@@ -367,17 +791,74 @@ class SerialProxy():
         if now - self._last_signal_poll < self._signal_poll_interval:
             return
         self._last_signal_poll = now
+        self._check_signals()
+
+    def _check_signals(self):
+        """Read serial signals and broadcast if changed"""
         bitmask = self.get_signals()
         if bitmask != self._last_signals:
             self._last_signals = bitmask
             for server in self._servers:
                 server.send_signal_report(bitmask)
 
-    def send(self, data):
-        """Send data to serial port"""
+    def _start_signal_timer(self):
+        """Schedule signal polling if any server has control enabled"""
+        if self._has_control_servers and self._signal_timer is None:
+            self._signal_timer = self._loop.call_later(
+                self._signal_poll_interval, self._poll_signals)
+
+    def _stop_signal_timer(self):
+        """Cancel signal polling"""
+        if self._signal_timer is not None:
+            self._signal_timer.cancel()
+            self._signal_timer = None
+
+    def _poll_signals(self):
+        """Signal polling timer callback"""
+        self._signal_timer = None
         if self._serial:
-            self._serial.write(data)
-            self._notify_monitors(1, data)  # TX
+            self._check_signals()
+            self._start_signal_timer()
+
+    def send(self, data, source=None, priority=0):
+        """Send data from client (source) to serial port
+
+        Data are queued by TX arbiter policy. With file descriptor they
+        are written when port is writable, clients are not read while queue
+        is over tx_buffer_limit. Data over tx_queue_limit (from clients
+        which can not be paused) are dropped. Otherwise data are written
+        by blocking write.
+        """
+        if not self._serial and self._lost_time is None:
+            return
+        full = self._tx.is_full(len(data))
+        if not self._tx.push(data, source, priority):
+            if full:
+                self._log.debug(
+                    "(%s): %d bytes dropped, TX queue full",
+                    self._serial_config.get('port', self._match), len(data))
+            else:
+                self._log.debug(
+                    "(%s): %d bytes dropped, port locked by %s",
+                    self._serial_config.get('port', self._match), len(data),
+                    self._source_name(self._tx.owner))
+            return
+        if not self._serial:
+            self._update_tx()  # device is missing, only queue
+        elif self._tx_fd is None:
+            self._serial.write(self._tx.pop_all())
+        else:
+            try:
+                self._write_tx()
+            except OSError as err:
+                self._serial_error(err)
+                return
+            self._update_tx()
+        self._notify_monitors(1, data)  # TX
+
+    def release(self, source):
+        """Client disconnected, release its TX lock"""
+        self._tx.release(source)
 
     def add_monitor(self, callback):
         """Register monitor callback - receives (direction, data)"""
@@ -392,6 +873,8 @@ class SerialProxy():
     def _notify_monitors(self, direction, data):
         """Notify all monitors - direction: 1=TX, 2=RX"""
         if self._monitors:
+            if not isinstance(data, bytes):
+                data = bytes(data)  # memoryview of reused receive buffer
             self._log.debug(
                 "Monitor notify: dir=%d len=%d monitors=%d",
                 direction, len(data), len(self._monitors))
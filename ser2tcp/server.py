@@ -2,17 +2,25 @@
 
 # pylint: disable=C0209
 
+import errno as _errno
+import functools as _functools
 import logging as _logging
 import os as _os
 import socket as _socket
 import ssl as _ssl
+import time as _time
 
+import ser2tcp.coalescer as _coalescer
 import ser2tcp.connection_control as _connection_control
+import ser2tcp.connection_rfc2217 as _connection_rfc2217
 import ser2tcp.connection_socket as _connection_socket
 import ser2tcp.connection_ssl as _connection_ssl
 import ser2tcp.connection_tcp as _connection_tcp
 import ser2tcp.connection_telnet as _connection_telnet
+import ser2tcp.history as _history
 import ser2tcp.ip_filter as _ip_filter
+import ser2tcp.socket_options as _socket_options
+import ser2tcp.tx_arbiter as _tx_arbiter
 
 
 class ConfigError(Exception):
@@ -22,6 +30,11 @@ class ConfigError(Exception):
 class Server():
     """Server connection manager"""
 
+    SSL_HANDSHAKE_TIMEOUT = 10.  # seconds for TLS handshake of new client
+    ACCEPT_RETRY = .1  # seconds listener is paused when out of descriptors
+    ACCEPT_LOG_INTERVAL = 10.  # min seconds between accept failure warnings
+    ACCEPT_RESOURCE_ERRORS = (_errno.EMFILE, _errno.ENFILE, _errno.ENOBUFS)
+
     CONNECTIONS = {
         'TCP': _connection_tcp.ConnectionTcp,
         'TELNET': _connection_telnet.ConnectionTelnet,
@@ -34,15 +47,27 @@ class Server():
         self._config = config
         self._serial = ser
         self._connections = []
+        self._connection_sockets = {}  # socket -> connection
+        self._handshakes = {}  # socket -> [connection, deadline, timer]
         self._protocol = self._config['protocol'].upper()
         self._send_timeout = self._config.get('send_timeout')
         self._buffer_limit = self._config.get('buffer_limit')
         self._control = self._config.get('control')
+        self._rfc2217 = self._config.get('rfc2217', False)
         self._data_enabled = self._config.get('data', True)
         self._max_connections = self._config.get('max_connections', 0)
+        self._accept_batch = self._config.get('accept_batch', 0)
+        self._priority = self._config.get('priority', 0)
+        self._reading_paused = False
         self._ip_filter = _ip_filter.create_filter(self._config, log=self._log)
         self._ssl_context = None
+        self._handshake_timeout = self.SSL_HANDSHAKE_TIMEOUT
+        self._accept_timer = None
+        self._accept_resume = 0.  # monotonic time of resume without loop
+        self._accept_log_time = None
+        self._accept_failures = 0  # failures since last warning
         self._socket = None
+        self._loop = None
         if self._protocol not in self.CONNECTIONS:
             raise ConfigError('Unknown protocol %s' % self._protocol)
         if not self._data_enabled and not self._control:
@@ -51,6 +76,29 @@ class Server():
         if self._control and self._protocol == 'TELNET':
             raise ConfigError(
                 'Control protocol not supported with TELNET')
+        if isinstance(self._accept_batch, bool) \
+                or not isinstance(self._accept_batch, int) \
+                or self._accept_batch < 0:
+            raise ConfigError('accept_batch must be 0 or positive integer')
+        error = _coalescer.validate_config(self._config) \
+            or _socket_options.validate_config(self._config) \
+            or _tx_arbiter.validate_priority(self._config) \
+            or _history.validate_replay(self._config) \
+            or _connection_rfc2217.validate_config(self._config)
+        if error:
+            raise ConfigError(error)
+        self._replay = _history.replay_options(self._config)
+        if self._replay is not None and self._buffer_limit:
+            # replayed history must fit into connection buffer
+            max_bytes = self._replay.get('max_bytes')
+            if max_bytes is None or max_bytes > self._buffer_limit:
+                self._replay['max_bytes'] = self._buffer_limit
+        self._coalescer = _coalescer.Coalescer(
+            self._config, self._send_connections)
+        self._socket_options = _socket_options.SocketOptions(
+            self._config.get('socket_options'),
+            nodelay=self._coalescer.mode == 'latency',
+            tcp=self._protocol != 'SOCKET', log=self._log)
         if self._protocol == 'SOCKET':
             self._log.info(
                 "  Server: %s %s",
@@ -75,7 +123,9 @@ class Server():
             self._socket.setsockopt(
                 _socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
             self._socket.bind((config['address'], config['port']))
-        self._socket.listen(1)
+        self._socket_options.apply_listen(self._socket)
+        self._socket.listen(self._socket_options.backlog)
+        self._socket.setblocking(False)
 
     def __del__(self):
         self.close()
@@ -88,6 +138,12 @@ class Server():
         ca_certs = ssl_config.get('ca_certs')
         if not certfile or not keyfile:
             raise ConfigError('SSL protocol requires certfile and keyfile')
+        timeout = ssl_config.get(
+            'handshake_timeout', self.SSL_HANDSHAKE_TIMEOUT)
+        if isinstance(timeout, bool) \
+                or not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ConfigError('ssl.handshake_timeout must be positive number')
+        self._handshake_timeout = timeout
         context = _ssl.SSLContext(_ssl.PROTOCOL_TLS_SERVER)
         context.load_cert_chain(certfile, keyfile)
         if ca_certs:
@@ -95,6 +151,45 @@ class Server():
             context.verify_mode = _ssl.CERT_REQUIRED
         return context
 
+    def attach(self, loop):
+        """Register listening socket and connections in event loop"""
+        self._loop = loop
+        self._coalescer.attach(loop)
+        loop.register(self._socket, self._client_connect)
+        for con in self._connections:
+            self._attach_connection(con)
+
+    def _attach_connection(self, con):
+        """Register connection socket with its handlers in event loop"""
+        self._loop.register(
+            con.socket(),
+            _functools.partial(self._read_connection, con),
+            _functools.partial(self._write_connection, con))
+        con.attach(self._loop, self._send_timeout_expired)
+        if self._reading_paused:
+            self._loop.set_read(con.socket(), False)
+
+    def _add_connection(self, con):
+        """Add accepted connection, replay port history to it"""
+        # pending batch is already in history, send it to others first
+        self._coalescer.flush()
+        self._connections.append(con)
+        self._connection_sockets[con.socket()] = con
+        if self._loop:
+            self._attach_connection(con)
+        if self._data_enabled and self._replay is not None:
+            self._serial.replay(con.send, **self._replay)
+
+    def _close_connection(self, con):
+        """Unregister connection from event loop and close it"""
+        sock = con.socket()
+        if sock:
+            self._connection_sockets.pop(sock, None)
+            if self._loop:
+                self._loop.unregister(sock)
+        self._serial.release(con)
+        con.close()
+
     @property
     def protocol(self):
         """Return protocol name"""
@@ -125,16 +220,70 @@ class Server():
         """Return list of connections"""
         return self._connections
 
+    @property
+    def socket_options(self):
+        """Return effective socket options"""
+        return self._socket_options.as_dict()
+
+    @property
+    def batch_stats(self):
+        """Return forwarding mode and sent batches statistics"""
+        return self._coalescer.stats()
+
     def _client_connect(self):
-        """connect to client, will accept waiting connection"""
-        sock, addr = self._socket.accept()
+        """Accept all waiting connections, at most accept_batch (if set)"""
+        accepted = 0
+        while not self._accept_batch or accepted < self._accept_batch:
+            try:
+                sock, addr = self._socket.accept()
+            except BlockingIOError:
+                return
+            except OSError as err:
+                if err.errno in self.ACCEPT_RESOURCE_ERRORS:
+                    # pending client stays in backlog, listener would spin
+                    self._pause_accept(err)
+                else:
+                    # ECONNABORTED, ..: client is gone, accept next one
+                    self._log.warning("Accept failed: %s", err)
+                return
+            accepted += 1
+            self._accept_client(sock, addr)
+
+    def _pause_accept(self, err):
+        """Stop accepting for ACCEPT_RETRY, warn at most once per interval"""
+        now = _time.monotonic()
+        self._accept_failures += 1
+        if self._accept_log_time is None \
+                or now - self._accept_log_time >= self.ACCEPT_LOG_INTERVAL:
+            self._log.warning(
+                "Accept failed: %s (%d times), retrying",
+                err, self._accept_failures)
+            self._accept_log_time = now
+            self._accept_failures = 0
+        if self._loop:
+            if self._accept_timer is None:
+                self._loop.set_read(self._socket, False)
+                self._accept_timer = self._loop.call_later(
+                    self.ACCEPT_RETRY, self._resume_accept)
+        else:
+            self._accept_resume = now + self.ACCEPT_RETRY
+
+    def _resume_accept(self):
+        """Accept again after pause"""
+        self._accept_timer = None
+        if self._socket is not None:
+            self._loop.set_read(self._socket, True)
+
+    def _accept_client(self, sock, addr):
+        """Check limits and create connection for accepted socket"""
         if self._protocol == 'SOCKET':
             addr = (self._config['address'],)
         elif self._ip_filter and not self._ip_filter.is_allowed(addr[0]):
             self._log.info("Client rejected (IP filter): %s:%d", addr[0], addr[1])
             sock.close()
             return
-        if self._max_connections > 0 and len(self._connections) >= self._max_connections:
+        if self._max_connections > 0 and len(self._connections) \
+                + len(self._handshakes) >= self._max_connections:
             self._log.info(
                 "Client rejected (server limit): %s:%d", addr[0], addr[1])
             sock.close()
@@ -144,6 +293,7 @@ class Server():
                 "Client rejected (port limit): %s:%d", addr[0], addr[1])
             sock.close()
             return
+        self._socket_options.apply_client(sock)
         kwargs = {
             'connection': (sock, addr),
             'ser': self._serial,
@@ -154,6 +304,8 @@ class Server():
         if self._ssl_context:
             kwargs['ssl_context'] = self._ssl_context
         connection_class = self.CONNECTIONS[self._protocol]
+        if self._rfc2217:
+            connection_class = _connection_rfc2217.ConnectionRfc2217
         if self._control:
             connection_class = _connection_control.wrap_control(
                 connection_class, self._control, self._data_enabled)
@@ -165,20 +317,88 @@ class Server():
             if not self._connections:
                 self._serial.disconnect()
             return
+        connection.tx_priority = self._priority
+        if self._ssl_context:
+            self._start_handshake(connection)
+        else:
+            self._connect_serial(connection)
+
+    def _connect_serial(self, connection):
+        """Open serial port for connection and add it"""
         if self._serial.connect():
-            self._connections.append(connection)
+            self._add_connection(connection)
         else:
             connection.close()
 
+    def _start_handshake(self, con):
+        """Keep SSL connection until its TLS handshake is complete
+
+        Handshake continues on socket events (or process_read/write
+        without event loop), it is closed after handshake timeout.
+        """
+        sock = con.socket()
+        timer = None
+        if self._loop:
+            handler = _functools.partial(self._handshake, con)
+            self._loop.register(sock, handler, handler)
+            timer = self._loop.call_later(
+                self._handshake_timeout, self._handshake_expired, con)
+        self._handshakes[sock] = [
+            con, _time.monotonic() + self._handshake_timeout, timer]
+        self._handshake(con)
+
+    def _end_handshake(self, con):
+        """Stop handshake of connection, unregister its socket"""
+        sock = con.socket()
+        _, _, timer = self._handshakes.pop(sock)
+        if timer is not None:
+            timer.cancel()
+        if self._loop:
+            self._loop.unregister(sock)
+
+    def _handshake(self, con):
+        """Continue TLS handshake, add connection when it is complete"""
+        try:
+            done = con.do_handshake()
+        except _connection_ssl.SslHandshakeError as err:
+            self._log.info("Client rejected: %s (%s)", con.address_str(), err)
+            self._end_handshake(con)
+            con.close()
+            return
+        if not done:
+            if self._loop:
+                self._loop.set_write(con.socket(), con.handshake_wants_write)
+            return
+        self._end_handshake(con)
+        self._connect_serial(con)
+        if con.socket() in self._connection_sockets and con.pending_input():
+            self._read_connection(con)  # data received with handshake end
+
+    def _handshake_expired(self, con):
+        """Close connection which did not complete handshake in time"""
+        self._log.info(
+            "Client rejected: %s (SSL handshake timeout)", con.address_str())
+        self._end_handshake(con)
+        con.close()
+
     def close_connections(self):
         """close all clients"""
+        for con, _, _ in list(self._handshakes.values()):
+            self._end_handshake(con)
+            con.close()
         while self._connections:
-            self._connections.pop().close()
+            self._close_connection(self._connections.pop())
 
     def close(self):
         """Close socket and all connections"""
         if self._socket is not None:
+            if self._accept_timer is not None:
+                self._accept_timer.cancel()
+                self._accept_timer = None
+            self._coalescer.close()
             self.close_connections()
+            if self._loop:
+                self._loop.unregister(self._socket)
             self._socket.close()
             self._socket = None
             if self._protocol == 'SOCKET':
@@ -186,20 +406,38 @@ class Server():
                 if _os.path.exists(sock_path):
                     _os.unlink(sock_path)
 
+    def pause_reading(self, paused):
+        """Stop or resume reading from clients (serial TX backpressure)"""
+        self._reading_paused = paused
+        if self._loop:
+            for con in self._connections:
+                self._loop.set_read(con.socket(), not paused)
+        if not paused:
+            # socket is not readable when TLS layer already holds data
+            for con in list(self._connections):
+                if con in self._connections and con.pending_input():
+                    self._read_connection(con)
+
     def has_connections(self):
         """True if server has some connections"""
         return bool(self._connections)
 
     def read_sockets(self):
         """Return sockets for reading (server + all clients)"""
-        sockets = [self._socket]
-        for con in self._connections:
-            sockets.append(con.socket())
+        sockets = []
+        if _time.monotonic() >= self._accept_resume:
+            sockets.append(self._socket)
+        sockets.extend(self._handshakes)
+        if not self._reading_paused:
+            for con in self._connections:
+                sockets.append(con.socket())
         return sockets
 
     def write_sockets(self):
         """Return sockets for writing (clients with pending data)"""
-        sockets = []
+        sockets = [
+            sock for sock, (con, _, _) in self._handshakes.items()
+            if con.handshake_wants_write]
         for con in self._connections:
             if con.has_pending_data():
                 sockets.append(con.socket())
@@ -207,56 +445,92 @@ class Server():
 
     def _remove_connection(self, con):
         """Remove connection and disconnect serial if no connections left"""
-        con.close()
+        self._close_connection(con)
         self._connections.remove(con)
         if not self._connections:
             self._serial.disconnect()
 
+    def _read_connection(self, con):
+        """Receive data from connection, including data buffered by TLS"""
+        while True:
+            try:
+                data = con.receive()
+            except (_ssl.SSLWantReadError, _ssl.SSLWantWriteError):
+                return  # TLS record is not complete yet
+            except OSError as err:
+                # reset, SSL error, keepalive or user timeout (ETIMEDOUT)
+                self._log.info("(%s): %s", con.address_str(), err)
+                data = b''
+            if not data:
+                self._remove_connection(con)
+                return
+            if self._log.isEnabledFor(_logging.DEBUG):
+                self._log.debug("(%s): %s", con.address_str(), bytes(data))
+            con.on_received(data)
+            if self._reading_paused or not con.pending_input():
+                return
+
+    def _write_connection(self, con):
+        """Flush connection output buffer"""
+        if con.flush() is None:
+            self._remove_connection(con)
+
     def process_read(self, read_sockets):
         """Process sockets with read event"""
         if self._socket in read_sockets:
             self._client_connect()
-        for con in list(self._connections):
-            if con.socket() in read_sockets:
-                data = b''
-                try:
-                    data = con.socket().recv(4096)
-                    self._log.debug("(%s): %s", con.address_str(), data)
-                except (ConnectionResetError, _ssl.SSLError) as err:
-                    self._log.info("(%s): %s", con.address_str(), err)
-                if not data:
-                    self._remove_connection(con)
-                    continue
-                con.on_received(data)
+        for sock in read_sockets:
+            if sock in self._handshakes:
+                self._handshake(self._handshakes[sock][0])
+                continue
+            con = self._connection_sockets.get(sock)
+            if con is not None:
+                self._read_connection(con)
 
     def process_write(self, write_sockets):
         """Process sockets with write event, flush buffers"""
-        for con in list(self._connections):
-            if con.socket() in write_sockets:
-                result = con.flush()
-                if result is None:
-                    self._log.info(
-                        "(%s): write error", con.address_str())
-                    self._remove_connection(con)
+        for sock in write_sockets:
+            if sock in self._handshakes:
+                self._handshake(self._handshakes[sock][0])
+                continue
+            con = self._connection_sockets.get(sock)
+            if con is not None:
+                self._write_connection(con)
+
+    def _send_timeout_expired(self, con):
+        """Remove connection which did not accept data in send timeout"""
+        self._log.info("(%s): send timeout", con.address_str())
+        self._remove_connection(con)
 
     def process_stale(self):
-        """Remove stale connections (send timeout expired)"""
+        """Remove stale connections (send or handshake timeout expired)"""
+        now = _time.monotonic()
+        for con, deadline, _ in list(self._handshakes.values()):
+            if now > deadline:
+                self._handshake_expired(con)
         for con in list(self._connections):
             if con.is_stale():
-                self._log.info(
-                    "(%s): send timeout", con.address_str())
-                self._remove_connection(con)
+                self._send_timeout_expired(con)
 
     def send(self, data):
-        """Send data to all connections"""
+        """Send data to all connections, coalesced in throughput mode"""
         if not self._data_enabled:
             return
+        self._coalescer.push(data)
+
+    def _send_connections(self, data):
+        """Queue data to all connections, encoded once per ENCODING"""
+        encoded = {}
         for con in self._connections:
-            con.send(data)
+            payload = encoded.get(con.ENCODING)
+            if payload is None:
+                payload = encoded[con.ENCODING] = con.encode(data)
+            con.send_encoded(payload)
 
     def send_signal_report(self, bitmask):
-        """Send signal report to all control-enabled connections"""
-        if not self._control:
+        """Send signal report to all control or RFC 2217 connections"""
+        if not self._control and not self._rfc2217:
             return
+        self._coalescer.flush()  # keep order of data and reports
         for con in self._connections:
             con.send_signal_report(bitmask)
@@ -1,17 +1,132 @@
 """Server manager"""
 
-import select as _select
+import collections as _collections
+import functools as _functools
+import heapq as _heapq
+import selectors as _selectors
+import socket as _socket
+import time as _time
+
+
+class Timer():
+    """Callback scheduled by ServersManager.call_later() or call_at()"""
+
+    __slots__ = ('when', '_callback', '_args')
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self._callback = callback
+        self._args = args
+
+    def __lt__(self, other):
+        return self.when < other.when
+
+    @property
+    def cancelled(self):
+        """True if timer was cancelled"""
+        return self._callback is None
+
+    def cancel(self):
+        """Cancel timer, callback will not be called"""
+        self._callback = None
+        self._args = None
+
+    def run(self):
+        """Call callback"""
+        if self._callback is not None:
+            self._callback(*self._args)
 
 
 class ServersManager():
-    """Servers manager"""
-    def __init__(self):
+    """Servers manager
+
+    Event loop with persistent registrations. Servers supporting attach()
+    register their sockets with read/write handlers when they are opened
+    or accepted and unregister them on close, connections enable write
+    interest only while they have pending data. Other servers
+    (read_sockets/write_sockets interface) are synchronized into the
+    event loop on every iteration.
+
+    Every ready file object is dispatched directly to its handlers, so
+    cost of one event does not depend on number of ports and clients.
+
+    Periodic work (send timeouts, signal polling, session expiry) is
+    scheduled by call_later() into heap of timers, select waits until
+    nearest deadline. Only servers without attach() get process_stale()
+    called periodically.
+
+    set_read() pauses reading of file object, used for backpressure when
+    serial port can not accept more data from clients.
+
+    call_soon_threadsafe() hands callbacks from other threads (shared
+    serial reader) through queue and one wakeup byte per batch.
+    """
+
+    BACKENDS = {
+        'selectors': _selectors.DefaultSelector,
+        'select': _selectors.SelectSelector,
+    }
+    MAX_TIMEOUT = 1.
+    LEGACY_INTERVAL = .1
+
+    def __init__(self, backend=None):
+        self._backend = backend if backend else 'selectors'
         self._servers = []
+        self._legacy = {}  # server -> (read set, write set) registered
+        self._legacy_timer = None
         self._running = False
+        self._open_backend()
+
+    def _open_backend(self):
+        """Create event loop state of backend (overridden by subclasses)"""
+        if self._backend not in self.BACKENDS:
+            raise ValueError(f"Unknown event loop backend: {self._backend}")
+        self._selector = self.BACKENDS[self._backend]()
+        self._idle = {}  # fileobj -> handlers, registered without interest
+        self._timers = []  # heap of Timer
+        self._ready = _collections.deque()  # callbacks from other threads
+        self._wakeup_pending = False
+        # stop() from signal handler or other thread interrupts select
+        self._wakeup_r, self._wakeup_w = _socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.register(self._wakeup_r, self._drain_wakeup)
+
+    @property
+    def backend(self):
+        """Return event loop backend name"""
+        return self._backend
 
     def stop(self, _signo=None, _stack_frame=None):
         """Stop the server manager loop"""
         self._running = False
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _drain_wakeup(self):
+        """Read wakeup bytes and run callbacks from other threads"""
+        try:
+            self._wakeup_r.recv(64)
+        except OSError:
+            pass
+        # cleared before queue is processed, so callback queued after
+        # this point always sends new wakeup
+        self._wakeup_pending = False
+        for _ in range(len(self._ready)):
+            callback, args = self._ready.popleft()
+            callback(*args)
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Call callback in event loop, can be called from other thread"""
+        self._ready.append((callback, args))
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            try:
+                self._wakeup_w.send(b'\0')
+            except OSError:
+                pass
 
     def run(self):
         """Run the server manager loop"""
@@ -23,28 +138,187 @@ class ServersManager():
     def add_server(self, server):
         """Add server"""
         self._servers.append(server)
+        if hasattr(server, 'attach'):
+            server.attach(self)
+        else:
+            self._legacy[server] = (set(), set())
+            if self._legacy_timer is None:
+                self._legacy_timer = self.call_later(
+                    self.LEGACY_INTERVAL, self._legacy_housekeeping)
 
     def remove_server(self, server):
         """Remove server"""
         self._servers.remove(server)
+        registered = self._legacy.pop(server, None)
+        if registered:
+            for sock in registered[0] | registered[1]:
+                self.unregister(sock)
 
-    def process(self):
-        """Process all servers"""
-        read_list = []
-        write_list = []
-        for server in self._servers:
-            read_list.extend(server.read_sockets())
-            write_list.extend(server.write_sockets())
-        ready = _select.select(read_list, write_list, [], .1)
-        read_sockets, write_sockets = ready[0], ready[1]
-        for server in self._servers:
-            if read_sockets:
-                server.process_read(read_sockets)
-            if write_sockets:
-                server.process_write(write_sockets)
+    def time(self):
+        """Return current time of timers clock"""
+        return _time.monotonic()
+
+    def call_at(self, when, callback, *args):
+        """Call callback at time (time() clock), return Timer"""
+        timer = Timer(when, callback, args)
+        _heapq.heappush(self._timers, timer)
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        """Call callback after delay seconds, return Timer"""
+        return self.call_at(self.time() + delay, callback, *args)
+
+    def register(self, fileobj, on_read, on_write=None):
+        """Register file object for reading with its event handlers"""
+        self._register(fileobj, (on_read, on_write), True, False)
+
+    def unregister(self, fileobj):
+        """Unregister file object, ignore if not registered"""
+        if self._idle.pop(fileobj, None) is not None:
+            return
+        try:
+            self._selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def set_write(self, fileobj, enabled):
+        """Enable or disable write interest for registered file object"""
+        self._modify(fileobj, write=enabled)
+
+    def set_read(self, fileobj, enabled):
+        """Enable or disable read interest (pause reading) of file object"""
+        self._modify(fileobj, read=enabled)
+
+    @staticmethod
+    def _events(read, write):
+        """Return selector event mask"""
+        events = 0
+        if read:
+            events |= _selectors.EVENT_READ
+        if write:
+            events |= _selectors.EVENT_WRITE
+        return events
+
+    def _register(self, fileobj, handlers, read, write):
+        """Register file object with handlers and interest"""
+        self._selector.register(
+            fileobj, self._events(read, write), handlers)
+
+    def _modify(self, fileobj, read=None, write=None):
+        """Change read and/or write interest of registered file object
+
+        Selector can not hold file object without events, such file
+        object is kept with its handlers aside until interest returns.
+        """
+        if fileobj in self._idle:
+            current, data = 0, self._idle[fileobj]
+        else:
+            try:
+                key = self._selector.get_key(fileobj)
+            except (KeyError, ValueError):
+                return
+            current, data = key.events, key.data
+        if read is None:
+            read = bool(current & _selectors.EVENT_READ)
+        if write is None:
+            write = bool(current & _selectors.EVENT_WRITE)
+        events = self._events(read, write)
+        if current == events:
+            return
+        if not events:
+            self._selector.unregister(fileobj)
+            self._idle[fileobj] = data
+        elif not current:
+            del self._idle[fileobj]
+            self._selector.register(fileobj, events, data)
+        else:
+            self._selector.modify(fileobj, events, data)
+
+    @staticmethod
+    def _legacy_handlers(server, sock):
+        """Create read/write handlers for socket of server without attach()"""
+        return (
+            _functools.partial(server.process_read, [sock]),
+            _functools.partial(server.process_write, [sock]))
+
+    def _sync_legacy(self):
+        """Synchronize sockets of servers without attach() support"""
+        for server, (reg_read, reg_write) in self._legacy.items():
+            read = set(server.read_sockets())
+            write = set(server.write_sockets())
+            for sock in (reg_read | reg_write) - (read | write):
+                self.unregister(sock)
+            for sock in read | write:
+                if sock in reg_read or sock in reg_write:
+                    if (sock in read) != (sock in reg_read) \
+                            or (sock in write) != (sock in reg_write):
+                        self._modify(sock, sock in read, sock in write)
+                else:
+                    self._register(
+                        sock, self._legacy_handlers(server, sock),
+                        sock in read, sock in write)
+            self._legacy[server] = (read, write)
+
+    def _is_current(self, key):
+        """False if key was unregistered (or its fd reused) since select"""
+        current = self._selector.get_map().get(key.fd)
+        return current is not None and current.data is key.data
+
+    def _legacy_housekeeping(self):
+        """Periodic process_stale() of servers without attach()"""
+        self._legacy_timer = None
+        if not self._legacy:
+            return
+        for server in list(self._legacy):
             server.process_stale()
+        self._legacy_timer = self.call_later(
+            self.LEGACY_INTERVAL, self._legacy_housekeeping)
+
+    def _select_timeout(self):
+        """Return time until nearest timer, at most MAX_TIMEOUT"""
+        while self._timers and self._timers[0].cancelled:
+            _heapq.heappop(self._timers)
+        if not self._timers:
+            return self.MAX_TIMEOUT
+        return min(
+            self.MAX_TIMEOUT, max(0, self._timers[0].when - self.time()))
+
+    def _run_timers(self):
+        """Run expired timers"""
+        now = self.time()
+        expired = []
+        while self._timers and self._timers[0].when <= now:
+            expired.append(_heapq.heappop(self._timers))
+        for timer in expired:
+            timer.run()
+
+    def process(self):
+        """Wait for events or nearest timer and dispatch them to handlers"""
+        self._sync_legacy()
+        for key, mask in self._selector.select(self._select_timeout()):
+            on_read, on_write = key.data
+            if mask & _selectors.EVENT_READ and self._is_current(key):
+                on_read()
+            if mask & _selectors.EVENT_WRITE and on_write \
+                    and self._is_current(key):
+                on_write()
+        self._run_timers()
 
     def close(self):
         """Close all servers"""
         for server in self._servers:
             server.close()
+        self._timers = []
+        self._idle = {}
+        self._selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+
+def create_servers_manager(event_loop=None):
+    """Create servers manager for configured event loop"""
+    if event_loop == 'asyncio':
+        # pylint: disable=C0415
+        import ser2tcp.server_manager_asyncio as _asyncio_manager
+        return _asyncio_manager.AsyncioServersManager()
+    return ServersManager(event_loop)
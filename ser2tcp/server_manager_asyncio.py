@@ -0,0 +1,154 @@
+"""Server manager running on asyncio event loop"""
+
+import asyncio as _asyncio
+import functools as _functools
+
+import ser2tcp.server_manager as _server_manager
+
+
+def new_event_loop():
+    """Create new event loop, uvloop if installed"""
+    try:
+        import uvloop as _uvloop  # pylint: disable=C0415
+    except ImportError:
+        return _asyncio.new_event_loop()
+    return _uvloop.new_event_loop()
+
+
+class AsyncioServersManager(_server_manager.ServersManager):
+    """Servers manager driven by asyncio (or uvloop) event loop
+
+    Registered file objects are watched by loop.add_reader() and
+    loop.add_writer(), timers are scheduled directly by loop.call_at().
+    Can be embedded into existing asyncio application: pass its running
+    loop and await serve() instead of calling run().
+    """
+
+    def __init__(self, loop=None):
+        self._owns_loop = loop is None
+        self._loop = loop if loop else new_event_loop()
+        super().__init__('asyncio')
+
+    def _open_backend(self):
+        """Event loop is asyncio loop, keep handlers of file objects"""
+        self._handlers = {}  # fileobj -> (on_read, on_write)
+        self._stopped = None
+        self._sync_pending = False
+        self._event_waiter = None
+
+    @property
+    def loop(self):
+        """Return asyncio event loop"""
+        return self._loop
+
+    def stop(self, _signo=None, _stack_frame=None):
+        """Stop the server manager loop, safe to call from signal handler"""
+        self._running = False
+        if self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def run(self):
+        """Run the server manager loop"""
+        try:
+            self._loop.run_until_complete(self.serve())
+        finally:
+            if self._owns_loop:
+                self._loop.close()
+
+    async def serve(self):
+        """Serve until stop() is called, then close all servers"""
+        self._running = True
+        self._stopped = _asyncio.Event()
+        self._sync_legacy()
+        try:
+            await self._stopped.wait()
+        finally:
+            self._stopped = None
+            self.close()
+
+    def time(self):
+        """Return current time of event loop clock"""
+        return self._loop.time()
+
+    def call_at(self, when, callback, *args):
+        """Call callback at time (time() clock), return asyncio.TimerHandle"""
+        return self._loop.call_at(when, callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        """Call callback after delay seconds, return asyncio.TimerHandle"""
+        return self._loop.call_later(delay, callback, *args)
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Call callback in event loop, can be called from other thread"""
+        self._loop.call_soon_threadsafe(
+            self._dispatch, _functools.partial(callback, *args))
+
+    def unregister(self, fileobj):
+        """Unregister file object, ignore if not registered"""
+        if self._handlers.pop(fileobj, None) is not None:
+            try:
+                self._loop.remove_reader(fileobj)
+                self._loop.remove_writer(fileobj)
+            except (ValueError, OSError):
+                pass
+
+    def _register(self, fileobj, handlers, read, write):
+        """Register file object with handlers and interest"""
+        self._handlers[fileobj] = handlers
+        self._modify(fileobj, read, write)
+
+    def _modify(self, fileobj, read=None, write=None):
+        """Change read and/or write interest of registered file object"""
+        handlers = self._handlers.get(fileobj)
+        if handlers is None:
+            return
+        on_read, on_write = handlers
+        if read is True:
+            self._loop.add_reader(fileobj, self._dispatch, on_read)
+        elif read is False:
+            self._loop.remove_reader(fileobj)
+        if write is True and on_write:
+            self._loop.add_writer(fileobj, self._dispatch, on_write)
+        elif write is False:
+            self._loop.remove_writer(fileobj)
+
+    def _dispatch(self, handler):
+        """Call event handler, then resync servers without attach()"""
+        handler()
+        if self._legacy and not self._sync_pending:
+            self._sync_pending = True
+            self._loop.call_soon(self._sync_legacy)
+        if self._event_waiter is not None \
+                and not self._event_waiter.done():
+            self._event_waiter.set_result(None)
+
+    def _sync_legacy(self):
+        """Synchronize sockets of servers without attach() support"""
+        self._sync_pending = False
+        super()._sync_legacy()
+
+    def _legacy_housekeeping(self):
+        """Periodic process_stale() and sync of servers without attach()"""
+        super()._legacy_housekeeping()
+        self._sync_legacy()
+
+    def process(self):
+        """Run event loop until first event is handled or MAX_TIMEOUT"""
+        self._sync_legacy()
+        self._event_waiter = self._loop.create_future()
+        try:
+            self._loop.run_until_complete(_asyncio.wait(
+                [self._event_waiter], timeout=self.MAX_TIMEOUT))
+        finally:
+            self._event_waiter.cancel()
+            self._event_waiter = None
+
+    def close(self):
+        """Close all servers"""
+        for server in self._servers:
+            server.close()
+        if self._legacy_timer is not None:
+            self._legacy_timer.cancel()
+            self._legacy_timer = None
+        for fileobj in list(self._handlers):
+            self.unregister(fileobj)
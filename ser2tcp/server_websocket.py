@@ -3,9 +3,12 @@
 import json as _json
 import logging as _logging
 
+import ser2tcp.coalescer as _coalescer
 import ser2tcp.connection_control as _control
+import ser2tcp.history as _history
 import ser2tcp.ip_filter as _ip_filter
 import ser2tcp.server as _server
+import ser2tcp.tx_arbiter as _tx_arbiter
 
 
 class ServerWebSocket():
@@ -31,6 +34,14 @@ class ServerWebSocket():
             raise _server.ConfigError(
                 'WebSocket "data": false requires "control" config')
         self._max_connections = config.get('max_connections', 0)
+        self._priority = config.get('priority', 0)
+        error = _coalescer.validate_config(config) \
+            or _tx_arbiter.validate_priority(config) \
+            or _history.validate_replay(config)
+        if error:
+            raise _server.ConfigError(error)
+        self._replay = _history.replay_options(config)
+        self._coalescer = _coalescer.Coalescer(config, self._send_frames)
         # Parse control config
         self._ctl_rts = False
         self._ctl_dtr = False
@@ -109,11 +120,14 @@ class ServerWebSocket():
             client.ws_close(1013, 'Port limit reached')
             return
         if self._serial.connect():
+            self._coalescer.flush()  # pending batch is already in history
             self._connections.append(client)
             addr = self._client_addr(client)
             self._log.info(
                 "Client connected: %s WEBSOCKET /ws/%s",
                 addr, self._endpoint)
+            if self._data_enabled and self._replay is not None:
+                self._replay_history(client)
             if self._control:
                 self._send_signals_to(client)
         else:
@@ -124,6 +138,7 @@ class ServerWebSocket():
         if client in self._connections:
             addr = self._client_addr(client)
             self._connections.remove(client)
+            self._serial.release(client)
             self._log.info(
                 "Client disconnected: %s WEBSOCKET", addr)
             self._serial.disconnect()
@@ -137,7 +152,7 @@ class ServerWebSocket():
             if self._control:
                 self._process_control_message(client, data.decode('utf-8'))
         elif self._data_enabled:
-            self._serial.send(data)
+            self._serial.send(data, client, self._priority)
 
     def _process_control_message(self, client, msg):
         """Process JSON control message from client"""
@@ -155,6 +170,13 @@ class ServerWebSocket():
 
     # Socket interface - no-ops, uhttp owns these sockets
 
+    def attach(self, loop):
+        """Set event loop for coalescing - uhttp registers WS sockets"""
+        self._coalescer.attach(loop)
+
+    def pause_reading(self, paused):
+        """No-op - uhttp reads WebSocket frames, they can not be paused"""
+
     def read_sockets(self):
         """Return empty list - uhttp manages WS sockets"""
         return []
@@ -176,9 +198,23 @@ class ServerWebSocket():
                 self.remove_connection(client)
 
     def send(self, data):
-        """Send serial data to all connections as binary frames"""
+        """Send serial data to all connections, coalesced in throughput mode"""
         if not self._data_enabled:
             return
+        self._coalescer.push(data)
+
+    def _replay_history(self, client):
+        """Send port history to new client as one binary frame"""
+        chunks = []
+        self._serial.replay(chunks.append, **self._replay)
+        if chunks:
+            try:
+                client.ws_send(b''.join(chunks))
+            except OSError:
+                self.remove_connection(client)
+
+    def _send_frames(self, data):
+        """Send data to all connections as binary frames"""
         for client in list(self._connections):
             try:
                 client.ws_send(data)
@@ -189,6 +225,7 @@ class ServerWebSocket():
         """Send signal report to all connections as JSON text frame"""
         if not self._control:
             return
+        self._coalescer.flush()  # keep order of data and reports
         msg = self._bitmask_to_json(bitmask)
         text = _json.dumps(msg)
         for client in list(self._connections):
@@ -209,6 +246,7 @@ class ServerWebSocket():
 
     def close(self):
         """Close all connections"""
+        self._coalescer.close()
         self.close_connections()
 
     def _send_signals_to(self, client):
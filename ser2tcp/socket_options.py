@@ -0,0 +1,112 @@
+"""Socket options of server listening and accepted sockets"""
+
+import logging as _logging
+import socket as _socket
+
+DEFAULT_BACKLOG = _socket.SOMAXCONN
+
+# option name -> (level, socket constant name) applied to accepted sockets
+TCP_OPTIONS = {
+    'keepalive_idle': (
+        _socket.IPPROTO_TCP, 'TCP_KEEPIDLE'
+        if hasattr(_socket, 'TCP_KEEPIDLE') else 'TCP_KEEPALIVE'),
+    'keepalive_interval': (_socket.IPPROTO_TCP, 'TCP_KEEPINTVL'),
+    'keepalive_count': (_socket.IPPROTO_TCP, 'TCP_KEEPCNT'),
+    'user_timeout': (_socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT'),
+}
+BUFFER_OPTIONS = {
+    'sndbuf': (_socket.SOL_SOCKET, 'SO_SNDBUF'),
+    'rcvbuf': (_socket.SOL_SOCKET, 'SO_RCVBUF'),
+}
+BOOL_OPTIONS = ('nodelay', 'keepalive')
+INT_OPTIONS = ('backlog', *BUFFER_OPTIONS, *TCP_OPTIONS)
+
+
+def validate_config(config):
+    """Validate socket_options of server config, return error or None"""
+    options = config.get('socket_options')
+    if options is None:
+        return None
+    if not isinstance(options, dict):
+        return 'socket_options must be an object'
+    if config.get('protocol', '').upper() == 'WEBSOCKET':
+        return 'socket_options not supported with WEBSOCKET'
+    for key, value in options.items():
+        if key in BOOL_OPTIONS:
+            if not isinstance(value, bool):
+                return f'socket_options.{key} must be true or false'
+        elif key in INT_OPTIONS:
+            if isinstance(value, bool) or not isinstance(value, int) \
+                    or value <= 0:
+                return f'socket_options.{key} must be positive integer'
+        else:
+            return f'Unknown socket option: {key}'
+    return None
+
+
+class SocketOptions():
+    """Apply configured options to listening and accepted sockets
+
+    nodelay defaults to value given by forwarding mode, keepalive is
+    enabled when any keepalive_* option is set. TCP level options are
+    ignored for unix sockets and options not available on this platform
+    are skipped with warning.
+    """
+
+    def __init__(self, options=None, nodelay=False, tcp=True, log=None):
+        self._log = log if log else _logging.getLogger(__name__)
+        self._options = dict(options or {})
+        self._tcp = tcp
+        self._options.setdefault('backlog', DEFAULT_BACKLOG)
+        if tcp:
+            self._options.setdefault('nodelay', nodelay)
+            if any(key.startswith('keepalive_') for key in self._options):
+                self._options.setdefault('keepalive', True)
+        else:
+            for key in ('nodelay', 'keepalive', *TCP_OPTIONS):
+                self._options.pop(key, None)
+        self._client_options = self._resolve()
+
+    def _resolve(self):
+        """Return list of (level, option, value) for accepted sockets"""
+        result = []
+        names = dict(BUFFER_OPTIONS)
+        if self._tcp:
+            names.update(TCP_OPTIONS)
+            if 'keepalive' in self._options:
+                names['keepalive'] = (_socket.SOL_SOCKET, 'SO_KEEPALIVE')
+            names['nodelay'] = (_socket.IPPROTO_TCP, 'TCP_NODELAY')
+        for key, (level, name) in names.items():
+            if key not in self._options:
+                continue
+            option = getattr(_socket, name, None)
+            if option is None:
+                self._log.warning(
+                    "Socket option %s not supported on this platform", key)
+                continue
+            result.append((level, option, int(self._options[key])))
+        return result
+
+    @property
+    def backlog(self):
+        """Return listen backlog"""
+        return self._options['backlog']
+
+    def as_dict(self):
+        """Return effective options"""
+        return dict(self._options)
+
+    def apply_listen(self, sock):
+        """Set buffer sizes on listening socket (inherited by clients)"""
+        for key, (level, name) in BUFFER_OPTIONS.items():
+            if key in self._options:
+                sock.setsockopt(
+                    level, getattr(_socket, name), self._options[key])
+
+    def apply_client(self, sock):
+        """Set all options on accepted socket"""
+        for level, option, value in self._client_options:
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError as err:
+                self._log.warning("Socket option %s: %s", option, err)
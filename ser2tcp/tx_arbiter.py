@@ -0,0 +1,182 @@
+"""TX arbiter - order of data written to serial port from multiple clients"""
+
+import collections as _collections
+import time as _time
+
+POLICIES = ('fifo', 'round_robin', 'lock', 'priority')
+DEFAULT_POLICY = 'fifo'
+DEFAULT_LOCK_TIMEOUT = 5.
+
+
+def validate_config(config):
+    """Validate TX policy of port config, return error string or None"""
+    policy = config.get('tx_policy', DEFAULT_POLICY)
+    if policy not in POLICIES:
+        return f'Unknown tx_policy: {policy} (expected {", ".join(POLICIES)})'
+    if 'tx_lock_timeout' in config:
+        value = config['tx_lock_timeout']
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or value <= 0:
+            return 'tx_lock_timeout must be positive number'
+    if 'tx_queue_limit' in config:
+        value = config['tx_queue_limit']
+        if isinstance(value, bool) or not isinstance(value, int) \
+                or value <= 0:
+            return 'tx_queue_limit must be positive integer'
+    return None
+
+
+def validate_priority(config):
+    """Validate TX priority of server config, return error string or None"""
+    value = config.get('priority', 0)
+    if isinstance(value, bool) or not isinstance(value, int):
+        return 'priority must be integer'
+    return None
+
+
+class TxArbiter():
+    """Queues of data from clients (sources) waiting for serial port
+
+    Policies:
+    - fifo: data are written in order of arrival
+    - round_robin: clients take turns, each turn at most QUANTUM bytes
+    - lock: first sending client owns port until it is idle for
+      lock_timeout or disconnects, data of other clients are dropped
+    - priority: client of server with highest priority is written first,
+      clients with same priority take turns like round_robin
+
+    Data which would grow queue over limit are dropped.
+    """
+
+    QUANTUM = 1024  # max bytes of one turn (round_robin, priority)
+
+    def __init__(self, policy=DEFAULT_POLICY, lock_timeout=None, limit=None):
+        self._policy = policy
+        self._lock_timeout = lock_timeout or DEFAULT_LOCK_TIMEOUT
+        self._limit = limit  # max queued bytes, None = unlimited
+        self._queues = _collections.OrderedDict()  # source -> deque
+        self._priorities = {}  # source -> priority
+        self._current = None  # source in turn
+        self._offset = 0  # bytes of first chunk of current already written
+        self._turn = 0  # bytes written in current turn
+        self._size = 0
+        self._owner = None
+        self._owner_time = 0
+        self._dropped = 0
+
+    @property
+    def policy(self):
+        """Return policy name"""
+        return self._policy
+
+    @property
+    def size(self):
+        """Return number of queued bytes"""
+        return self._size
+
+    @property
+    def dropped(self):
+        """Return number of bytes dropped by lock policy or limit"""
+        return self._dropped
+
+    @property
+    def owner(self):
+        """Return source owning lock or None"""
+        if self._owner is not None and self._lock_expired():
+            self._owner = None
+        return self._owner
+
+    def _lock_expired(self):
+        """True if lock owner was idle for lock_timeout"""
+        return _time.monotonic() - self._owner_time > self._lock_timeout
+
+    def _acquire(self, source):
+        """Take or refresh lock, return False if other source owns it"""
+        if self._owner is not source and self.owner is not None:
+            return False
+        self._owner = source
+        self._owner_time = _time.monotonic()
+        return True
+
+    def is_full(self, size):
+        """True if size bytes more would exceed limit"""
+        return self._limit is not None and self._size + size > self._limit
+
+    def push(self, data, source=None, priority=0):
+        """Queue data from source, return False if dropped"""
+        if self.is_full(len(data)) or (
+                self._policy == 'lock' and not self._acquire(source)):
+            self._dropped += len(data)
+            return False
+        if self._policy == 'fifo':
+            source = None
+        queue = self._queues.get(source)
+        if queue is None:
+            queue = self._queues[source] = _collections.deque()
+        queue.append(bytes(data))
+        self._priorities[source] = priority
+        self._size += len(data)
+        return True
+
+    def _select(self):
+        """Return source which is next in turn"""
+        if self._policy == 'priority':
+            return max(self._queues, key=self._priorities.__getitem__)
+        return next(iter(self._queues))
+
+    def peek(self):
+        """Return memoryview of data to write next or None"""
+        if not self._queues:
+            return None
+        if self._current is None:
+            self._current = self._select()
+            self._turn = 0
+        chunk = self._queues[self._current][0]
+        end = len(chunk)
+        if self._policy in ('round_robin', 'priority'):
+            end = min(end, self._offset + self.QUANTUM - self._turn)
+        return memoryview(chunk)[self._offset:end]
+
+    def consume(self, size):
+        """Remove written bytes, end turn of source when needed"""
+        queue = self._queues[self._current]
+        self._offset += size
+        self._size -= size
+        self._turn += size
+        if self._offset >= len(queue[0]):
+            queue.popleft()
+            self._offset = 0
+        if not queue:
+            del self._queues[self._current]
+            del self._priorities[self._current]
+            self._current = None
+        elif self._turn >= self.QUANTUM \
+                and self._policy in ('round_robin', 'priority'):
+            if self._offset:
+                queue[0] = queue[0][self._offset:]
+                self._offset = 0
+            self._queues.move_to_end(self._current)
+            self._current = None
+
+    def pop_all(self):
+        """Return all queued data in arbiter order and clear queues"""
+        data = []
+        while True:
+            view = self.peek()
+            if view is None:
+                return b''.join(data)
+            data.append(bytes(view))
+            self.consume(len(view))
+
+    def release(self, source):
+        """Release lock of disconnected source"""
+        if self._owner is source:
+            self._owner = None
+
+    def clear(self):
+        """Drop all queued data"""
+        self._queues.clear()
+        self._priorities.clear()
+        self._current = None
+        self._offset = 0
+        self._size = 0
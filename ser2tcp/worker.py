@@ -0,0 +1,677 @@
+"""Worker processes - serial ports sharded across multiple processes
+
+Supervisor (main process) keeps HTTP/API layer and talks to workers over
+multiprocessing pipes. Every worker runs its own ServersManager with
+SerialProxy instances, parent holds RemoteSerialProxy for every remote port
+which mirrors status pushed by worker and forwards commands to it.
+
+Messages parent -> worker:
+    ('add', request_id, port_id, config)
+    ('delete', request_id, port_id)
+    ('disconnect', request_id, port_id, server_index, address)
+    ('history', request_id, port_id, since, until, max_bytes)
+    ('signals', port_id, rts, dtr)
+    ('monitor', port_id, enabled)
+    ('stop',)
+
+Messages worker -> parent:
+    ('reply', request_id, error, snapshot)
+    ('status', {port_id: snapshot})
+    ('monitor', port_id, direction, data)
+"""
+
+import functools as _functools
+import logging as _logging
+import multiprocessing as _multiprocessing
+import signal as _signal
+import time as _time
+
+import ser2tcp.serial_proxy as _serial_proxy
+import ser2tcp.server_manager as _server_manager
+
+REQUEST_TIMEOUT = .5  # requests waited on event loop (history)
+PORT_TIMEOUT = 5  # add/delete port waits for worker start, socket release
+STATUS_INTERVAL = .5
+STOP_TIMEOUT = 2
+LOG_FORMAT = '%(levelname).1s: %(message)s (%(filename)s:%(lineno)s)'
+
+
+def is_local_port(config):
+    """True if port must run in main process (WebSocket servers)"""
+    return any(
+        srv.get('protocol', '').upper() == 'WEBSOCKET'
+        for srv in config.get('servers', []))
+
+
+def port_snapshot(proxy):
+    """Return picklable status snapshot of SerialProxy"""
+    return {
+        'name': proxy.name,
+        'serial_config': dict(proxy.serial_config),
+        'match': proxy.match,
+        'max_connections': proxy.max_connections,
+        'connected': proxy.is_connected,
+        'signals': proxy.get_signals() if proxy.is_connected else 0,
+        'read_stats': proxy.read_stats,
+        'tx_stats': proxy.tx_stats,
+        'reconnect_stats': proxy.reconnect_stats,
+        'history_stats': proxy.history_stats,
+        'capture_stats': proxy.capture_stats,
+        'servers': [{
+            'protocol': server.protocol,
+            'config': server.config,
+            'data_enabled': server.data_enabled,
+            'control': server.control,
+            'max_connections': server.max_connections,
+            'batch_stats': server.batch_stats,
+            'socket_options': server.socket_options,
+            'connections': [con.address_str() for con in server.connections],
+        } for server in proxy.servers],
+    }
+
+
+class WorkerChannel():
+    """Worker side of pipe to supervisor, serves as ServersManager server"""
+
+    def __init__(self, conn, manager, log=None):
+        self._log = log if log else _logging.Logger(self.__class__.__name__)
+        self._conn = conn
+        self._manager = manager
+        self._ports = {}  # port_id -> SerialProxy
+        self._monitors = {}  # port_id -> monitor callback
+        self._last_status = None
+        self._status_timer = None
+
+    def attach(self, loop):
+        """Register pipe in event loop, start periodic status push"""
+        loop.register(self._conn, self._process_messages)
+        self._status_timer = loop.call_later(
+            STATUS_INTERVAL, self._status_tick)
+
+    def _send(self, message):
+        """Send message to supervisor, stop worker if pipe is closed"""
+        try:
+            self._conn.send(message)
+        except (OSError, ValueError):
+            self._manager.stop()
+
+    def _process_messages(self):
+        """Handle all pending messages from supervisor"""
+        try:
+            while self._conn.poll():
+                self._handle(self._conn.recv())
+        except (EOFError, OSError):
+            self._log.info("Supervisor closed connection")
+            self._manager.unregister(self._conn)
+            self._manager.stop()
+
+    def _handle(self, message):
+        """Dispatch one message"""
+        command = message[0]
+        if command == 'add':
+            self._handle_add(*message[1:])
+        elif command == 'delete':
+            self._handle_delete(*message[1:])
+        elif command == 'disconnect':
+            self._handle_disconnect(*message[1:])
+        elif command == 'history':
+            self._handle_history(*message[1:])
+        elif command == 'signals':
+            self._handle_signals(*message[1:])
+        elif command == 'monitor':
+            self._handle_monitor(*message[1:])
+        elif command == 'stop':
+            self._manager.stop()
+
+    def _handle_add(self, request_id, port_id, config):
+        """Create SerialProxy and reply with its snapshot"""
+        try:
+            proxy = _serial_proxy.SerialProxy(config, self._log)
+        except Exception as err:  # pylint: disable=W0718
+            self._send(('reply', request_id, str(err), None))
+            return
+        self._ports[port_id] = proxy
+        self._manager.add_server(proxy)
+        self._send(('reply', request_id, None, port_snapshot(proxy)))
+
+    def _handle_delete(self, request_id, port_id):
+        """Close SerialProxy, reply after its sockets are released"""
+        proxy = self._ports.pop(port_id, None)
+        self._monitors.pop(port_id, None)
+        if proxy:
+            proxy.close()
+            self._manager.remove_server(proxy)
+        self._send(('reply', request_id, None, None))
+
+    def _handle_disconnect(self, request_id, port_id, server_index, address):
+        """Disconnect client connection identified by its address"""
+        proxy = self._ports.get(port_id)
+        error = 'Connection not found'
+        if proxy and server_index < len(proxy.servers):
+            server = proxy.servers[server_index]
+            for con in server.connections:
+                if con.address_str() == address:
+                    server._remove_connection(con)  # pylint: disable=W0212
+                    error = None
+                    break
+        self._send(('reply', request_id, error, None))
+        self._send_status()
+
+    def _handle_history(self, request_id, port_id, since, until, max_bytes):
+        """Reply with history of port"""
+        proxy = self._ports.get(port_id)
+        if not proxy:
+            self._send(('reply', request_id, 'Port not found', None))
+            return
+        self._send((
+            'reply', request_id, None,
+            proxy.history_data(since, until, max_bytes)))
+
+    def _handle_signals(self, port_id, rts, dtr):
+        """Set RTS/DTR signals"""
+        proxy = self._ports.get(port_id)
+        if not proxy or not proxy.is_connected:
+            return
+        if rts is not None:
+            proxy.set_rts(rts)
+        if dtr is not None:
+            proxy.set_dtr(dtr)
+
+    def _handle_monitor(self, port_id, enabled):
+        """Enable or disable forwarding of monitor data"""
+        proxy = self._ports.get(port_id)
+        if not proxy:
+            return
+        callback = self._monitors.pop(port_id, None)
+        if callback:
+            proxy.remove_monitor(callback)
+        if enabled:
+            callback = _functools.partial(self._send_monitor, port_id)
+            self._monitors[port_id] = callback
+            proxy.add_monitor(callback)
+
+    def _send_monitor(self, port_id, direction, data):
+        """Forward monitor data to supervisor"""
+        self._send(('monitor', port_id, direction, bytes(data)))
+
+    def _send_status(self):
+        """Push status of all ports if changed"""
+        status = {
+            port_id: port_snapshot(proxy)
+            for port_id, proxy in self._ports.items()}
+        if status != self._last_status:
+            self._last_status = status
+            self._send(('status', status))
+
+    def _status_tick(self):
+        """Periodic status push"""
+        self._send_status()
+        self._status_timer = self._manager.call_later(
+            STATUS_INTERVAL, self._status_tick)
+
+    def close(self):
+        """Close pipe"""
+        if self._status_timer is not None:
+            self._status_timer.cancel()
+            self._status_timer = None
+        self._manager.unregister(self._conn)
+        self._conn.close()
+
+
+def worker_main(conn, event_loop=None, log_level=_logging.INFO):
+    """Worker process entry point"""
+    # Ctrl+C goes to whole process group, supervisor stops workers
+    _signal.signal(_signal.SIGINT, _signal.SIG_IGN)
+    if not _logging.root.handlers:
+        # spawned (not forked) process does not inherit logging setup
+        _logging.basicConfig(format=LOG_FORMAT)
+    log = _logging.getLogger('ser2tcp')
+    log.setLevel(log_level)
+    manager = _server_manager.create_servers_manager(event_loop)
+    manager.add_server(WorkerChannel(conn, manager, log))
+    _signal.signal(_signal.SIGTERM, manager.stop)
+    manager.run()
+
+
+class RemoteConnection():
+    """Client connection in worker process"""
+
+    def __init__(self, address):
+        self._address = address
+
+    def address_str(self):
+        """Return address as string"""
+        return self._address
+
+
+class RemoteServer():
+    """Server of remote port, built from status snapshot"""
+
+    def __init__(self, port, index, snapshot):
+        self._port = port
+        self._index = index
+        self.protocol = snapshot['protocol']
+        self.config = snapshot['config']
+        self.data_enabled = snapshot['data_enabled']
+        self.control = snapshot['control']
+        self.max_connections = snapshot['max_connections']
+        self.batch_stats = snapshot['batch_stats']
+        self.socket_options = snapshot['socket_options']
+        self.connections = [
+            RemoteConnection(address) for address in snapshot['connections']]
+
+    def _remove_connection(self, con):
+        """Disconnect client connection in worker"""
+        self._port.disconnect(self._index, con.address_str())
+
+
+class RemoteSerialProxy():
+    """SerialProxy running in worker process
+
+    Provides attributes used by HttpServerWrapper from last status snapshot
+    pushed by worker, commands are forwarded to worker.
+    """
+
+    def __init__(self, worker, port_id, snapshot):
+        self._worker = worker
+        self._port_id = port_id
+        self._monitors = []
+        self._servers = []
+        self._snapshot = None
+        self.update(snapshot)
+
+    def update(self, snapshot):
+        """Update from status snapshot"""
+        self._snapshot = snapshot
+        self._servers = [
+            RemoteServer(self, index, srv)
+            for index, srv in enumerate(snapshot['servers'])]
+
+    @property
+    def port_id(self):
+        """Return port identifier in worker"""
+        return self._port_id
+
+    @property
+    def worker(self):
+        """Return worker running this port"""
+        return self._worker
+
+    @property
+    def name(self):
+        """Return port name"""
+        return self._snapshot['name']
+
+    @property
+    def serial_config(self):
+        """Return serial configuration"""
+        return self._snapshot['serial_config']
+
+    @property
+    def match(self):
+        """Return match configuration"""
+        return self._snapshot['match']
+
+    @property
+    def is_connected(self):
+        """Return True if serial port is open"""
+        return self._worker.is_alive and self._snapshot['connected']
+
+    @property
+    def servers(self):
+        """Return list of servers"""
+        return self._servers
+
+    @property
+    def max_connections(self):
+        """Return max connections limit"""
+        return self._snapshot['max_connections']
+
+    @property
+    def read_stats(self):
+        """Return serial read counters from last snapshot"""
+        return self._snapshot['read_stats']
+
+    @property
+    def tx_stats(self):
+        """Return serial TX queue state from last snapshot"""
+        return self._snapshot['tx_stats']
+
+    @property
+    def reconnect_stats(self):
+        """Return keep_open/reconnect state from last snapshot"""
+        return self._snapshot['reconnect_stats']
+
+    @property
+    def history_stats(self):
+        """Return history size and content from last snapshot"""
+        return self._snapshot['history_stats']
+
+    @property
+    def capture_stats(self):
+        """Return capture counters from last snapshot"""
+        return self._snapshot['capture_stats']
+
+    def history_data(self, since=None, until=None, max_bytes=None):
+        """Return history of port from worker"""
+        return self._worker.request(
+            'history', self._port_id, since, until, max_bytes)
+
+    def get_signals(self):
+        """Return signal bitmask from last snapshot"""
+        return self._snapshot['signals']
+
+    def set_rts(self, value):
+        """Set RTS signal"""
+        self._worker.send(('signals', self._port_id, value, None))
+
+    def set_dtr(self, value):
+        """Set DTR signal"""
+        self._worker.send(('signals', self._port_id, None, value))
+
+    def disconnect(self, server_index, address):
+        """Disconnect client connection"""
+        try:
+            self._worker.request_async(
+                'disconnect', self._port_id, server_index, address)
+        except OSError:
+            pass  # worker is gone
+
+    def add_monitor(self, callback):
+        """Register monitor callback"""
+        if callback not in self._monitors:
+            self._monitors.append(callback)
+            if len(self._monitors) == 1:
+                self._worker.send(('monitor', self._port_id, True))
+
+    def remove_monitor(self, callback):
+        """Unregister monitor callback"""
+        if callback in self._monitors:
+            self._monitors.remove(callback)
+            if not self._monitors:
+                self._worker.send(('monitor', self._port_id, False))
+
+    def notify_monitors(self, direction, data):
+        """Call monitor callbacks with data received from worker"""
+        for callback in list(self._monitors):
+            callback(direction, data)
+
+    def attach(self, loop):
+        """Port is served by worker event loop"""
+
+    def close(self):
+        """Close port in worker"""
+        self._worker.delete_port(self)
+
+    def close_async(self, callback):
+        """Close port in worker, callback(error) when it is released"""
+        self._worker.delete_port_async(self, callback)
+
+
+class Worker():
+    """Supervisor side of worker process, serves as ServersManager server"""
+
+    def __init__(self, index, event_loop=None, log=None):
+        self._log = log if log else _logging.Logger(self.__class__.__name__)
+        self._index = index
+        self._ports = {}  # port_id -> RemoteSerialProxy
+        self._next_id = 0
+        self._next_port_id = 0
+        self._pending = {}  # request_id -> (callback, timer) of async request
+        self._loop = None
+        self._conn, child_conn = _multiprocessing.Pipe()
+        self._process = _multiprocessing.Process(
+            target=worker_main, name=f'ser2tcp-worker-{index}',
+            args=(child_conn, event_loop, self._log.getEffectiveLevel()),
+            daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._log.info("Worker %d started: pid %d", index, self._process.pid)
+
+    @property
+    def is_alive(self):
+        """Return True if worker process is running"""
+        return not self._conn.closed and self._process.is_alive()
+
+    @property
+    def ports_count(self):
+        """Return number of ports in this worker"""
+        return len(self._ports)
+
+    @property
+    def pid(self):
+        """Return worker process id"""
+        return self._process.pid
+
+    def attach(self, loop):
+        """Register pipe in event loop"""
+        self._loop = loop
+        loop.register(self._conn, self._process_messages)
+
+    def send(self, message):
+        """Send message to worker"""
+        if self._conn.closed:
+            raise OSError(f"Worker {self._index} is not running")
+        try:
+            self._conn.send(message)
+        except (OSError, ValueError) as err:
+            self._closed()
+            raise OSError(f"Worker {self._index} is not running") from err
+
+    def request_async(self, command, *args, callback=None, timeout=None):
+        """Send request without waiting, reply is passed to callback
+
+        Callback is called from event loop as callback(error, snapshot),
+        error is ValueError from worker, TimeoutError when reply did not
+        come in timeout (needs event loop) or OSError when worker died.
+        """
+        request_id = self._next_id
+        self._next_id += 1
+        self.send((command, request_id, *args))
+        if callback is not None:
+            timer = None
+            if timeout is not None and self._loop:
+                timer = self._loop.call_later(
+                    timeout, self._request_expired, request_id)
+            self._pending[request_id] = (callback, timer)
+
+    def _request_expired(self, request_id):
+        """Asynchronous request timed out, late reply is ignored"""
+        callback, _ = self._pending.pop(request_id)
+        callback(TimeoutError(f"Worker {self._index} not responding"), None)
+
+    def request(self, command, *args, timeout=REQUEST_TIMEOUT):
+        """Send request and wait for reply, return snapshot from reply
+
+        Blocks event loop of supervisor, so timeout is short. Slow worker
+        is not considered dead, late reply is ignored.
+        """
+        request_id = self._next_id
+        self._next_id += 1
+        self.send((command, request_id, *args))
+        deadline = _time.time() + timeout
+        while True:
+            timeout = deadline - _time.time()
+            try:
+                if timeout <= 0 or not self._conn.poll(timeout):
+                    raise TimeoutError(
+                        f"Worker {self._index} not responding")
+                message = self._conn.recv()
+            except (EOFError, OSError) as err:
+                if isinstance(err, TimeoutError):
+                    raise
+                self._closed()
+                raise OSError(
+                    f"Worker {self._index} is not running") from err
+            if message[0] == 'reply' and message[1] == request_id:
+                error, snapshot = message[2:]
+                if error:
+                    raise ValueError(error)
+                return snapshot
+            self._handle(message)
+
+    def create_port(self, config):
+        """Create port in worker, return RemoteSerialProxy"""
+        port_id = self._next_port_id
+        self._next_port_id += 1
+        try:
+            snapshot = self.request(
+                'add', port_id, config, timeout=PORT_TIMEOUT)
+        except TimeoutError:
+            self._delete_orphan(port_id)
+            raise
+        proxy = RemoteSerialProxy(self, port_id, snapshot)
+        self._ports[port_id] = proxy
+        return proxy
+
+    def create_port_async(self, config, callback):
+        """Create port in worker, callback(error, proxy) from event loop"""
+        port_id = self._next_port_id
+        self._next_port_id += 1
+
+        def added(error, snapshot):
+            if isinstance(error, TimeoutError):
+                self._delete_orphan(port_id)
+            if error:
+                callback(error, None)
+                return
+            proxy = RemoteSerialProxy(self, port_id, snapshot)
+            self._ports[port_id] = proxy
+            callback(None, proxy)
+        self.request_async(
+            'add', port_id, config, callback=added, timeout=PORT_TIMEOUT)
+
+    def _delete_orphan(self, port_id):
+        """Delete port whose add timed out, worker may still create it"""
+        try:
+            self.request_async('delete', port_id)
+        except OSError:
+            pass  # worker is gone with its ports
+
+    def delete_port(self, proxy):
+        """Close port in worker, wait until its sockets are released"""
+        if self._ports.pop(proxy.port_id, None) is None:
+            return
+        if self.is_alive:
+            self.request('delete', proxy.port_id, timeout=PORT_TIMEOUT)
+
+    def delete_port_async(self, proxy, callback):
+        """Close port in worker, callback(error) when sockets are released"""
+        if self._ports.pop(proxy.port_id, None) is None or not self.is_alive:
+            callback(None)
+            return
+        self.request_async(
+            'delete', proxy.port_id, timeout=PORT_TIMEOUT,
+            callback=lambda error, _: callback(error))
+
+    def _process_messages(self):
+        """Handle all pending messages from worker"""
+        try:
+            while self._conn.poll():
+                self._handle(self._conn.recv())
+        except (EOFError, OSError):
+            self._log.error("Worker %d terminated", self._index)
+            self._closed()
+
+    def _handle(self, message):
+        """Dispatch one message"""
+        if message[0] == 'reply':
+            pending = self._pending.pop(message[1], None)
+            if pending:
+                callback, timer = pending
+                if timer is not None:
+                    timer.cancel()
+                error, snapshot = message[2:]
+                callback(ValueError(error) if error else None, snapshot)
+        elif message[0] == 'status':
+            for port_id, snapshot in message[1].items():
+                proxy = self._ports.get(port_id)
+                if proxy:
+                    proxy.update(snapshot)
+        elif message[0] == 'monitor':
+            proxy = self._ports.get(message[1])
+            if proxy:
+                proxy.notify_monitors(message[2], message[3])
+
+    def _closed(self):
+        """Pipe was closed or worker died, fail pending requests"""
+        pending, self._pending = self._pending, {}
+        if self._loop:
+            self._loop.unregister(self._conn)
+        self._conn.close()
+        for callback, timer in pending.values():
+            if timer is not None:
+                timer.cancel()
+            callback(OSError(f"Worker {self._index} is not running"), None)
+
+    def close(self):
+        """Stop worker process"""
+        if not self._conn.closed:
+            try:
+                self._conn.send(('stop',))
+            except (OSError, ValueError):
+                pass
+        self._process.join(STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        if not self._conn.closed:
+            self._closed()
+
+
+class WorkerPool():
+    """Set of worker processes, distributes ports between them"""
+
+    def __init__(self, count, event_loop=None, log=None):
+        self._log = log if log else _logging.Logger(self.__class__.__name__)
+        self._workers = [
+            Worker(index, event_loop, self._log) for index in range(count)]
+
+    @property
+    def workers(self):
+        """Return list of workers"""
+        return self._workers
+
+    def create_proxy(self, config):
+        """Create port in least loaded worker
+
+        Ports with WebSocket servers are served by HTTP server in main
+        process, they are created locally.
+        """
+        if is_local_port(config):
+            return _serial_proxy.SerialProxy(config, self._log)
+        return self._select_worker().create_port(config)
+
+    def create_proxy_async(self, config, callback):
+        """Create port like create_proxy(), without waiting for worker
+
+        callback(error, proxy) is called from event loop, local port is
+        created immediately. Exception is raised if request can not be sent.
+        """
+        if is_local_port(config):
+            callback(None, _serial_proxy.SerialProxy(config, self._log))
+            return
+        self._select_worker().create_port_async(config, callback)
+
+    @staticmethod
+    def close_proxy_async(proxy, callback):
+        """Close port, callback(error) after its sockets are released"""
+        if isinstance(proxy, RemoteSerialProxy):
+            proxy.close_async(callback)
+            return
+        proxy.close()
+        callback(None)
+
+    def _select_worker(self):
+        """Return least loaded running worker"""
+        worker = min(
+            (w for w in self._workers if w.is_alive),
+            key=lambda w: w.ports_count, default=None)
+        if worker is None:
+            raise OSError("No worker process running")
+        return worker
+
+    def close(self):
+        """Stop all workers"""
+        for worker in self._workers:
+            worker.close()
@@ -0,0 +1,156 @@
+"""Tests for capture of serial traffic to segment files"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from ser2tcp.capture import Capture, INDEX_ENTRY, RECORD, parse_records, \
+    read_range, validate_config
+
+
+class CaptureTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'capture')
+
+    def _capture(self, records, **config):
+        """Write records [(time, direction, data)] and close capture"""
+        config['path'] = self.path
+        capture = Capture(config)
+        times = [when for when, _, _ in records]
+        with patch('ser2tcp.capture._time.time', side_effect=times):
+            for _, direction, data in records:
+                capture.record(direction, data)
+        capture.close()
+        return capture
+
+    def _files(self, suffix):
+        return sorted(
+            name for name in os.listdir(self.path) if name.endswith(suffix))
+
+
+class TestCaptureWrite(CaptureTestCase):
+    def test_records(self):
+        capture = self._capture([(100., 1, b'AT\r'), (100.5, 2, b'OK\r\n')])
+        self.assertEqual(
+            parse_records(read_range(self.path)),
+            [(100., 1, b'AT\r'), (100.5, 2, b'OK\r\n')])
+        self.assertEqual(capture.stats['records'], 2)
+        self.assertEqual(capture.stats['bytes'], 2 * RECORD.size + 7)
+        self.assertEqual(self._files('.seg'), ['0000000100000000.seg'])
+
+    def test_rotate_by_size(self):
+        records = [(100. + i, 2, b'x' * 10) for i in range(10)]
+        self._capture(records, segment_size=3 * (RECORD.size + 10))
+        self.assertEqual(len(self._files('.seg')), 4)
+        self.assertEqual(parse_records(read_range(self.path)), records)
+
+    def test_rotate_by_time(self):
+        records = [(100. + i, 2, b'x') for i in range(10)]
+        self._capture(records, segment_time=5)
+        self.assertEqual(len(self._files('.seg')), 2)
+
+    def test_max_segments(self):
+        records = [(100. + i, 2, b'x') for i in range(10)]
+        self._capture(records, segment_time=2, max_segments=2)
+        self.assertEqual(len(self._files('.seg')), 2)
+        self.assertEqual(len(self._files('.idx')), 2)
+        self.assertEqual(
+            [rec[0] for rec in parse_records(read_range(self.path))],
+            [106., 107., 108., 109.])
+
+    def test_sparse_index(self):
+        records = [(100. + i, 2, b'x' * 100) for i in range(100)]
+        self._capture(records, index_interval=1000)
+        index_size = os.path.getsize(
+            os.path.join(self.path, self._files('.idx')[0]))
+        # entry every 9 records (113 bytes each)
+        self.assertEqual(index_size // INDEX_ENTRY.size, 12)
+
+    def test_dropped_over_pending_limit(self):
+        capture = Capture({'path': self.path})
+        capture.MAX_PENDING = 10
+        capture.record(2, b'x' * 8)
+        capture.record(2, b'y' * 8)
+        capture.close()
+        self.assertEqual(capture.stats['dropped'], 8)
+        self.assertEqual(
+            [rec[2] for rec in parse_records(read_range(self.path))],
+            [b'x' * 8])
+
+    def test_written_by_thread_after_flush_interval(self):
+        capture = Capture({'path': self.path})
+        capture.FLUSH_INTERVAL = .01
+        self.addCleanup(capture.close)
+        capture.record(2, b'boot')
+        deadline = time.monotonic() + 5
+        while not read_range(self.path):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(.01)
+        self.assertEqual(parse_records(read_range(self.path))[0][2], b'boot')
+
+
+class TestCaptureRead(CaptureTestCase):
+    def setUp(self):
+        super().setUp()
+        self.records = [(1000. + i, 1 + i % 2, b'%d' % i) for i in range(200)]
+        self._capture(
+            self.records, segment_size=40 * (RECORD.size + 3),
+            index_interval=5 * (RECORD.size + 3))
+
+    def _times(self, **kwargs):
+        return [rec[0] for rec in parse_records(
+            read_range(self.path, **kwargs))]
+
+    def test_range(self):
+        self.assertEqual(
+            self._times(since=1050.5, until=1053), [1051., 1052., 1053.])
+
+    def test_since(self):
+        self.assertEqual(self._times(since=1197), [1197., 1198., 1199.])
+        self.assertEqual(self._times(since=0), self._times())
+
+    def test_until(self):
+        self.assertEqual(self._times(until=1001.5), [1000., 1001.])
+        self.assertEqual(self._times(until=999), [])
+
+    def test_seek_reads_little(self):
+        """Range is found by index, not by scanning all records"""
+        with patch('ser2tcp.capture.RECORD') as record:
+            record.size = RECORD.size
+            record.unpack.side_effect = RECORD.unpack
+            data = read_range(self.path, since=1150, until=1151)
+        self.assertEqual(
+            [rec[0] for rec in parse_records(data)], [1150., 1151.])
+        self.assertLess(record.unpack.call_count, 10)
+
+    def test_limit(self):
+        data = read_range(self.path, limit=3 * (RECORD.size + 3))
+        self.assertEqual(len(parse_records(data)), 3)
+
+    def test_missing_directory(self):
+        self.assertEqual(read_range(os.path.join(self.path, 'none')), b'')
+
+
+class TestValidateConfig(unittest.TestCase):
+    def test_valid(self):
+        self.assertIsNone(validate_config({}))
+        self.assertIsNone(validate_config({'capture': {
+            'path': '/tmp/cap', 'segment_size': 1024, 'segment_time': 1.5,
+            'index_interval': 256, 'max_segments': 0}}))
+
+    def test_invalid(self):
+        for capture in (
+                '/tmp/cap', {}, {'path': ''},
+                {'path': 'x', 'segment_size': 0},
+                {'path': 'x', 'segment_time': -1},
+                {'path': 'x', 'index_interval': True},
+                {'path': 'x', 'max_segments': -1}):
+            self.assertIn('capture', validate_config({'capture': capture}))
+
+
+if __name__ == "__main__":
+    unittest.main()
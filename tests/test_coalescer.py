@@ -0,0 +1,179 @@
+"""Tests for coalescing of forwarded serial data"""
+
+import socket
+import time
+import unittest
+from unittest.mock import Mock
+
+from ser2tcp.coalescer import Coalescer, validate_config
+from ser2tcp.server import ConfigError, Server
+from ser2tcp.server_manager import ServersManager
+
+
+class TestValidateConfig(unittest.TestCase):
+    def test_default(self):
+        self.assertIsNone(validate_config({}))
+
+    def test_modes(self):
+        self.assertIsNone(validate_config({'mode': 'latency'}))
+        self.assertIsNone(validate_config({
+            'mode': 'throughput', 'coalesce_bytes': 1024,
+            'coalesce_us': 500}))
+
+    def test_unknown_mode(self):
+        self.assertIn('mode', validate_config({'mode': 'fast'}))
+
+    def test_invalid_values(self):
+        for value in (0, -1, 1.5, '100', True):
+            self.assertIn(
+                'coalesce_bytes',
+                validate_config({'coalesce_bytes': value}))
+            self.assertIn(
+                'coalesce_us', validate_config({'coalesce_us': value}))
+
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.send = Mock()
+        self.loop = Mock()
+        self.timer = self.loop.call_later.return_value
+
+    def _coalescer(self, **config):
+        coalescer = Coalescer(config, self.send)
+        coalescer.attach(self.loop)
+        return coalescer
+
+    def test_latency_sends_immediately(self):
+        coalescer = self._coalescer(mode='latency')
+        coalescer.push(b'abc')
+        coalescer.push(b'def')
+        self.assertEqual(
+            [c.args[0] for c in self.send.call_args_list], [b'abc', b'def'])
+        self.loop.call_later.assert_not_called()
+
+    def test_throughput_without_loop_sends_immediately(self):
+        coalescer = Coalescer({'mode': 'throughput'}, self.send)
+        coalescer.push(b'abc')
+        self.send.assert_called_once_with(b'abc')
+
+    def test_throughput_waits_for_timer(self):
+        coalescer = self._coalescer(mode='throughput', coalesce_us=2000)
+        coalescer.push(b'abc')
+        coalescer.push(b'def')
+        self.send.assert_not_called()
+        self.loop.call_later.assert_called_once_with(.002, coalescer.flush)
+        coalescer.flush()
+        self.send.assert_called_once_with(b'abcdef')
+
+    def test_throughput_size_limit(self):
+        coalescer = self._coalescer(mode='throughput', coalesce_bytes=4)
+        coalescer.push(b'ab')
+        coalescer.push(b'cd')
+        self.send.assert_called_once_with(b'abcd')
+        self.timer.cancel.assert_called_once_with()
+        coalescer.push(b'e')
+        self.assertEqual(self.loop.call_later.call_count, 2)
+
+    def test_pending_data_copied(self):
+        coalescer = self._coalescer(mode='throughput')
+        buf = bytearray(b'abc')
+        coalescer.push(memoryview(buf))
+        buf[:] = b'xyz'
+        coalescer.flush()
+        self.send.assert_called_once_with(b'abc')
+
+    def test_flush_empty(self):
+        coalescer = self._coalescer(mode='throughput')
+        coalescer.flush()
+        self.send.assert_not_called()
+
+    def test_stats(self):
+        coalescer = self._coalescer(mode='throughput', coalesce_bytes=4)
+        self.assertEqual(coalescer.stats(), {
+            'mode': 'throughput', 'batches': 0, 'bytes': 0,
+            'avg_batch': 0, 'max_batch': 0})
+        coalescer.push(b'abcd')
+        coalescer.push(b'ef')
+        coalescer.flush()
+        self.assertEqual(coalescer.stats(), {
+            'mode': 'throughput', 'batches': 2, 'bytes': 6,
+            'avg_batch': 3, 'max_batch': 4})
+
+    def test_close_drops_pending(self):
+        coalescer = self._coalescer(mode='throughput')
+        coalescer.push(b'abc')
+        coalescer.close()
+        self.timer.cancel.assert_called_once_with()
+        coalescer.flush()
+        self.send.assert_not_called()
+
+
+class TestServerModes(unittest.TestCase):
+    def setUp(self):
+        self.manager = ServersManager()
+        self.serial = Mock()
+        self.serial.connect.return_value = True
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.manager.close()
+
+    def _server(self, **config):
+        config.update({'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0})
+        server = Server(config, self.serial, log=Mock())
+        self.manager.add_server(server)
+        client = socket.create_connection(server._socket.getsockname())
+        self.clients.append(client)
+        for _ in range(10):
+            self.manager.process()
+            if server.connections:
+                return server, client
+        self.fail("Connection not accepted")
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ConfigError):
+            Server(
+                {'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0,
+                    'mode': 'fast'},
+                self.serial, log=Mock())
+
+    def test_latency_sets_nodelay(self):
+        server, _ = self._server()
+        sock = server.connections[0].socket()
+        self.assertTrue(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    def test_throughput_keeps_nagle(self):
+        server, _ = self._server(mode='throughput')
+        sock = server.connections[0].socket()
+        self.assertFalse(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    def test_throughput_coalesced_by_timer(self):
+        server, client = self._server(mode='throughput', coalesce_us=20000)
+        con = server.connections[0]
+        for data in (b'ab', b'cd', b'ef'):
+            server.send(data)
+        self.assertFalse(con.has_pending_data())
+        deadline = time.monotonic() + 5
+        while server.batch_stats['batches'] == 0:
+            self.assertLess(time.monotonic(), deadline)
+            self.manager.process()
+        self.manager.process()
+        self.assertEqual(client.recv(16), b'abcdef')
+        self.assertEqual(server.batch_stats['max_batch'], 6)
+
+    def test_signal_report_flushes_batch(self):
+        server, _ = self._server(
+            mode='throughput', control={'signals': ['cts']})
+        con = server.connections[0]
+        server.send(b'abc')
+        server.send_signal_report(0)
+        self.assertEqual(server.batch_stats['batches'], 1)
+        self.assertTrue(con.has_pending_data())
+
+
+if __name__ == "__main__":
+    unittest.main()
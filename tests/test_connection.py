@@ -1,10 +1,12 @@
 """Tests for Connection class"""
 
+import socket
 import unittest
 from unittest.mock import Mock, patch
 import time
 
 from ser2tcp.connection import Connection
+from ser2tcp.connection_socket import ConnectionSocket
 
 
 class MockSocket:
@@ -125,6 +127,46 @@ class TestConnection(unittest.TestCase):
         # Would be stale if timer wasn't reset
         self.assertFalse(conn.has_pending_data())  # Buffer is empty after flush
 
+    @patch('ser2tcp.connection._time')
+    def test_send_timeout_timer(self, mock_time):
+        conn = self._make_connection(send_timeout=5.0)
+        loop = Mock()
+        on_timeout = Mock()
+        conn.attach(loop, on_timeout)
+        mock_time.time.return_value = 100.0
+        conn.send(b'hello')
+        conn.send(b'world')
+        loop.call_later.assert_called_once_with(5.0, conn._check_send_timeout)
+        mock_time.time.return_value = 105.5
+        conn._check_send_timeout()
+        on_timeout.assert_called_once_with(conn)
+
+    @patch('ser2tcp.connection._time')
+    def test_send_timeout_timer_rescheduled(self, mock_time):
+        conn = self._make_connection(send_timeout=5.0)
+        loop = Mock()
+        on_timeout = Mock()
+        conn.attach(loop, on_timeout)
+        conn._socket.send = Mock(return_value=2)
+        mock_time.time.return_value = 100.0
+        conn.send(b'hello')
+        mock_time.time.return_value = 103.0
+        conn.flush()  # partial send, timeout restarts
+        loop.call_later.reset_mock()
+        mock_time.time.return_value = 105.0
+        conn._check_send_timeout()
+        on_timeout.assert_not_called()
+        loop.call_later.assert_called_once_with(3.0, conn._check_send_timeout)
+
+    def test_close_cancels_send_timer(self):
+        conn = self._make_connection()
+        loop = Mock()
+        conn.attach(loop, Mock())
+        conn.send(b'hello')
+        timer = loop.call_later.return_value
+        conn.close()
+        timer.cancel.assert_called_once_with()
+
     def test_default_send_timeout(self):
         conn = self._make_connection()
         self.assertEqual(conn._send_timeout, Connection.DEFAULT_SEND_TIMEOUT)
@@ -134,17 +176,135 @@ class TestConnection(unittest.TestCase):
         self.assertEqual(conn._buffer_limit, Connection.DEFAULT_BUFFER_LIMIT)
 
 
+class TestConnectionChunks(unittest.TestCase):
+    """Output buffer as queue of shared chunks"""
+
+    def _make_connection(self, socket=None, buffer_limit=None):
+        return Connection(
+            (socket or MockSocket(), ('127.0.0.1', 12345)),
+            buffer_limit=buffer_limit, log=Mock())
+
+    def test_bytes_shared_between_connections(self):
+        data = b'broadcast'
+        con1 = self._make_connection()
+        con2 = self._make_connection()
+        con1.send(data)
+        con2.send(data)
+        self.assertIs(con1._out_chunks[0], data)
+        self.assertIs(con2._out_chunks[0], data)
+
+    def test_mutable_data_copied(self):
+        data = bytearray(b'abc')
+        conn = self._make_connection()
+        conn.send(data)
+        data[0] = ord('x')
+        conn.flush()
+        self.assertEqual(conn.socket().sent_data, b'abc')
+
+    def test_partial_send_keeps_offset(self):
+        sock = Mock(spec=['send', 'close', 'fileno'])
+        sock.send.side_effect = lambda data: min(len(data), 3)
+        conn = self._make_connection(sock)
+        conn.send(b'hello')
+        self.assertEqual(conn.flush(), 3)
+        self.assertEqual(conn.pending_size(), 2)
+        self.assertEqual(bytes(sock.send.call_args.args[0]), b'hello')
+        conn.flush()
+        self.assertEqual(bytes(sock.send.call_args.args[0]), b'lo')
+        self.assertFalse(conn.has_pending_data())
+
+    def test_small_chunks_joined(self):
+        conn = self._make_connection()
+        for chunk in (b'ab', b'cd', b'ef'):
+            conn.send(chunk)
+        self.assertEqual(conn.flush(), 6)
+        self.assertEqual(conn.socket().sent_data, b'abcdef')
+        self.assertEqual(conn.pending_size(), 0)
+
+    def test_partial_send_across_chunks(self):
+        sock = Mock(spec=['send', 'close', 'fileno'])
+        sock.send.side_effect = lambda data: min(len(data), 3)
+        conn = self._make_connection(sock)
+        conn.send(b'ab')
+        conn.send(b'cd')
+        conn.flush()
+        self.assertEqual(len(conn._out_chunks), 1)
+        self.assertEqual(conn.pending_size(), 1)
+        conn.flush()
+        self.assertEqual(bytes(sock.send.call_args.args[0]), b'd')
+
+    def test_sendmsg_scatter_gather(self):
+        sock = Mock()
+        sock.sendmsg.side_effect = lambda buffers: 5
+        conn = self._make_connection(sock)
+        chunks = [b'ab', b'cd', b'ef']
+        for chunk in chunks:
+            conn.send(chunk)
+        self.assertEqual(conn.flush(), 5)
+        buffers = sock.sendmsg.call_args.args[0]
+        self.assertEqual(len(buffers), 3)
+        for buf, chunk in zip(buffers, chunks):
+            self.assertIs(buf, chunk)
+        sock.send.assert_not_called()
+        conn.flush()
+        self.assertEqual(
+            [bytes(buf) for buf in sock.sendmsg.call_args.args[0]], [b'f'])
+
+    def test_sendmsg_iov_max(self):
+        sock = Mock()
+        sock.sendmsg.side_effect = lambda buffers: sum(map(len, buffers))
+        conn = self._make_connection(sock)
+        for _ in range(Connection.IOV_MAX + 5):
+            conn.send(b'x')
+        self.assertEqual(conn.flush(), Connection.IOV_MAX)
+        self.assertEqual(conn.pending_size(), 5)
+
+    def test_sendmsg_real_socket(self):
+        sock_a, sock_b = socket.socketpair()
+        self.addCleanup(sock_b.close)
+        conn = self._make_connection(sock_a)
+        for chunk in (b'hello ', b'world'):
+            conn.send(chunk)
+        self.assertEqual(conn.flush(), 11)
+        self.assertEqual(sock_b.recv(16), b'hello world')
+        conn.close()
+
+    def test_buffer_limit_counts_lag(self):
+        conn = self._make_connection(buffer_limit=8)
+        conn.send(b'12345')
+        conn.flush()
+        self.assertEqual(conn.send(b'12345678'), 8)
+        self.assertIsNone(conn.send(b'9'))
+
+
 class TestConnectionFlushError(unittest.TestCase):
     def test_flush_returns_none_on_oserror(self):
         mock_socket = Mock()
         mock_socket.send.side_effect = OSError("Connection reset")
+        mock_socket.sendmsg.side_effect = OSError("Connection reset")
         addr = ('127.0.0.1', 12345)
         log = Mock()
         conn = Connection((mock_socket, addr), log=log)
-        conn._out_buffer.extend(b'hello')
+        conn.send(b'hello')
         result = conn.flush()
         self.assertIsNone(result)
 
 
+class TestConnectionSocket(unittest.TestCase):
+    def test_close_cancels_send_timer(self):
+        mock_socket = MockSocket()
+        log = Mock()
+        conn = ConnectionSocket((mock_socket, ('/tmp/ser.sock',)), Mock(),
+                                log=log)
+        loop = Mock()
+        conn.attach(loop, Mock())
+        conn.send(b'hello')
+        conn.close()
+        loop.call_later.return_value.cancel.assert_called_once_with()
+        self.assertTrue(mock_socket.closed)
+        log.info.assert_called_with(
+            "Client disconnected: %s", '/tmp/ser.sock')
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,13 +1,13 @@
 """Tests for connection control protocol"""
 
 import unittest
-from unittest.mock import Mock
+from unittest.mock import ANY, Mock
 
 from ser2tcp.connection_tcp import ConnectionTcp
 from ser2tcp.connection_control import (
     wrap_control, ESCAPE, CMD_RTS_LOW, CMD_RTS_HIGH,
     CMD_DTR_LOW, CMD_DTR_HIGH, CMD_GET_SIGNALS, REPORT_BASE,
-    SIGNAL_BITS,
+    REPORT_FRAMES, SIGNAL_BITS, signal_mask,
 )
 
 
@@ -72,13 +72,13 @@ class TestControlProtocol(unittest.TestCase):
         """Plain data should be forwarded to serial"""
         conn, serial = self._make_connection()
         conn.on_received(b'hello')
-        serial.send.assert_called_once_with(b'hello')
+        serial.send.assert_called_once_with(b'hello', ANY, 0)
 
     def test_receive_ff_ff_literal(self):
         """FF FF should become single 0xFF"""
         conn, serial = self._make_connection()
         conn.on_received(b'\xff\xff')
-        serial.send.assert_called_once_with(bytes([0xff]))
+        serial.send.assert_called_once_with(bytes([0xff]), ANY, 0)
 
     def test_receive_rts_low(self):
         conn, serial = self._make_connection(rts=True)
@@ -134,13 +134,13 @@ class TestControlProtocol(unittest.TestCase):
         conn.on_received(data)
         serial.set_rts.assert_called_once_with(True)
         # serial.send should be called with combined clean data
-        serial.send.assert_called_once_with(b'ABCD')
+        serial.send.assert_called_once_with(b'ABCD', ANY, 0)
 
     def test_receive_split_escape(self):
         """Escape byte at end of chunk, command in next chunk"""
         conn, serial = self._make_connection(rts=True)
         conn.on_received(b'AB\xff')
-        serial.send.assert_called_once_with(b'AB')
+        serial.send.assert_called_once_with(b'AB', ANY, 0)
         serial.send.reset_mock()
         conn.on_received(bytes([CMD_RTS_HIGH]))
         serial.set_rts.assert_called_once_with(True)
@@ -173,6 +173,53 @@ class TestControlProtocol(unittest.TestCase):
         expected = bytes([ESCAPE, REPORT_BASE | expected_mask])
         self.assertEqual(conn.socket().sent_data, expected)
 
+    def test_signal_report_shared_frame(self):
+        """Report is shared frame from table"""
+        conn1, _ = self._make_connection(signals=['cts'])
+        conn2, _ = self._make_connection(signals=['cts'])
+        conn1.send_signal_report(0x3F)
+        conn2.send_signal_report(0x3F)
+        frame = REPORT_FRAMES[1 << SIGNAL_BITS['cts']]
+        self.assertIs(conn1._out_chunks[0], frame)
+        self.assertIs(conn2._out_chunks[0], frame)
+
+    def test_signal_mask(self):
+        self.assertEqual(signal_mask(['RTS', 'cd', 'unknown']), 0x21)
+        self.assertEqual(len(REPORT_FRAMES), 64)
+
+    def test_receive_escaped_ff_single_send(self):
+        """Data with escaped 0xFF and commands are sent by one call"""
+        conn, serial = self._make_connection()
+        conn.on_received(
+            b'A' + b'\xff' * 7 + bytes([CMD_DTR_HIGH]) + b'B\xff\xffC')
+        serial.set_dtr.assert_called_once_with(True)
+        serial.send.assert_called_once_with(
+            b'A\xff\xff\xffB\xffC', ANY, 0)
+
+    def test_receive_all_ff(self):
+        conn, serial = self._make_connection()
+        conn.on_received(b'\xff' * 4096)
+        serial.send.assert_called_once_with(b'\xff' * 2048, ANY, 0)
+
+    def test_receive_split_ff_run(self):
+        conn, serial = self._make_connection()
+        conn.on_received(b'A\xff\xff\xff')
+        conn.on_received(b'\xffB')
+        self.assertEqual(
+            [bytes(call.args[0]) for call in serial.send.call_args_list],
+            [b'A\xff', b'\xffB'])
+
+    def test_receive_data_disabled(self):
+        """Without data only commands are processed"""
+        ControlTcp = wrap_control(
+            ConnectionTcp, {'signals': [], 'rts': True}, data_enabled=False)
+        serial = Mock()
+        conn = ControlTcp(
+            (MockSocket(), ('127.0.0.1', 12345)), serial, log=Mock())
+        conn.on_received(b'AB\xff\xff' + bytes([ESCAPE, CMD_RTS_LOW]))
+        serial.set_rts.assert_called_once_with(False)
+        serial.send.assert_not_called()
+
     def test_empty_control_still_escapes(self):
         """Control with no signals/rts/dtr still escapes 0xFF"""
         conn, serial = self._make_connection(
@@ -182,7 +229,7 @@ class TestControlProtocol(unittest.TestCase):
         self.assertEqual(conn.socket().sent_data, b'\xff\xff')
         # Incoming FF FF still produces literal 0xFF
         conn.on_received(b'\xff\xff')
-        serial.send.assert_called_once_with(bytes([0xff]))
+        serial.send.assert_called_once_with(bytes([0xff]), ANY, 0)
 
     def test_class_name(self):
         """Wrapped class should have descriptive name"""
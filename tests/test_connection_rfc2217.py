@@ -0,0 +1,264 @@
+"""Tests for ConnectionRfc2217 (telnet COM-PORT-OPTION)"""
+
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, Mock
+
+import serial
+
+from ser2tcp.connection_rfc2217 import ConnectionRfc2217, validate_config
+from ser2tcp.serial_proxy import SerialProxy
+from ser2tcp.server_manager import ServersManager
+
+IAC = 0xff
+SB = 0xfa
+SE = 0xf0
+WILL = 0xfb
+DO = 0xfd
+COM_PORT = 0x2c
+
+
+def _sb(command, value):
+    """Return COM-PORT-OPTION subnegotiation frame"""
+    return bytes((IAC, SB, COM_PORT, command)) \
+        + value.replace(b'\xff', b'\xff\xff') + bytes((IAC, SE))
+
+
+class MockSocket:
+    """Mock socket for testing"""
+    def __init__(self):
+        self.sent_data = bytearray()
+        self._fileno = 5
+
+    def send(self, data):
+        self.sent_data.extend(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+    def fileno(self):
+        return self._fileno
+
+
+class TestConnectionRfc2217(unittest.TestCase):
+    def setUp(self):
+        self.socket = MockSocket()
+        self.serial = Mock()
+        self.serial.get_signals.return_value = 0
+        self.con = ConnectionRfc2217(
+            (self.socket, ('127.0.0.1', 12345)), self.serial, log=Mock())
+        self.initial = self._sent()
+
+    def _sent(self):
+        self.con.flush()
+        data = bytes(self.socket.sent_data)
+        self.socket.sent_data.clear()
+        return data
+
+    def _enable(self):
+        self.con.on_received(bytes((IAC, WILL, COM_PORT, IAC, DO, COM_PORT)))
+        self._sent()
+
+    def test_initial_negotiation(self):
+        self.assertIn(bytes((IAC, WILL, COM_PORT)), self.initial)
+        self.assertNotIn(b'\xff\xff', self.initial)
+
+    def test_option_accepted(self):
+        """Client WILL is answered, DO acknowledges own WILL"""
+        self.serial.get_signals.return_value = 1 << 2  # CTS
+        self.con.on_received(bytes((IAC, WILL, COM_PORT, IAC, DO, COM_PORT)))
+        self.assertEqual(
+            self._sent(),
+            bytes((IAC, DO, COM_PORT)) + _sb(107, b'\x11'))
+
+    def test_set_baudrate(self):
+        self._enable()
+        self.serial.get_port_setting.return_value = 115200
+        self.con.on_received(_sb(1, (115200).to_bytes(4, 'big')))
+        self.serial.set_port_setting.assert_called_once_with(
+            'baudrate', 115200)
+        self.assertEqual(self._sent(), _sb(101, (115200).to_bytes(4, 'big')))
+
+    def test_baudrate_with_iac(self):
+        """Value bytes 0xff are escaped in both directions"""
+        self._enable()
+        self.serial.get_port_setting.return_value = 0xffff
+        self.con.on_received(_sb(1, (0xffff).to_bytes(4, 'big')))
+        self.serial.set_port_setting.assert_called_once_with(
+            'baudrate', 0xffff)
+        self.assertEqual(self._sent(), _sb(101, b'\x00\x00\xff\xff'))
+
+    def test_query_baudrate(self):
+        self._enable()
+        self.serial.get_port_setting.return_value = 9600
+        self.con.on_received(_sb(1, bytes(4)))
+        self.serial.set_port_setting.assert_not_called()
+        self.assertEqual(self._sent(), _sb(101, (9600).to_bytes(4, 'big')))
+
+    def test_set_parity(self):
+        self._enable()
+        self.serial.get_port_setting.return_value = serial.PARITY_EVEN
+        self.con.on_received(_sb(3, b'\x03'))
+        self.serial.set_port_setting.assert_called_once_with(
+            'parity', serial.PARITY_EVEN)
+        self.assertEqual(self._sent(), _sb(103, b'\x03'))
+
+    def test_rejected_setting_answers_actual(self):
+        self._enable()
+        self.serial.get_port_setting.return_value = serial.STOPBITS_ONE
+        self.con.on_received(_sb(4, b'\x02'))
+        self.assertEqual(self._sent(), _sb(104, b'\x01'))
+
+    def test_set_dtr(self):
+        self._enable()
+        self.serial.get_signals.return_value = 1 << 1  # DTR
+        self.con.on_received(_sb(5, b'\x08'))
+        self.serial.set_dtr.assert_called_once_with(True)
+        self.assertEqual(self._sent(), _sb(105, b'\x08'))
+
+    def test_request_rts(self):
+        self._enable()
+        self.con.on_received(_sb(5, b'\x0a'))
+        self.serial.set_rts.assert_not_called()
+        self.assertEqual(self._sent(), _sb(105, b'\x0c'))
+
+    def test_flow_control(self):
+        self._enable()
+        self.serial.get_port_setting.side_effect = lambda name: \
+            name == 'rtscts'
+        self.con.on_received(_sb(5, b'\x03'))
+        self.serial.set_port_setting.assert_any_call('rtscts', True)
+        self.serial.set_port_setting.assert_any_call('xonxoff', False)
+        self.assertEqual(self._sent(), _sb(105, b'\x03'))
+
+    def test_purge(self):
+        self._enable()
+        self.con.on_received(_sb(12, b'\x03'))
+        self.serial.purge.assert_called_once_with(
+            receive=True, transmit=True)
+        self.assertEqual(self._sent(), _sb(112, b'\x03'))
+
+    def test_invalid_value(self):
+        self._enable()
+        self.con.on_received(_sb(1, b'\x01'))
+        self.serial.set_port_setting.assert_not_called()
+        self.assertEqual(self._sent(), b'')
+
+    def test_modem_state_pushed(self):
+        self._enable()
+        self.con.send_signal_report(1 << 3)  # DSR
+        self.assertEqual(self._sent(), _sb(107, b'\x22'))
+        self.con.send_signal_report(1 << 3 | 1)  # RTS is not modem state
+        self.assertEqual(self._sent(), b'')
+        self.con.send_signal_report(0)
+        self.assertEqual(self._sent(), _sb(107, b'\x02'))
+
+    def test_modem_state_mask(self):
+        self._enable()
+        self.con.on_received(_sb(11, b'\x10'))
+        self.assertEqual(self._sent(), _sb(111, b'\x10'))
+        self.con.send_signal_report(1 << 3)  # DSR masked
+        self.assertEqual(self._sent(), b'')
+
+    def test_no_notify_before_enabled(self):
+        self.con.send_signal_report(1 << 2)
+        self.assertEqual(self._sent(), b'')
+
+    def test_data_forwarded(self):
+        self._enable()
+        self.con.on_received(b'AT\xff\xff' + _sb(12, b'\x01') + b'\r')
+        self.assertEqual(
+            [bytes(call.args[0]) for call in self.serial.send.call_args_list],
+            [b'AT\xff', b'\r'])
+
+    def test_se_without_sb_ignored(self):
+        self._enable()
+        self.con.on_received(bytes((IAC, SE)) + b'AT')
+        self.serial.set_port_setting.assert_not_called()
+        self.serial.send.assert_called_once_with(b'AT', self.con, 0)
+
+
+class TestValidateConfig(unittest.TestCase):
+    def test_valid(self):
+        self.assertIsNone(validate_config({'protocol': 'tcp'}))
+        self.assertIsNone(
+            validate_config({'protocol': 'telnet', 'rfc2217': True}))
+        self.assertIsNone(
+            validate_config({'protocol': 'tcp', 'rfc2217': False}))
+
+    def test_invalid(self):
+        self.assertIn('boolean', validate_config(
+            {'protocol': 'telnet', 'rfc2217': 1}))
+        self.assertIn('telnet', validate_config(
+            {'protocol': 'tcp', 'rfc2217': True}))
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+class TestRfc2217Client(unittest.TestCase):
+    """pyserial rfc2217:// client against pty as serial port"""
+
+    def setUp(self):
+        import tty
+        self.master, slave = os.openpty()
+        tty.setraw(self.master)
+        self.addCleanup(os.close, self.master)
+        self.addCleanup(os.close, slave)
+        self.manager = ServersManager()
+        self.manager.MAX_TIMEOUT = .01
+        self.proxy = SerialProxy({
+            'serial': {'port': os.ttyname(slave), 'baudrate': 9600},
+            'servers': [{
+                'protocol': 'telnet', 'rfc2217': True,
+                'address': '127.0.0.1', 'port': 0}],
+        }, log=MagicMock())
+        self.manager.add_server(self.proxy)
+        port = self.proxy.servers[0]._socket.getsockname()[1]
+        self.url = f'rfc2217://127.0.0.1:{port}'
+        # pyserial client blocks until answered, loop runs in thread
+        self.running = True
+        loop = threading.Thread(target=self._run)
+        loop.start()
+        self.addCleanup(self.manager.close)
+        self.addCleanup(loop.join)
+        self.addCleanup(setattr, self, 'running', False)
+
+    def _run(self):
+        while self.running:
+            self.manager.process()
+
+    def _read_master(self, size):
+        data = b''
+        deadline = time.monotonic() + 5
+        while len(data) < size and time.monotonic() < deadline:
+            data += os.read(self.master, size - len(data))
+        return data
+
+    def test_client(self):
+        # pty has no modem lines, DTR/RTS are not set (dsrdtr/rtscts)
+        client = serial.serial_for_url(
+            self.url, baudrate=115200, rtscts=True, dsrdtr=True, timeout=5)
+        self.addCleanup(client.close)
+        port = self.proxy._serial
+        self.assertEqual(port.baudrate, 115200)
+        self.assertTrue(port.rtscts)
+        client.write(b'AT\xff\r')
+        self.assertEqual(self._read_master(4), b'AT\xff\r')
+        os.write(self.master, b'OK\xff\r\n')
+        self.assertEqual(client.read(5), b'OK\xff\r\n')
+        client.baudrate = 57600
+        self.assertEqual(port.baudrate, 57600)
+        client.stopbits = serial.STOPBITS_TWO
+        self.assertEqual(port.stopbits, serial.STOPBITS_TWO)
+        self.assertFalse(client.cts)  # pushed modem state
+        client.reset_input_buffer()
+        # pty does not support 7 bits, actual setting is answered
+        with self.assertRaises(ValueError):
+            client.bytesize = serial.SEVENBITS
+        self.assertEqual(port.bytesize, serial.EIGHTBITS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,12 @@
 """Tests for ConnectionSsl class"""
 
+import gc
+import ssl
 import unittest
 import unittest.mock
-from unittest.mock import Mock
+from unittest.mock import ANY, Mock
 
-from ser2tcp.connection_ssl import ConnectionSsl
+from ser2tcp.connection_ssl import ConnectionSsl, SslHandshakeError
 
 
 class MockSocket:
@@ -12,6 +14,8 @@ class MockSocket:
     def __init__(self):
         self.sent_data = bytearray()
         self.closed = False
+        self.blocking = True
+        self.handshake = []  # results of do_handshake() calls
         self._fileno = 5
 
     def send(self, data):
@@ -21,6 +25,15 @@ class MockSocket:
     def close(self):
         self.closed = True
 
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def do_handshake(self):
+        if self.handshake:
+            result = self.handshake.pop(0)
+            if result is not None:
+                raise result
+
     def fileno(self):
         return self._fileno
 
@@ -46,7 +59,9 @@ class TestConnectionSsl(unittest.TestCase):
         """SSL context should wrap the socket"""
         conn, _, context, raw_socket = self._make_connection()
         context.wrap_socket.assert_called_once_with(
-            raw_socket, server_side=True)
+            raw_socket, server_side=True, do_handshake_on_connect=False)
+        self.assertFalse(raw_socket.blocking)
+        self.assertFalse(conn.handshake_done)
 
     def test_log_connected_shows_ssl(self):
         """Log message should show SSL protocol"""
@@ -62,6 +77,8 @@ class TestConnectionSsl(unittest.TestCase):
             mock_serial,
             log=log,
             ssl_context=mock_context)
+        log.info.assert_not_called()  # not before handshake
+        self.assertTrue(conn.do_handshake())
         # Check that SSL was logged (first call, before any disconnect)
         first_call = log.info.call_args_list[0]
         self.assertEqual(
@@ -74,7 +91,7 @@ class TestConnectionSsl(unittest.TestCase):
         """Data should be forwarded to serial"""
         conn, serial, _, _ = self._make_connection()
         conn.on_received(b'hello')
-        serial.send.assert_called_once_with(b'hello')
+        serial.send.assert_called_once_with(b'hello', ANY, 0)
 
     def test_send_adds_to_buffer(self):
         """Send should add data to buffer"""
@@ -83,6 +100,57 @@ class TestConnectionSsl(unittest.TestCase):
         self.assertEqual(result, 4)
         self.assertTrue(conn.has_pending_data())
 
+    def test_handshake_steps(self):
+        conn, _, _, _ = self._make_connection()
+        ssl_socket = conn.socket()
+        ssl_socket.blocking = False
+        ssl_socket.handshake = [
+            ssl.SSLWantReadError(), ssl.SSLWantWriteError(), None]
+        self.assertFalse(conn.do_handshake())
+        self.assertFalse(conn.handshake_wants_write)
+        self.assertFalse(conn.do_handshake())
+        self.assertTrue(conn.handshake_wants_write)
+        self.assertTrue(conn.do_handshake())
+        self.assertTrue(conn.handshake_done)
+        self.assertFalse(conn.handshake_wants_write)
+        self.assertFalse(ssl_socket.blocking)
+
+    def test_flush_waits_for_tls(self):
+        conn, _, _, _ = self._make_connection()
+        conn.send(b'hello')
+        for error in (ssl.SSLWantWriteError(), ssl.SSLWantReadError()):
+            with unittest.mock.patch.object(
+                    conn.socket(), 'send', side_effect=error):
+                self.assertEqual(conn.flush(), 0)
+        self.assertEqual(conn.flush(), 5)
+        self.assertEqual(conn.socket().sent_data, b'hello')
+
+    def test_pending_input(self):
+        conn, _, _, _ = self._make_connection()
+        conn.socket().pending = Mock(return_value=100)
+        self.assertEqual(conn.pending_input(), 100)
+        conn.close()
+        self.assertEqual(conn.pending_input(), 0)
+
+    def test_handshake_error(self):
+        conn, _, _, _ = self._make_connection()
+        conn.socket().handshake = [ssl.SSLError('bad record')]
+        with self.assertRaises(SslHandshakeError):
+            conn.do_handshake()
+
+    def test_wrap_error_closes_socket(self):
+        raw_socket = MockSocket()
+        context = Mock()
+        context.wrap_socket.side_effect = ssl.SSLError('no cipher')
+        with unittest.mock.patch('sys.unraisablehook') as hook:
+            with self.assertRaises(SslHandshakeError):
+                ConnectionSsl(
+                    (raw_socket, ('127.0.0.1', 12345)), Mock(), log=Mock(),
+                    ssl_context=context)
+            gc.collect()
+        self.assertTrue(raw_socket.closed)
+        hook.assert_not_called()  # __del__ of partial connection
+
 
 if __name__ == "__main__":
     unittest.main()
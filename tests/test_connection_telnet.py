@@ -1,7 +1,7 @@
 """Tests for ConnectionTelnet class"""
 
 import unittest
-from unittest.mock import Mock
+from unittest.mock import ANY, Mock
 
 from ser2tcp.connection_telnet import ConnectionTelnet
 
@@ -57,13 +57,13 @@ class TestConnectionTelnet(unittest.TestCase):
         """Plain data should be forwarded to serial"""
         conn, serial = self._make_connection()
         conn.on_received(b'hello')
-        serial.send.assert_called_once_with(bytearray(b'hello'))
+        serial.send.assert_called_once_with(bytearray(b'hello'), ANY, 0)
 
     def test_on_received_escaped_iac(self):
         """Escaped IAC (0xff 0xff) should become single 0xff"""
         conn, serial = self._make_connection()
         conn.on_received(b'\xff\xff')
-        serial.send.assert_called_once_with(bytes((0xff,)))
+        serial.send.assert_called_once_with(bytes((0xff,)), ANY, 0)
 
     def test_on_received_telnet_will_command(self):
         """TELNET WILL command should not be forwarded"""
@@ -111,6 +111,56 @@ class TestConnectionTelnet(unittest.TestCase):
         conn.on_received(bytes((0xff, 0xfa, 0x22, 0x01, 0x02, 0xff, 0xf0)))
         serial.send.assert_not_called()
 
+    def test_on_received_data_after_subnegotiation(self):
+        conn, serial = self._make_connection()
+        conn.on_received(bytes((0xff, 0xfa, 0x22, 0x01, 0xff, 0xf0)) + b'ok')
+        serial.send.assert_called_once_with(b'ok', ANY, 0)
+
+    def test_on_received_se_without_sb(self):
+        """IAC SE outside of subnegotiation is ignored"""
+        conn, serial = self._make_connection()
+        conn.on_received(b'a\xff\xf0b')
+        self.assertEqual(
+            [bytes(call.args[0]) for call in serial.send.call_args_list],
+            [b'a', b'b'])
+
+    def test_on_received_escaped_iac_in_data(self):
+        """Data with escaped IAC are forwarded by one call"""
+        conn, serial = self._make_connection()
+        conn.on_received(b'a\xff\xffb\xff\xff\xff\xffc')
+        serial.send.assert_called_once_with(b'a\xffb\xff\xffc', ANY, 0)
+
+    def test_on_received_all_iac(self):
+        conn, serial = self._make_connection()
+        conn.on_received(b'\xff' * 4096)
+        serial.send.assert_called_once_with(b'\xff' * 2048, ANY, 0)
+
+    def test_on_received_split_iac(self):
+        """IAC at end of chunk is continued by next chunk"""
+        conn, serial = self._make_connection()
+        conn.on_received(b'ab\xff')
+        conn.on_received(b'\xffcd\xff')
+        conn.on_received(b'\xfb')
+        conn.on_received(b'\x01ef')
+        self.assertEqual(
+            [bytes(call.args[0]) for call in serial.send.call_args_list],
+            [b'ab', b'\xff', b'cd', b'ef'])
+
+    def test_on_received_memoryview(self):
+        conn, serial = self._make_connection()
+        conn.on_received(memoryview(bytearray(b'xy\xff\xfd\x01z')))
+        self.assertEqual(
+            [bytes(call.args[0]) for call in serial.send.call_args_list],
+            [b'xy', b'z'])
+
+    def test_on_received_not_copied(self):
+        """Data runs are forwarded as slices of receive buffer"""
+        conn, serial = self._make_connection()
+        buffer = bytearray(b'xy\xff\xfd\x01z')
+        conn.on_received(memoryview(buffer))
+        for call in serial.send.call_args_list:
+            self.assertIs(call.args[0].obj, buffer)
+
     def test_initial_negotiation_sent(self):
         """Initial TELNET negotiation should be sent on connect"""
         mock_socket = MockSocket()
@@ -123,6 +173,43 @@ class TestConnectionTelnet(unittest.TestCase):
         self.assertIn(bytes((0xff, 0xfd, 0x22)), mock_socket.sent_data)
         self.assertIn(bytes((0xff, 0xfb, 0x01)), mock_socket.sent_data)
 
+    def test_initial_negotiation_not_escaped(self):
+        mock_socket = MockSocket()
+        conn = ConnectionTelnet(
+            (mock_socket, ('127.0.0.1', 12345)), Mock(), log=Mock())
+        conn.flush()
+        self.assertEqual(
+            mock_socket.sent_data, bytes((0xff, 0xfd, 0x22, 0xff, 0xfb, 0x01)))
+
+    def _negotiate(self, data):
+        conn, _ = self._make_connection()
+        conn.on_received(data)
+        conn.flush()
+        return bytes(conn.socket().sent_data)
+
+    def test_unknown_option_refused(self):
+        # IAC WILL TTYPE, IAC DO STATUS
+        self.assertEqual(
+            self._negotiate(bytes((0xff, 0xfb, 0x18, 0xff, 0xfd, 0x05))),
+            bytes((0xff, 0xfe, 0x18, 0xff, 0xfc, 0x05)))
+
+    def test_option_accepted_once(self):
+        # IAC DO SGA twice
+        self.assertEqual(
+            self._negotiate(bytes((0xff, 0xfd, 0x03, 0xff, 0xfd, 0x03))),
+            bytes((0xff, 0xfb, 0x03)))
+
+    def test_own_request_not_answered(self):
+        # IAC DO ECHO acknowledges WILL ECHO, IAC WONT LINEMODE refuses DO
+        self.assertEqual(
+            self._negotiate(bytes((0xff, 0xfd, 0x01, 0xff, 0xfc, 0x22))), b'')
+
+    def test_enabled_option_disabled(self):
+        # IAC DO ECHO, IAC DONT ECHO
+        self.assertEqual(
+            self._negotiate(bytes((0xff, 0xfd, 0x01, 0xff, 0xfe, 0x01))),
+            bytes((0xff, 0xfc, 0x01)))
+
 
 class TestTelnetConstants(unittest.TestCase):
     def test_iac_value(self):
@@ -0,0 +1,130 @@
+"""Tests for serial port history"""
+
+import unittest
+from unittest.mock import patch
+
+from ser2tcp.history import History, LINES_SIZE, replay_options, \
+    validate_config, validate_replay
+
+
+class TestHistory(unittest.TestCase):
+    """Test bounded history of received data"""
+
+    def test_disabled(self):
+        history = History()
+        history.append(b'data')
+        self.assertEqual(history.chunks(), [])
+        self.assertEqual(history.total, 0)
+
+    def test_chunks_shared(self):
+        history = History(100)
+        data = b'hello'
+        history.append(data)
+        history.append(b'')
+        self.assertIs(history.chunks()[0], data)
+        self.assertEqual(history.total, 5)
+
+    def test_drop_oldest(self):
+        history = History(10)
+        for chunk in (b'aaaa', b'bbbb', b'cccc'):
+            history.append(chunk)
+        self.assertEqual(b''.join(history.chunks()), b'aabbbbcccc')
+        self.assertEqual(history.total, 10)
+        history.append(b'dddddd')
+        self.assertEqual(history.chunks(), [b'cccc', b'dddddd'])
+
+    def test_chunk_larger_than_size(self):
+        history = History(4)
+        history.append(b'abc')
+        history.append(b'0123456789')
+        self.assertEqual(history.chunks(), [b'6789'])
+        self.assertEqual(history.total, 4)
+
+    def test_clear(self):
+        history = History(10)
+        history.append(b'data')
+        history.clear()
+        self.assertEqual(history.chunks(), [])
+        self.assertEqual(history.total, 0)
+
+
+    def test_lines(self):
+        history = History(lines=2)
+        self.assertEqual(history.size, LINES_SIZE)
+        history.append(b'one\ntw')
+        history.append(b'o\nthree\nfo')
+        self.assertEqual(b''.join(history.chunks()), b'two\nthree\nfo')
+        history.append(b'ur\n')
+        self.assertEqual(b''.join(history.chunks()), b'three\nfour\n')
+        self.assertEqual(history.stats['lines'], 2)
+
+    def test_lines_drop_whole_chunks(self):
+        history = History(lines=1)
+        for chunk in (b'a\n', b'b\n', b'c\n'):
+            history.append(chunk)
+        self.assertEqual(history.chunks(), [b'c\n'])
+
+    def test_lines_and_size(self):
+        history = History(5, lines=3)
+        history.append(b'1\n2\n3\n4\n')
+        self.assertEqual(history.chunks(), [b'\n3\n4\n'])
+        history.append(b'5\n6\n')
+        self.assertEqual(b''.join(history.chunks()), b'\n5\n6\n')
+
+
+class TestHistorySelect(unittest.TestCase):
+    """Test selecting history range"""
+
+    def setUp(self):
+        self.history = History(100)
+        with patch('ser2tcp.history._time.time', side_effect=[10, 20, 30]):
+            for chunk in (b'aaaa', b'bbbb', b'cccc'):
+                self.history.append(chunk)
+
+    def test_all(self):
+        self.assertEqual(
+            self.history.select(), [b'aaaa', b'bbbb', b'cccc'])
+
+    def test_max_bytes(self):
+        chunks = self.history.select(max_bytes=6)
+        self.assertEqual(chunks, [b'bb', b'cccc'])
+        self.assertIs(chunks[1], self.history.chunks()[2])
+        self.assertEqual(self.history.select(max_bytes=8), [b'bbbb', b'cccc'])
+        self.assertEqual(self.history.select(max_bytes=0), [])
+
+    def test_time_range(self):
+        self.assertEqual(self.history.select(since=20), [b'bbbb', b'cccc'])
+        self.assertEqual(self.history.select(until=20), [b'aaaa', b'bbbb'])
+        self.assertEqual(
+            self.history.select(max_bytes=2, since=15, until=25), [b'bb'])
+
+    def test_stats(self):
+        self.assertEqual(self.history.stats, {
+            'size': 100, 'lines': 0, 'bytes': 12, 'oldest': 10})
+
+
+class TestHistoryConfig(unittest.TestCase):
+    """Test validation of history and replay options"""
+
+    def test_validate_config(self):
+        self.assertIsNone(validate_config({'history': 0}))
+        self.assertIsNone(validate_config({'history_lines': 100}))
+        self.assertIn('history', validate_config({'history': True}))
+        self.assertIn('history_lines', validate_config({'history_lines': -1}))
+
+    def test_validate_replay(self):
+        for replay in (True, False, {}, {'bytes': 10, 'seconds': 1.5}):
+            self.assertIsNone(validate_replay({'replay': replay}))
+        for replay in (1, {'lines': 1}, {'bytes': 1.5}, {'seconds': -1}):
+            self.assertIn('replay', validate_replay({'replay': replay}))
+
+    def test_replay_options(self):
+        self.assertEqual(replay_options({}), {})
+        self.assertIsNone(replay_options({'replay': False}))
+        self.assertEqual(
+            replay_options({'replay': {'seconds': 5}}),
+            {'max_bytes': None, 'seconds': 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
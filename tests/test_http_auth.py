@@ -167,6 +167,14 @@ class TestSessionManager(unittest.TestCase):
         mgr.cleanup()
         self.assertEqual(len(mgr._sessions), 0)
 
+    def test_next_expiry(self):
+        mgr = self._make_manager(
+            users=[self._make_user()], session_timeout=3600)
+        self.assertIsNone(mgr.next_expiry())
+        before = time.time()
+        mgr.login('admin', 'pass')
+        self.assertGreaterEqual(mgr.next_expiry(), before + 3600)
+
     def test_cleanup_keeps_valid(self):
         mgr = self._make_manager(
             users=[self._make_user()], session_timeout=3600)
@@ -1,10 +1,14 @@
 """Tests for HTTP server wrapper"""
 
+import os
+import tempfile
 import unittest
 from unittest.mock import Mock, MagicMock, patch
 
+from ser2tcp.capture import Capture, parse_records
 from ser2tcp.http_auth import hash_password
 from ser2tcp.http_server import HttpServerWrapper
+from ser2tcp.port_inventory import shared_inventory
 
 
 class MockClient:
@@ -57,7 +61,8 @@ class TestRouting(unittest.TestCase):
     def test_api_detect_no_auth(self):
         wrapper = make_wrapper()
         client = MockClient(path='/api/detect')
-        with patch('ser2tcp.http_server._list_ports.comports', return_value=[]):
+        with patch('ser2tcp.port_inventory._list_ports.comports',
+                   return_value=[]):
             wrapper._handle_request(client)
         self.assertEqual(client.respond_status, 200)
 
@@ -425,6 +430,9 @@ class TestApiDisconnect(unittest.TestCase):
 
 
 class TestApiDetect(unittest.TestCase):
+    def setUp(self):
+        shared_inventory().invalidate()
+
     def _make_port_info(self, device='/dev/ttyUSB0', vid=None, pid=None,
             serial_number=None, manufacturer=None, product=None,
             location=None, description=None, hwid=None):
@@ -443,7 +451,7 @@ class TestApiDetect(unittest.TestCase):
     def test_empty(self):
         wrapper = make_wrapper()
         client = MockClient(path='/api/detect')
-        with patch('ser2tcp.http_server._list_ports.comports',
+        with patch('ser2tcp.port_inventory._list_ports.comports',
                 return_value=[]):
             wrapper._handle_request(client)
         self.assertEqual(client.responded, [])
@@ -455,7 +463,7 @@ class TestApiDetect(unittest.TestCase):
             product='ESP32', location='1-1')
         wrapper = make_wrapper()
         client = MockClient(path='/api/detect')
-        with patch('ser2tcp.http_server._list_ports.comports',
+        with patch('ser2tcp.port_inventory._list_ports.comports',
                 return_value=[port]):
             wrapper._handle_request(client)
         info = client.responded[0]
@@ -470,7 +478,7 @@ class TestApiDetect(unittest.TestCase):
             device='/dev/ttyS0', description='n/a', hwid='n/a')
         wrapper = make_wrapper()
         client = MockClient(path='/api/detect')
-        with patch('ser2tcp.http_server._list_ports.comports',
+        with patch('ser2tcp.port_inventory._list_ports.comports',
                 return_value=[port]):
             wrapper._handle_request(client)
         info = client.responded[0]
@@ -483,7 +491,7 @@ class TestApiDetect(unittest.TestCase):
         port = self._make_port_info(description='USB Serial Port')
         wrapper = make_wrapper()
         client = MockClient(path='/api/detect')
-        with patch('ser2tcp.http_server._list_ports.comports',
+        with patch('ser2tcp.port_inventory._list_ports.comports',
                 return_value=[port]):
             wrapper._handle_request(client)
         self.assertEqual(client.responded[0]['description'], 'USB Serial Port')
@@ -741,6 +749,27 @@ class TestApiPortsCrud(unittest.TestCase):
         self.assertEqual(client.responded['index'], 0)
         manager.add_server.assert_called_once()
 
+    def test_login_schedules_session_cleanup(self):
+        wrapper, manager = self._make_wrapper_with_ports()
+        self._admin_token(wrapper)
+        manager.call_later.assert_called_once_with(
+            unittest.mock.ANY, wrapper._cleanup_sessions)
+        delay = manager.call_later.call_args.args[0]
+        self.assertGreater(delay, 0)
+
+    def test_add_port_proxy_factory(self):
+        wrapper, manager = self._make_wrapper_with_ports()
+        proxy = Mock()
+        wrapper._proxy_factory = Mock(return_value=proxy)
+        token = self._admin_token(wrapper)
+        cfg = self._port_config()
+        client = self._auth_client(
+            token, method='POST', path='/api/ports', data=cfg)
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 201)
+        wrapper._proxy_factory.assert_called_once_with(cfg)
+        manager.add_server.assert_called_once_with(proxy)
+
     def test_add_port_missing_serial(self):
         wrapper, _ = self._make_wrapper_with_ports()
         token = self._admin_token(wrapper)
@@ -918,6 +947,102 @@ class TestApiPortsCrud(unittest.TestCase):
             wrapper._handle_request(client)
         old_proxy.close.assert_called_once()
 
+    def test_delete_port_close_error(self):
+        cfg = self._port_config()
+        wrapper, manager = self._make_wrapper_with_ports([cfg])
+        wrapper._serial_proxies[0].close.side_effect = OSError('gone')
+        token = self._admin_token(wrapper)
+        client = self._auth_client(
+            token, method='DELETE', path='/api/ports/0')
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 500)
+        manager.remove_server.assert_not_called()
+        self.assertEqual(len(wrapper._serial_proxies), 1)
+
+    def _pool_wrapper(self, port_configs):
+        """Wrapper with worker pool, callbacks are kept for test"""
+        wrapper, manager = self._make_wrapper_with_ports(port_configs)
+        pool = Mock()
+        wrapper._worker_pool = pool
+        return wrapper, manager, pool
+
+    def test_delete_port_answered_from_callback(self):
+        wrapper, manager, pool = self._pool_wrapper([self._port_config()])
+        old_proxy = wrapper._serial_proxies[0]
+        token = self._admin_token(wrapper)
+        client = self._auth_client(
+            token, method='DELETE', path='/api/ports/0')
+        wrapper._handle_request(client)
+        self.assertIsNone(client.respond_status)
+        proxy, callback = pool.close_proxy_async.call_args.args
+        self.assertIs(proxy, old_proxy)
+        callback(None)
+        self.assertEqual(client.respond_status, 200)
+        manager.remove_server.assert_called_once_with(old_proxy)
+        self.assertEqual(wrapper._serial_proxies, [])
+
+    def test_delete_port_worker_timeout(self):
+        wrapper, manager, pool = self._pool_wrapper([self._port_config()])
+        token = self._admin_token(wrapper)
+        client = self._auth_client(
+            token, method='DELETE', path='/api/ports/0')
+        wrapper._handle_request(client)
+        busy = self._auth_client(
+            token, method='DELETE', path='/api/ports/0')
+        wrapper._handle_request(busy)
+        self.assertEqual(busy.respond_status, 409)
+        callback = pool.close_proxy_async.call_args.args[1]
+        callback(TimeoutError('Worker 0 not responding'))
+        self.assertEqual(client.respond_status, 504)
+        manager.remove_server.assert_not_called()
+        self.assertEqual(len(wrapper._serial_proxies), 1)
+        self.assertEqual(wrapper._busy_proxies, set())
+
+    def test_add_port_answered_from_callback(self):
+        wrapper, manager, pool = self._pool_wrapper(None)
+        token = self._admin_token(wrapper)
+        client = self._auth_client(
+            token, method='POST', path='/api/ports',
+            data=self._port_config())
+        wrapper._handle_request(client)
+        self.assertIsNone(client.respond_status)
+        proxy = Mock()
+        pool.create_proxy_async.call_args.args[1](None, proxy)
+        self.assertEqual(client.respond_status, 201)
+        manager.add_server.assert_called_once_with(proxy)
+
+    def test_add_port_no_worker(self):
+        wrapper, manager, pool = self._pool_wrapper(None)
+        pool.create_proxy_async.side_effect = OSError('No worker')
+        token = self._admin_token(wrapper)
+        client = self._auth_client(
+            token, method='POST', path='/api/ports',
+            data=self._port_config())
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 400)
+        manager.add_server.assert_not_called()
+
+    def test_update_port_rollback_after_timeout(self):
+        cfg = self._port_config()
+        wrapper, manager, pool = self._pool_wrapper([cfg])
+        old_proxy = wrapper._serial_proxies[0]
+        token = self._admin_token(wrapper)
+        client = self._auth_client(
+            token, method='PUT', path='/api/ports/0',
+            data=self._port_config(baudrate=9600))
+        wrapper._handle_request(client)
+        pool.close_proxy_async.call_args.args[1](None)
+        pool.create_proxy_async.call_args.args[1](
+            TimeoutError('Worker 0 not responding'), None)
+        restored = Mock()
+        config, callback = pool.create_proxy_async.call_args.args
+        self.assertEqual(config, cfg)
+        callback(None, restored)
+        self.assertEqual(client.respond_status, 504)
+        self.assertEqual(wrapper._serial_proxies, [restored])
+        manager.remove_server.assert_called_once_with(old_proxy)
+        manager.add_server.assert_called_once_with(restored)
+
     def test_old_proxy_closed_on_delete(self):
         cfg = self._port_config()
         wrapper, _ = self._make_wrapper_with_ports([cfg])
@@ -1221,6 +1346,68 @@ class TestMaxConnectionsValidation(unittest.TestCase):
         })
         self.assertIsNone(result)
 
+    def test_drain_budget_invalid(self):
+        wrapper = make_wrapper()
+        for key, value in (('drain_bytes', 0), ('drain_time', -1)):
+            result = wrapper._validate_port_config({
+                'serial': {'port': '/dev/ttyUSB0'},
+                key: value,
+                'servers': [{
+                    'protocol': 'tcp', 'address': '0.0.0.0', 'port': 10001}]
+            })
+            self.assertIn(key, result)
+
+    def test_reconnect_invalid(self):
+        wrapper = make_wrapper()
+        for key, value in (
+                ('keep_open', 1), ('reconnect', 'yes'),
+                ('reconnect_timeout', -1)):
+            result = wrapper._validate_port_config({
+                'serial': {'match': {'serial_number': 'X1'}},
+                key: value,
+                'servers': [{
+                    'protocol': 'tcp', 'address': '0.0.0.0', 'port': 10001}]
+            })
+            self.assertIn(key, result)
+
+    def test_history_invalid(self):
+        wrapper = make_wrapper()
+        for key, value in (
+                ('persistent', 'yes'), ('history', -1), ('history', 1.5),
+                ('history_lines', '10')):
+            result = wrapper._validate_port_config({
+                'serial': {'port': '/dev/ttyUSB0'},
+                key: value,
+                'servers': [{
+                    'protocol': 'tcp', 'address': '0.0.0.0', 'port': 10001}]
+            })
+            self.assertIn(key, result)
+
+    def test_replay_invalid(self):
+        wrapper = make_wrapper()
+        for value in ('yes', {'lines': 5}, {'bytes': -1}, {'seconds': 'x'}):
+            result = wrapper._validate_port_config({
+                'serial': {'port': '/dev/ttyUSB0'},
+                'servers': [{
+                    'protocol': 'tcp', 'address': '0.0.0.0', 'port': 10001,
+                    'replay': value}]
+            })
+            self.assertIn('replay', result)
+
+    def test_mode_invalid(self):
+        wrapper = make_wrapper()
+        result = wrapper._validate_port_config({
+            'serial': {'port': '/dev/ttyUSB0'},
+            'servers': [{
+                'protocol': 'tcp',
+                'address': '0.0.0.0',
+                'port': 10001,
+                'mode': 'throughput',
+                'coalesce_us': 0,
+            }]
+        })
+        self.assertIn('coalesce_us', result)
+
     def test_port_level_max_connections_valid(self):
         wrapper = make_wrapper()
         result = wrapper._validate_port_config({
@@ -1259,3 +1446,85 @@ class TestMaxConnectionsValidation(unittest.TestCase):
             }]
         })
         self.assertIn('max_connections', result)
+
+
+class TestApiHistory(unittest.TestCase):
+    def _wrapper(self):
+        proxy = Mock()
+        proxy.name = 'dev'
+        proxy.history_data.return_value = b'boot log'
+        return make_wrapper(serial_proxies=[proxy]), proxy
+
+    def test_download(self):
+        wrapper, proxy = self._wrapper()
+        client = MockClient(path='/api/ports/0/history')
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 200)
+        self.assertEqual(client.responded, b'boot log')
+        proxy.history_data.assert_called_once_with(None, None, None)
+
+    def test_range(self):
+        wrapper, proxy = self._wrapper()
+        client = MockClient(
+            path='/api/ports/0/history',
+            query={'from': '1700000000.5', 'to': '1700000010', 'bytes': '4'})
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 200)
+        proxy.history_data.assert_called_once_with(
+            1700000000.5, 1700000010., 4)
+
+    def test_invalid_range(self):
+        wrapper, proxy = self._wrapper()
+        for query in ({'from': 'yesterday'}, {'bytes': '-1'}):
+            client = MockClient(path='/api/ports/0/history', query=query)
+            wrapper._handle_request(client)
+            self.assertEqual(client.respond_status, 400)
+        proxy.history_data.assert_not_called()
+
+    def test_port_not_found(self):
+        wrapper, _ = self._wrapper()
+        client = MockClient(path='/api/ports/1/history')
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 404)
+
+    def test_worker_not_running(self):
+        wrapper, proxy = self._wrapper()
+        proxy.history_data.side_effect = OSError('Worker 0 is not running')
+        client = MockClient(path='/api/ports/0/history')
+        wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 503)
+
+
+class TestApiCapture(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'capture')
+        capture = Capture({'path': self.path})
+        with patch('ser2tcp.capture._time.time', side_effect=[10, 20, 30]):
+            for data in (b'a', b'b', b'c'):
+                capture.record(2, data)
+        capture.close()
+        self.proxy = Mock()
+        self.proxy.capture_stats = capture.stats
+        self.wrapper = make_wrapper(serial_proxies=[self.proxy])
+
+    def test_range(self):
+        client = MockClient(
+            path='/api/ports/0/capture', query={'from': '15', 'to': '30'})
+        self.wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 200)
+        self.assertEqual(
+            [rec[2] for rec in parse_records(client.responded)],
+            [b'b', b'c'])
+
+    def test_invalid_range(self):
+        client = MockClient(path='/api/ports/0/capture', query={'to': 'x'})
+        self.wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 400)
+
+    def test_not_enabled(self):
+        self.proxy.capture_stats = None
+        client = MockClient(path='/api/ports/0/capture')
+        self.wrapper._handle_request(client)
+        self.assertEqual(client.respond_status, 404)
@@ -0,0 +1,139 @@
+"""Tests for cached serial port inventory"""
+
+import socket
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ser2tcp.port_inventory import HotplugMonitor, PortInventory
+from ser2tcp.server_manager import ServersManager
+
+
+def _port(device, vid=None, pid=None, serial_number=None, location=None):
+    """Create mock ListPortInfo"""
+    info = MagicMock()
+    info.device = device
+    info.vid = vid
+    info.pid = pid
+    info.serial_number = serial_number
+    info.location = location
+    return info
+
+
+PORTS = [
+    _port('/dev/ttyUSB0', vid=0x0403, pid=0x6001, serial_number='A1',
+        location='1-1'),
+    _port('/dev/ttyUSB1', vid=0x0403, pid=0x6001, serial_number='B2',
+        location='1-2'),
+    _port('/dev/ttyACM0', vid=0x303A, pid=0x4001, serial_number='C3'),
+    _port('/dev/ttyS0'),
+]
+
+
+def _uevent(subsystem, action='add'):
+    return (
+        f'{action}@/devices/x\0ACTION={action}\0DEVPATH=/devices/x\0'
+        f'SUBSYSTEM={subsystem}\0').encode()
+
+
+@patch('ser2tcp.port_inventory._list_ports.comports', return_value=PORTS)
+class TestPortInventory(unittest.TestCase):
+    def test_cached_until_ttl(self, comports):
+        inventory = PortInventory(ttl=10)
+        self.assertEqual(inventory.ports(), PORTS)
+        inventory.ports()
+        self.assertEqual(comports.call_count, 1)
+        with patch('ser2tcp.port_inventory._time.monotonic',
+                return_value=1e9):
+            inventory.ports()
+        self.assertEqual(comports.call_count, 2)
+        self.assertEqual(inventory.scans, 2)
+
+    def test_invalidate(self, comports):
+        inventory = PortInventory(ttl=10)
+        inventory.ports()
+        inventory.invalidate()
+        inventory.ports()
+        self.assertEqual(comports.call_count, 2)
+
+    def test_candidates_from_index(self, _comports):
+        inventory = PortInventory()
+        devices = [p.device for p in inventory.candidates(
+            {'vid': '0x0403', 'serial_number': 'b2'})]
+        self.assertEqual(devices, ['/dev/ttyUSB1'])
+        devices = [p.device for p in inventory.candidates({'vid': '0X303a'})]
+        self.assertEqual(devices, ['/dev/ttyACM0'])
+        self.assertEqual(inventory.candidates({'location': '9-9'}), [])
+
+    def test_candidates_wildcard_not_indexed(self, _comports):
+        inventory = PortInventory()
+        self.assertEqual(
+            inventory.candidates({'serial_number': 'A*'}), PORTS)
+        self.assertEqual(
+            len(inventory.candidates(
+                {'vid': '0x0403', 'product': 'FT232'})), 2)
+
+    def test_rescan_missing_rate_limited(self, comports):
+        inventory = PortInventory(ttl=60)
+        self.assertFalse(inventory.rescan_missing())  # nothing cached
+        inventory.ports()
+        self.assertFalse(inventory.rescan_missing())  # cache is fresh
+        self.assertEqual(comports.call_count, 1)
+        with patch('ser2tcp.port_inventory._time.monotonic',
+                return_value=inventory._scan_time
+                + PortInventory.MISS_RESCAN):
+            self.assertTrue(inventory.rescan_missing())
+            self.assertFalse(inventory.rescan_missing())
+        self.assertEqual(comports.call_count, 2)
+
+
+@unittest.skipUnless(
+    sys.platform.startswith('linux'), 'hotplug monitor needs Linux')
+@patch('ser2tcp.port_inventory._list_ports.comports', return_value=PORTS)
+class TestHotplug(unittest.TestCase):
+    def setUp(self):
+        self.sock_a, self.sock_b = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock_a.setblocking(False)
+        self.addCleanup(self.sock_b.close)
+        self.monitor = HotplugMonitor(self.sock_a)
+        self.addCleanup(self.monitor.close)
+
+    def test_long_ttl_with_monitor(self, _comports):
+        inventory = PortInventory(monitor=self.monitor)
+        self.assertEqual(inventory._ttl, PortInventory.HOTPLUG_TTL)
+        self.assertEqual(PortInventory()._ttl, PortInventory.TTL)
+
+    def test_tty_event_invalidates(self, comports):
+        inventory = PortInventory(monitor=self.monitor)
+        inventory.ports()
+        self.sock_b.send(_uevent('tty'))
+        inventory.ports()
+        inventory.ports()
+        self.assertEqual(comports.call_count, 2)
+
+    def test_listener_called_from_event_loop(self, _comports):
+        inventory = PortInventory(monitor=self.monitor)
+        loop = ServersManager()
+        self.addCleanup(loop.close)
+        listener = MagicMock()
+        inventory.add_listener(loop, listener)
+        loop.MAX_TIMEOUT = .01
+        self.sock_b.send(_uevent('tty'))
+        loop.process()
+        listener.assert_called_once_with()
+        inventory.remove_listener(listener)
+        self.assertNotIn(
+            self.monitor.fileno(), loop._selector.get_map())
+
+    def test_other_event_ignored(self, comports):
+        inventory = PortInventory(monitor=self.monitor)
+        inventory.ports()
+        self.sock_b.send(_uevent('block'))
+        self.sock_b.send(_uevent('net', 'remove'))
+        inventory.ports()
+        self.assertEqual(comports.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
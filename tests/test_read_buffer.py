@@ -0,0 +1,86 @@
+"""Tests for adaptive receive buffer"""
+
+import socket
+import unittest
+from unittest.mock import Mock
+
+from ser2tcp.connection_tcp import ConnectionTcp
+from ser2tcp.read_buffer import ReadBuffer
+
+
+def _sock(*sizes):
+    """Mock socket, recv_into fills buffer with given sizes"""
+    pending = list(sizes)
+
+    def recv_into(view):
+        size = min(pending.pop(0), len(view))
+        view[:size] = b'x' * size
+        return size
+    sock = Mock()
+    sock.recv_into.side_effect = recv_into
+    return sock
+
+
+class TestReadBuffer(unittest.TestCase):
+    def test_returns_received_view(self):
+        buf = ReadBuffer()
+        data = buf.recv_into(_sock(3))
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(data, b'xxx')
+
+    def test_grows_when_full(self):
+        buf = ReadBuffer(min_size=16, max_size=64)
+        sock = _sock(16, 32, 64, 64)
+        for expected in (32, 64, 64, 64):
+            buf.recv_into(sock)
+            self.assertEqual(buf.size, expected)
+
+    def test_shrinks_after_small_reads(self):
+        buf = ReadBuffer(min_size=16, max_size=64)
+        buf.recv_into(_sock(16))
+        buf.recv_into(_sock(32))
+        self.assertEqual(buf.size, 64)
+        sock = _sock(*[1] * (ReadBuffer.SHRINK_AFTER * 3))
+        for _ in range(ReadBuffer.SHRINK_AFTER - 1):
+            buf.recv_into(sock)
+        self.assertEqual(buf.size, 64)
+        buf.recv_into(sock)
+        self.assertEqual(buf.size, 32)
+        for _ in range(ReadBuffer.SHRINK_AFTER * 2):
+            buf.recv_into(sock)
+        self.assertEqual(buf.size, 16)
+
+    def test_medium_read_resets_shrink(self):
+        buf = ReadBuffer(min_size=16, max_size=64)
+        buf.recv_into(_sock(16))
+        sizes = [1] * (ReadBuffer.SHRINK_AFTER - 1) + [16] \
+            + [1] * (ReadBuffer.SHRINK_AFTER - 1)
+        sock = _sock(*sizes)
+        for _ in sizes:
+            buf.recv_into(sock)
+        self.assertEqual(buf.size, 32)
+
+    def test_view_valid_after_grow(self):
+        buf = ReadBuffer(min_size=4, max_size=8)
+        data = buf.recv_into(_sock(4))
+        self.assertEqual(buf.size, 8)
+        buf.recv_into(_sock(0))
+        self.assertEqual(data, b'xxxx')
+
+
+class TestConnectionReceive(unittest.TestCase):
+    def test_receive(self):
+        sock_a, sock_b = socket.socketpair()
+        con = ConnectionTcp((sock_a, ('test', 0)), Mock(), log=Mock())
+        try:
+            sock_b.send(b'hello')
+            self.assertEqual(con.receive(), b'hello')
+            sock_b.close()
+            self.assertEqual(len(con.receive()), 0)
+        finally:
+            con.close()
+            sock_b.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Tests for shared reader pool of ports without file descriptor"""
+
+import time
+import unittest
+from unittest.mock import Mock
+
+import serial
+
+from ser2tcp.reader_pool import PooledReader, ReaderPool
+from ser2tcp.server_manager import ServersManager
+
+
+class TestPooledReader(unittest.TestCase):
+    def setUp(self):
+        self.serial = serial.serial_for_url('loop://')
+        self.addCleanup(self.serial.close)
+        self.loop = Mock()
+        self.on_data = Mock()
+        self.reader = PooledReader(self.serial, self.loop, self.on_data)
+
+    def _dispatch(self):
+        """Run callback scheduled into event loop"""
+        callback = self.loop.call_soon_threadsafe.call_args.args[0]
+        callback()
+
+    def test_nothing_waiting(self):
+        self.assertFalse(self.reader.poll())
+        self.loop.call_soon_threadsafe.assert_not_called()
+        self.assertIsNone(self.reader.read())
+
+    def test_scheduled_once_per_batch(self):
+        for chunk in (b'abc', b'de'):
+            self.serial.write(chunk)
+            self.assertTrue(self.reader.poll())
+        self.loop.call_soon_threadsafe.assert_called_once()
+        self._dispatch()
+        self.on_data.assert_called_once_with()
+        self.assertEqual(self.reader.read(), b'abc')
+        self.assertEqual(self.reader.read(), b'de')
+        self.serial.write(b'f')
+        self.reader.poll()
+        self.assertEqual(self.loop.call_soon_threadsafe.call_count, 2)
+
+    def test_max_pending(self):
+        for _ in range(PooledReader.MAX_PENDING):
+            self.serial.write(b'x')
+            self.reader.poll()
+        self.serial.write(b'y')
+        self.assertFalse(self.reader.poll())
+        self.assertEqual(self.reader.pending, PooledReader.MAX_PENDING)
+
+    def test_error_closes(self):
+        self.serial.close()
+        self.assertTrue(self.reader.poll())
+        self.assertTrue(self.reader.closed)
+        self.assertEqual(self.reader.read(), b'')
+
+    def test_reschedule_only_with_chunks(self):
+        self.reader.reschedule()
+        self.loop.call_later.assert_not_called()
+        self.serial.write(b'abc')
+        self.reader.poll()
+        self._dispatch()
+        self.reader.reschedule()
+        self.loop.call_later.assert_called_once_with(
+            0, self.reader._dispatch)
+
+
+class TestReaderPool(unittest.TestCase):
+    def setUp(self):
+        self.manager = ServersManager()
+        self.addCleanup(self.manager.close)
+        self.pool = ReaderPool()
+
+    def _process_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            self.manager.process()
+
+    def test_many_ports_one_thread(self):
+        received = {}
+        ports = []
+        for i in range(8):
+            port = serial.serial_for_url('loop://')
+            self.addCleanup(port.close)
+            received[i] = bytearray()
+
+            def on_data(i=i):
+                while True:
+                    data = readers[i].read()
+                    if data is None:
+                        return
+                    received[i].extend(data)
+            ports.append((port, on_data))
+        readers = [
+            self.pool.add(port, self.manager, on_data)
+            for port, on_data in ports]
+        self.assertEqual(self.pool.readers, 8)
+        thread = self.pool._thread
+        for i, (port, _) in enumerate(ports):
+            port.write(b'port%d' % i)
+        self._process_until(lambda: all(
+            len(data) == 5 for data in received.values()))
+        for i in range(8):
+            self.assertEqual(received[i], b'port%d' % i)
+        self.assertIs(self.pool._thread, thread)
+        for reader in readers:
+            self.pool.remove(reader)
+        thread.join(timeout=2)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.pool._thread)
+
+    def test_removed_port_not_read(self):
+        port = serial.serial_for_url('loop://')
+        self.addCleanup(port.close)
+        reader = self.pool.add(port, self.manager, Mock())
+        self.pool.remove(reader)
+        port.write(b'abc')
+        time.sleep(ReaderPool.POLL_MAX * 2)
+        self.assertEqual(port.in_waiting, 3)
+        self.assertEqual(reader.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,42 @@
 """Tests for SerialProxy config parsing"""
 
+import os
+import selectors
+import socket
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, Mock, PropertyMock
 
 import serial
 
+from ser2tcp.capture import parse_records, read_range
+from ser2tcp.history import History
+from ser2tcp.port_inventory import PortInventory, shared_inventory
+from ser2tcp.reader_pool import PooledReader
 from ser2tcp.serial_proxy import SerialProxy
+from ser2tcp.server_manager import ServersManager
+from ser2tcp.tx_arbiter import TxArbiter
 
 
 def _mock_init(self, config=None, log=None):
     """Mock init that sets required attributes for __del__"""
     self._servers = []
     self._serial = None
-    self._reader_thread = None
-    self._reader_sock_r = None
-    self._reader_sock_w = None
-    self._reader_running = False
+    self._reader = None
+    self._loop = None
+    self._keep_open = False
+    self._reconnect = False
+    self._reconnect_timer = None
+    self._lost_time = None
+    self._capture = None
+    self._signal_timer = None
+    self._tx_fd = None
+    self._tx_close_timer = None
+    self._tx = TxArbiter()
+    self._history = History()
+    self._tx_paused = False
 
 
 def _make_port_info(device, vid=None, pid=None, serial_number=None,
@@ -118,12 +139,15 @@ class TestSerialProxyConfigMaps(unittest.TestCase):
 class TestFindPortByMatch(unittest.TestCase):
     """Test USB device matching"""
 
+    def setUp(self):
+        shared_inventory().invalidate()
+
     def _make_proxy(self):
         proxy = SerialProxy.__new__(SerialProxy)
         _mock_init(proxy)
         return proxy
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_by_vid_pid(self, mock_comports):
         mock_comports.return_value = [
             _make_port_info('/dev/ttyUSB0', vid=0x303A, pid=0x4001),
@@ -132,7 +156,7 @@ class TestFindPortByMatch(unittest.TestCase):
         result = proxy.find_port_by_match({'vid': '0x303A', 'pid': '0x4001'})
         self.assertEqual(result, '/dev/ttyUSB0')
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_by_serial_number(self, mock_comports):
         mock_comports.return_value = [
             _make_port_info('/dev/ttyUSB0', vid=0x303A, serial_number='ABC123'),
@@ -141,7 +165,7 @@ class TestFindPortByMatch(unittest.TestCase):
         result = proxy.find_port_by_match({'serial_number': 'ABC123'})
         self.assertEqual(result, '/dev/ttyUSB0')
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_wildcard(self, mock_comports):
         mock_comports.return_value = [
             _make_port_info(
@@ -151,7 +175,7 @@ class TestFindPortByMatch(unittest.TestCase):
         result = proxy.find_port_by_match({'manufacturer': 'Espressif*'})
         self.assertEqual(result, '/dev/ttyUSB0')
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_case_insensitive(self, mock_comports):
         mock_comports.return_value = [
             _make_port_info('/dev/ttyUSB0', vid=0x303A, product='USB Device'),
@@ -160,7 +184,7 @@ class TestFindPortByMatch(unittest.TestCase):
         result = proxy.find_port_by_match({'product': 'usb*'})
         self.assertEqual(result, '/dev/ttyUSB0')
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_no_device_found(self, mock_comports):
         mock_comports.return_value = [
             _make_port_info('/dev/ttyUSB0', vid=0x1234, pid=0x5678),
@@ -170,7 +194,25 @@ class TestFindPortByMatch(unittest.TestCase):
             proxy.find_port_by_match({'vid': '0x303A'})
         self.assertIn('No device found', str(ctx.exception))
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
+    def test_match_miss_rescans_old_cache(self, mock_comports):
+        """Device added with lost uevent is found before HOTPLUG_TTL"""
+        mock_comports.return_value = []
+        proxy = self._make_proxy()
+        with self.assertRaises(ValueError):
+            proxy.find_port_by_match({'vid': '0x303A'})
+        mock_comports.return_value = [
+            _make_port_info('/dev/ttyUSB0', vid=0x303A, pid=0x4001),
+        ]
+        with self.assertRaises(ValueError):
+            proxy.find_port_by_match({'vid': '0x303A'})  # cache is fresh
+        with patch('ser2tcp.port_inventory._time.monotonic',
+                   return_value=shared_inventory()._scan_time
+                   + PortInventory.MISS_RESCAN):
+            result = proxy.find_port_by_match({'vid': '0x303A'})
+        self.assertEqual(result, '/dev/ttyUSB0')
+
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_multiple_devices(self, mock_comports):
         mock_comports.return_value = [
             _make_port_info('/dev/ttyUSB0', vid=0x303A, pid=0x4001),
@@ -193,7 +235,7 @@ class TestFindPortByMatch(unittest.TestCase):
             proxy.find_port_by_match({'unknown': 'value'})
         self.assertIn('Unknown match attribute', str(ctx.exception))
 
-    @patch('ser2tcp.serial_proxy._list_ports.comports')
+    @patch('ser2tcp.port_inventory._list_ports.comports')
     def test_match_filters_none_values(self, mock_comports):
         """Devices with None for matched attribute should not match"""
         mock_comports.return_value = [
@@ -354,6 +396,29 @@ class TestSignalControl(unittest.TestCase):
         proxy.process_signals()
         mock_server.send_signal_report.assert_not_called()
 
+    def test_signal_poll_timer(self):
+        proxy = self._make_proxy()
+        proxy._serial = MagicMock()
+        proxy._serial.cts = True
+        proxy._has_control_servers = True
+        proxy._loop = MagicMock()
+        mock_server = MagicMock()
+        proxy._servers = [mock_server]
+        proxy._start_signal_timer()
+        proxy._loop.call_later.assert_called_once_with(
+            0.1, proxy._poll_signals)
+        proxy._loop.call_later.reset_mock()
+        proxy._poll_signals()
+        mock_server.send_signal_report.assert_called_once()
+        proxy._loop.call_later.assert_called_once_with(
+            0.1, proxy._poll_signals)
+
+    def test_signal_poll_timer_not_started_without_control(self):
+        proxy = self._make_proxy()
+        proxy._loop = MagicMock()
+        proxy._start_signal_timer()
+        proxy._loop.call_later.assert_not_called()
+
     def test_process_signals_skipped_without_control(self):
         proxy = self._make_proxy()
         proxy._serial = MagicMock()
@@ -364,82 +429,523 @@ class TestSignalControl(unittest.TestCase):
         mock_server.send_signal_report.assert_not_called()
 
 
-class TestSerialReaderThread(unittest.TestCase):
-    """Test reader thread for platforms without fileno() support"""
-
-    def _make_proxy(self):
+class TestSerialReaderPool(unittest.TestCase):
+    """Test ports without fileno() read by shared reader pool"""
+
+    def setUp(self):
+        self.manager = ServersManager()
+        self.addCleanup(self.manager.close)
+        self.proxy = SerialProxy({
+            'serial': {'port': 'loop://'},
+            'servers': [{
+                'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0}],
+        }, log=MagicMock())
+        self.manager.add_server(self.proxy)
+        self.client = socket.create_connection(
+            self.proxy.servers[0]._socket.getsockname())
+        self.client.settimeout(5)
+        self.addCleanup(self.client.close)
+        self._process_until(lambda: self.proxy.servers[0].connections)
+
+    def _process_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            self.manager.process()
+
+    def test_url_port_uses_pool(self):
+        self.assertIsNotNone(self.proxy._reader)
+        self.assertIsNone(self.proxy._tx_fd)
+        self.assertNotIn(self.proxy._serial, self.proxy.read_sockets())
+
+    def test_echo(self):
+        """Data written to loop:// are read back by pool"""
+        self.client.sendall(b'hello')
+        con = self.proxy.servers[0].connections[0]
+        self._process_until(
+            lambda: self.proxy.read_stats['bytes'] == 5
+            and not con.has_pending_data())
+        self.assertEqual(self.client.recv(100), b'hello')
+
+    def test_removed_on_disconnect(self):
+        reader = self.proxy._reader
+        self.client.close()
+        self._process_until(lambda: not self.proxy.is_connected)
+        self.assertIsNone(self.proxy._reader)
+        self.assertTrue(reader.closed)
+
+
+class TestSerialDrain(unittest.TestCase):
+    """Test draining serial port with byte/time budget per wakeup"""
+
+    def _make_proxy(self, drain_bytes=65536, drain_time=1):
         proxy = SerialProxy.__new__(SerialProxy)
         _mock_init(proxy)
         proxy._log = MagicMock()
         proxy._serial_config = {'port': '/dev/ttyUSB0'}
-        return proxy
-
-    def test_fileno_supported_no_thread(self):
-        """No reader thread when fileno() works"""
-        proxy = self._make_proxy()
-        proxy._serial = MagicMock()
-        proxy._serial.fileno.return_value = 3
-        proxy._start_reader_thread_if_needed()
-        self.assertIsNone(proxy._reader_thread)
-
-    def test_fileno_not_supported_starts_thread(self):
-        """Reader thread started when fileno() raises OSError"""
-        proxy = self._make_proxy()
-        proxy._serial = MagicMock()
-        proxy._serial.in_waiting = 0
-        proxy._serial.fileno.side_effect = OSError("fileno")
-        proxy._serial.read.side_effect = OSError("closed")
-        proxy._start_reader_thread_if_needed()
-        self.assertIsNotNone(proxy._reader_thread)
-        proxy._stop_reader_thread()
-
-    def test_start_stop_reader_thread(self):
-        """Reader thread starts and stops cleanly"""
-        proxy = self._make_proxy()
-        proxy._serial = MagicMock()
-        proxy._serial.in_waiting = 0
-        proxy._serial.read.side_effect = OSError("closed")
-        proxy._start_reader_thread()
-        self.assertIsNotNone(proxy._reader_thread)
-        self.assertIsNotNone(proxy._reader_sock_r)
-        self.assertIsNotNone(proxy._reader_sock_w)
-        self.assertTrue(proxy._reader_running)
-        proxy._stop_reader_thread()
-        self.assertIsNone(proxy._reader_thread)
-        self.assertIsNone(proxy._reader_sock_r)
-        self.assertIsNone(proxy._reader_sock_w)
-        self.assertFalse(proxy._reader_running)
-
-    def test_reader_thread_forwards_data(self):
-        """Reader thread forwards serial data through socketpair"""
-        proxy = self._make_proxy()
+        proxy._monitors = []
+        proxy._drain_bytes = drain_bytes
+        proxy._drain_time = drain_time
+        proxy._wakeups = 0
+        proxy._reads = 0
+        proxy._read_bytes = 0
+        proxy._max_reads = 0
+        proxy._budget_hits = 0
+        self.server = Mock()
+        self.server.has_connections.return_value = False
+        proxy._servers = [self.server]
         proxy._serial = MagicMock()
-        proxy._serial.in_waiting = 5
-        proxy._serial.read.side_effect = [b'hello', OSError("closed")]
-        proxy._start_reader_thread()
-        proxy._reader_thread.join(timeout=2)
-        data = proxy._reader_sock_r.recv(4096)
-        self.assertEqual(data, b'hello')
-        proxy._stop_reader_thread()
+        return proxy
 
-    def test_read_sockets_uses_socketpair(self):
-        """read_sockets() returns socketpair when reader thread is active"""
-        proxy = self._make_proxy()
-        proxy._serial = MagicMock()
-        proxy._serial.in_waiting = 0
-        proxy._serial.read.side_effect = OSError("closed")
-        proxy._start_reader_thread()
-        sockets = proxy.read_sockets()
-        self.assertIn(proxy._reader_sock_r, sockets)
-        self.assertNotIn(proxy._serial, sockets)
-        proxy._stop_reader_thread()
+    def _sent(self):
+        return [c.args[0] for c in self.server.send.call_args_list]
+
+    def test_reads_while_waiting(self):
+        proxy = self._make_proxy()
+        type(proxy._serial).in_waiting = PropertyMock(side_effect=[3, 2, 0])
+        proxy._serial.read.side_effect = [b'abc', b'de']
+        proxy._process_serial_data()
+        self.assertEqual(self._sent(), [b'abc', b'de'])
+        stats = proxy.read_stats
+        self.assertEqual(stats['wakeups'], 1)
+        self.assertEqual(stats['reads'], 2)
+        self.assertEqual(stats['bytes_per_read'], 2)
+        self.assertEqual(stats['max_reads_per_wakeup'], 2)
+        self.assertEqual(stats['budget_exhausted'], 0)
+
+    def test_byte_budget(self):
+        proxy = self._make_proxy(drain_bytes=4)
+        type(proxy._serial).in_waiting = PropertyMock(return_value=3)
+        proxy._serial.read.return_value = b'abc'
+        proxy._process_serial_data()
+        self.assertEqual(self._sent(), [b'abc', b'abc'])
+        self.assertEqual(proxy.read_stats['budget_exhausted'], 1)
+
+    def test_time_budget(self):
+        proxy = self._make_proxy(drain_time=0)
+        type(proxy._serial).in_waiting = PropertyMock(return_value=3)
+        proxy._serial.read.return_value = b'abc'
+        proxy._process_serial_data()
+        self.assertEqual(self._sent(), [b'abc'])
+
+    def test_empty_first_read_disconnects(self):
+        proxy = self._make_proxy()
+        serial_port = proxy._serial
+        type(serial_port).in_waiting = PropertyMock(return_value=0)
+        serial_port.read.return_value = b''
+        proxy._process_serial_data()
+        self.assertIsNone(proxy._serial)
+        self.server.close_connections.assert_called_once_with()
+        self.assertEqual(proxy.read_stats['reads'], 0)
+
+    def test_pooled_reader_drained(self):
+        """Chunks queued by reader pool are forwarded without copy"""
+        proxy = self._make_proxy(drain_bytes=4)
+        proxy._reader = PooledReader(proxy._serial, Mock(), Mock())
+        first = bytes(bytearray(b'abc'))
+        for chunk in (first, b'de', b'xyz'):
+            proxy._reader._chunks.append(chunk)
+        proxy._process_serial_data()
+        self.assertEqual(self._sent(), [b'abc', b'de'])
+        # budget exhausted, rest is processed in next loop iteration
+        proxy._reader._loop.call_later.assert_called_once_with(
+            0, proxy._reader._dispatch)
+        proxy._process_serial_data()
+        self.assertEqual(self._sent(), [b'abc', b'de', b'xyz'])
+        self.assertIs(self._sent()[0], first)
+        self.assertEqual(proxy.read_stats['max_reads_per_wakeup'], 2)
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+class TestSerialTxQueue(unittest.TestCase):
+    """Test non-blocking serial writes with backpressure to clients"""
+
+    def setUp(self):
+        import tty
+        self.master, slave = os.openpty()
+        tty.setraw(self.master)
+        os.set_blocking(self.master, False)
+        self.addCleanup(os.close, self.master)
+        self.addCleanup(os.close, slave)
+        self.manager = ServersManager()
+        self.manager.MAX_TIMEOUT = .01  # reader thread does not wake loop
+        self.addCleanup(self.manager.close)
+        self.proxy = SerialProxy({
+            'serial': {'port': os.ttyname(slave)},
+            'tx_buffer_limit': 4096,
+            'servers': [{
+                'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0}],
+        }, log=MagicMock())
+        self.manager.add_server(self.proxy)
+        self.server = self.proxy.servers[0]
+        self.client = socket.create_connection(
+            self.server._socket.getsockname())
+        self.addCleanup(self.client.close)
+        self._process_until(lambda: self.server.connections)
+
+    def _process_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            self.manager.process()
+
+    def _start_reader(self, size):
+        """Read pty master in thread (as device), return received data"""
+        received = bytearray()
+
+        def run():
+            deadline = time.monotonic() + 5
+            while len(received) < size and time.monotonic() < deadline:
+                try:
+                    received.extend(os.read(self.master, 65536))
+                except BlockingIOError:
+                    time.sleep(.001)
+        reader = threading.Thread(target=run)
+        reader.start()
+        self.addCleanup(reader.join)
+        return reader, received
+
+    def test_write(self):
+        reader, received = self._start_reader(5)
+        self.client.sendall(b'hello')
+        self._process_until(lambda: not reader.is_alive())
+        self.assertEqual(received, b'hello')
+        self.assertEqual(self.proxy.tx_stats['pending'], 0)
+
+    def test_backpressure(self):
+        payload = bytes(range(256)) * 4096  # 1 MiB
+        sender = threading.Thread(target=self.client.sendall, args=(payload,))
+        sender.start()
+        self.addCleanup(sender.join)
+        self._process_until(lambda: self.proxy.tx_stats['paused'])
+        con = self.server.connections[0]
+        # no read interest and no pending output: kept aside by manager
+        self.assertIn(con.socket(), self.manager._idle)
+        reader, received = self._start_reader(len(payload))
+        self._process_until(lambda: not reader.is_alive())
+        self.assertEqual(received, payload)
+        self.assertFalse(self.proxy.tx_stats['paused'])
+        self.assertEqual(
+            self.manager._selector.get_key(con.socket()).events,
+            selectors.EVENT_READ)
+
+    def test_pending_written_on_disconnect(self):
+        payload = b'x' * 200000
+
+        def send():
+            self.client.sendall(payload)
+            self.client.close()
+        sender = threading.Thread(target=send)
+        sender.start()
+        self.addCleanup(sender.join)
+        self._process_until(lambda: self.proxy.tx_stats['paused'])
+        reader, received = self._start_reader(len(payload))
+        self._process_until(lambda: not self.proxy.is_connected)
+        reader.join()
+        self.assertEqual(len(received), len(payload))
+
+    def test_close_timeout_without_blocking(self):
+        self.proxy.TX_CLOSE_TIMEOUT = .2
+        self.proxy._tx_limit = 1 << 20  # clients not paused
+        self.client.sendall(b'x' * 200000)
+        self.client.close()
+        start = time.monotonic()
+        self._process_until(lambda: not self.server.connections)
+        self.assertGreater(self.proxy.tx_stats['pending'], 0)
+        # device does not read, port stays open while loop keeps running
+        self.assertTrue(self.proxy.is_connected)
+        self._process_until(lambda: not self.proxy.is_connected)
+        self.assertGreaterEqual(time.monotonic() - start, .2)
+        self.assertEqual(self.proxy.tx_stats['pending'], 0)
+        self.proxy._log.warning.assert_called()
+
+    def test_client_during_close_keeps_port(self):
+        self.proxy._tx_limit = 1 << 20  # clients not paused
+        self.client.sendall(b'x' * 200000)
+        self.client.close()
+        self._process_until(lambda: not self.server.connections)
+        self.assertIsNotNone(self.proxy._tx_close_timer)
+        other = socket.create_connection(self.server._socket.getsockname())
+        self.addCleanup(other.close)
+        self._process_until(lambda: self.server.connections)
+        self.assertIsNone(self.proxy._tx_close_timer)
+        reader, received = self._start_reader(200000)
+        self._process_until(lambda: not reader.is_alive())
+        self.assertEqual(len(received), 200000)
+        self.assertTrue(self.proxy.is_connected)
+
+    def test_queue_limit(self):
+        # WebSocket client can not be paused, data over limit are dropped
+        self.proxy._tx = TxArbiter(limit=4 * 4096)
+        source = Mock()
+        for _ in range(100):
+            self.proxy.send(b'x' * 4096, source)
+        stats = self.proxy.tx_stats
+        self.assertLessEqual(stats['pending'], 4 * 4096)
+        self.assertGreater(stats['dropped'], 0)
+        accepted = 100 * 4096 - stats['dropped']
+        reader, received = self._start_reader(accepted)
+        self._process_until(lambda: not reader.is_alive())
+        self.assertEqual(len(received), accepted)
+
+    def test_lock_owner(self):
+        self.proxy._tx = TxArbiter('lock')
+        other = socket.create_connection(self.server._socket.getsockname())
+        self.addCleanup(other.close)
+        self._process_until(lambda: len(self.server.connections) == 2)
+        reader, received = self._start_reader(5)
+        self.client.sendall(b'hello')
+        self._process_until(lambda: self.proxy.tx_stats['lock_owner'])
+        other.sendall(b'other')
+        self._process_until(lambda: self.proxy.tx_stats['dropped'])
+        self._process_until(lambda: not reader.is_alive())
+        self.assertEqual(received, b'hello')
+        owner = self.proxy.tx_stats['lock_owner']
+        self.assertEqual(owner, '%s:%d' % self.client.getsockname())
+        self.client.close()
+        self._process_until(lambda: len(self.server.connections) == 1)
+        self.assertIsNone(self.proxy.tx_stats['lock_owner'])
+
+
+class TestSerialCapture(unittest.TestCase):
+    """Test capture of TX/RX monitored data"""
+
+    def test_capture_records(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        proxy = SerialProxy({
+            'serial': {'port': '/dev/null'},
+            'capture': {'path': tmp.name},
+            'servers': [],
+        }, log=MagicMock())
+        proxy._notify_monitors(1, b'AT\r')
+        proxy._notify_monitors(2, memoryview(b'OK\r\n'))
+        self.assertEqual(proxy.capture_stats['path'], tmp.name)
+        proxy.close()
+        self.assertIsNone(proxy.capture_stats)
+        records = parse_records(read_range(tmp.name))
+        self.assertEqual(
+            [(rec[1], rec[2]) for rec in records],
+            [(1, b'AT\r'), (2, b'OK\r\n')])
+
+    def test_invalid_capture(self):
+        with self.assertRaises(ValueError):
+            SerialProxy({
+                'serial': {'port': '/dev/null'},
+                'capture': {'path': ''},
+                'servers': [],
+            }, log=MagicMock())
+
+
+class TestPortSettings(unittest.TestCase):
+    """Test settings of open port changed by clients (RFC 2217)"""
+
+    def setUp(self):
+        self.proxy = SerialProxy({
+            'serial': {'port': '/dev/null', 'baudrate': 9600},
+            'servers': [],
+        }, log=MagicMock())
+        self.proxy._serial = MagicMock()
+        self.proxy._serial.baudrate = 9600
+
+    def test_closed_port_returns_config(self):
+        self.proxy._serial = None
+        self.assertEqual(self.proxy.set_port_setting('baudrate', 300), 9600)
+
+    def test_set(self):
+        self.assertEqual(
+            self.proxy.set_port_setting('baudrate', 115200), 115200)
+
+    def test_rejected_restored(self):
+        """Value not applied by port is not kept"""
+        values = [9600]
+
+        def set_baudrate(value):
+            values.append(value)
+            if value != 9600:
+                raise ValueError('invalid baudrate')
+        type(self.proxy._serial).baudrate = PropertyMock(
+            side_effect=lambda *args: set_baudrate(*args) if args
+            else values[-1])
+        self.assertEqual(self.proxy.set_port_setting('baudrate', 7), 9600)
+
+    def test_set_dtr_error(self):
+        def dtr(*args):
+            if args:
+                raise OSError(25, 'Inappropriate ioctl for device')
+            return False
+        type(self.proxy._serial).dtr = PropertyMock(side_effect=dtr)
+        self.proxy.set_dtr(True)
+        self.proxy._log.warning.assert_called()
+
+    def test_purge(self):
+        self.proxy._tx.push(b'queued')
+        self.proxy.purge(receive=True, transmit=True)
+        self.assertEqual(self.proxy.tx_stats['pending'], 0)
+        self.proxy._serial.reset_input_buffer.assert_called_once_with()
+        self.proxy._serial.reset_output_buffer.assert_called_once_with()
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+class TestSerialReconnect(unittest.TestCase):
+    """Test keep_open/reconnect of matched port, pty pair as USB device"""
+
+    def setUp(self):
+        self.devices = []
+        comports = patch(
+            'ser2tcp.port_inventory._list_ports.comports',
+            side_effect=lambda: self.devices)
+        comports.start()
+        self.addCleanup(comports.stop)
+        shared_inventory().invalidate()
+        self.manager = ServersManager()
+        self.manager.MAX_TIMEOUT = .01
+        self.addCleanup(self.manager.close)
+        self.master = None
+        self._plug()
+
+    def _plug(self):
+        """Create new pty pair and report it as USB device"""
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(master)
+        os.set_blocking(master, False)
+        self.addCleanup(os.close, slave)
+        self.master = master
+        self.devices[:] = [_make_port_info(
+            os.ttyname(slave), vid=0x0403, pid=0x6001, serial_number='X1')]
+
+    def _unplug(self):
+        os.close(self.master)
+        self.devices[:] = []
+
+    def _proxy(self, **config):
+        config.update({
+            'serial': {'match': {'serial_number': 'X1'}},
+            'servers': [{
+                'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0}],
+        })
+        proxy = SerialProxy(config, log=MagicMock())
+        self.manager.add_server(proxy)
+        return proxy
 
-    def test_read_sockets_uses_serial_directly(self):
-        """read_sockets() returns serial when no reader thread"""
-        proxy = self._make_proxy()
-        proxy._serial = MagicMock()
-        sockets = proxy.read_sockets()
-        self.assertIn(proxy._serial, sockets)
+    def _connect(self, proxy):
+        client = socket.create_connection(
+            proxy.servers[0]._socket.getsockname())
+        client.setblocking(False)
+        self.addCleanup(client.close)
+        self._process_until(lambda: proxy.servers[0].connections)
+        return client
+
+    def _process_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            self.manager.process()
+
+    def _receive(self, client, size):
+        received = bytearray()
+
+        def ready():
+            try:
+                received.extend(client.recv(size))
+            except BlockingIOError:
+                pass
+            return len(received) >= size
+        self._process_until(ready)
+        return bytes(received)
+
+    def _read_master(self, size):
+        received = bytearray()
+
+        def ready():
+            try:
+                received.extend(os.read(self.master, size))
+            except BlockingIOError:
+                pass
+            return len(received) >= size
+        self._process_until(ready)
+        return bytes(received)
+
+    def test_keep_open_without_clients(self):
+        proxy = self._proxy(keep_open=True)
+        self.assertTrue(proxy.is_connected)
+        self._unplug()
+        self._process_until(lambda: not proxy.is_connected)
+        self._plug()
+        shared_inventory()._changed()  # hotplug event
+        self.assertTrue(proxy.is_connected)
+        self.assertEqual(proxy.reconnect_stats['reopens'], 0)
+
+    def test_persistent_history_replay(self):
+        """Data read without clients are replayed to next client"""
+        proxy = self._proxy(persistent=True, history=8)
+        self.assertTrue(proxy.is_connected)
+        os.write(self.master, b'boot log: ok')
+        self._process_until(lambda: proxy._history.total == 8)
+        client = self._connect(proxy)
+        self.assertEqual(self._receive(client, 8), b' log: ok')
+        os.write(self.master, b'!')
+        self.assertEqual(self._receive(client, 1), b'!')
+        client.close()
+        self._process_until(lambda: not proxy.servers[0].connections)
+        self.assertTrue(proxy.is_connected)
+
+    def test_time_to_first_byte_after_replug(self):
+        proxy = self._proxy(reconnect=True)
+        client = self._connect(proxy)
+        os.write(self.master, b'before')
+        self.assertEqual(self._receive(client, 6), b'before')
+        self._unplug()
+        self._process_until(lambda: not proxy.is_connected)
+        self.assertTrue(proxy.reconnect_stats['waiting'])
+        client.sendall(b'queued')
+        self._process_until(lambda: proxy.tx_stats['pending'] == 6)
+        replug_time = time.monotonic()
+        self._plug()
+        shared_inventory()._changed()  # hotplug event
+        os.write(self.master, b'after')
+        self.assertEqual(self._receive(client, 5), b'after')
+        first_byte = time.monotonic() - replug_time
+        self.assertLess(first_byte, .5, f"time to first byte {first_byte}")
+        self.assertEqual(self._read_master(6), b'queued')
+        stats = proxy.reconnect_stats
+        self.assertFalse(stats['waiting'])
+        self.assertEqual(stats['reopens'], 1)
+
+    @patch.object(
+        PortInventory, 'has_monitor', new_callable=PropertyMock,
+        return_value=False)
+    def test_reconnect_by_timer(self, _has_monitor):
+        """Without hotplug events device is searched periodically"""
+        proxy = self._proxy(reconnect=True)
+        proxy.RECONNECT_INTERVAL = .02
+        client = self._connect(proxy)
+        self._unplug()
+        self._process_until(lambda: not proxy.is_connected)
+        self._plug()
+        self._process_until(lambda: proxy.is_connected)
+        os.write(self.master, b'data')
+        self.assertEqual(self._receive(client, 4), b'data')
+
+    def test_reconnect_timeout_closes_clients(self):
+        proxy = self._proxy(reconnect=True, reconnect_timeout=.05)
+        proxy.RECONNECT_INTERVAL = .02
+        client = self._connect(proxy)
+        self._unplug()
+        self._process_until(lambda: not proxy.servers[0].connections)
+        self.assertFalse(proxy.reconnect_stats['waiting'])
+        client.setblocking(True)
+        client.settimeout(5)
+        self.assertEqual(client.recv(10), b'')
+
+    def test_without_reconnect_clients_closed(self):
+        proxy = self._proxy()
+        self._connect(proxy)
+        self._unplug()
+        self._process_until(lambda: not proxy.servers[0].connections)
+        self.assertFalse(proxy.is_connected)
+        self.assertIsNone(proxy._reconnect_timer)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,469 @@
+"""Tests for Server accepting connections"""
+
+import errno
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from ser2tcp.connection_rfc2217 import ConnectionRfc2217
+from ser2tcp.serial_proxy import SerialProxy
+from ser2tcp.server import ConfigError, Server
+from ser2tcp.server_manager import ServersManager
+
+
+class ServerFixture(unittest.TestCase):
+    """Server on mock serial port with real client sockets, no tests"""
+
+    def setUp(self):
+        self.serial = Mock()
+        self.serial.connect.return_value = True
+        self.serial.can_add_connection.return_value = True
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+
+    def _server(self, protocol='tcp', **config):
+        config.update(
+            {'protocol': protocol, 'address': '127.0.0.1', 'port': 0})
+        server = Server(config, self.serial, log=Mock())
+        self.addCleanup(server.close)
+        return server
+
+    def _connect(self, server, count):
+        for _ in range(count):
+            self.clients.append(
+                socket.create_connection(server._socket.getsockname()))
+
+
+class TestAcceptBatch(ServerFixture):
+    def test_invalid_accept_batch(self):
+        for value in (-1, 1.5, True):
+            with self.assertRaises(ConfigError):
+                self._server(accept_batch=value)
+
+    def test_all_pending_accepted(self):
+        server = self._server()
+        self._connect(server, 20)
+        server._client_connect()
+        self.assertEqual(len(server.connections), 20)
+
+    def test_nothing_pending(self):
+        server = self._server()
+        server._client_connect()
+        self.assertEqual(server.connections, [])
+
+    def test_accept_batch_cap(self):
+        server = self._server(accept_batch=8)
+        self._connect(server, 20)
+        server._client_connect()
+        self.assertEqual(len(server.connections), 8)
+        server._client_connect()
+        server._client_connect()
+        self.assertEqual(len(server.connections), 20)
+
+    def test_rejected_clients_do_not_stop_batch(self):
+        server = self._server(max_connections=5)
+        self._connect(server, 10)
+        server._client_connect()
+        self.assertEqual(len(server.connections), 5)
+        for client in self.clients[5:]:
+            client.settimeout(5)
+            self.assertEqual(client.recv(1), b'')
+
+    def _accept_error(self, server, error):
+        """Make listener accept() fail with error"""
+        self.addCleanup(server._socket.close)
+        patcher = patch.object(server, '_socket')
+        sock = patcher.start()
+        self.addCleanup(patcher.stop)
+        sock.accept.side_effect = OSError(error, os.strerror(error))
+        return sock
+
+    def test_emfile_pauses_listener(self):
+        server = self._server()
+        loop = Mock()
+        server.attach(loop)
+        sock = self._accept_error(server, errno.EMFILE)
+        server._client_connect()
+        loop.set_read.assert_called_once_with(sock, False)
+        loop.call_later.assert_called_once_with(
+            server.ACCEPT_RETRY, server._resume_accept)
+        server._client_connect()  # already paused
+        loop.call_later.assert_called_once()
+        server._resume_accept()
+        loop.set_read.assert_called_with(sock, True)
+
+    def test_emfile_warning_rate_limited(self):
+        server = self._server()
+        server.attach(Mock())
+        self._accept_error(server, errno.EMFILE)
+        for _ in range(5):
+            server._client_connect()
+            server._resume_accept()
+        server._log.warning.assert_called_once()
+
+    def test_emfile_without_loop(self):
+        server = self._server()
+        sock = self._accept_error(server, errno.ENFILE)
+        self.assertIn(sock, server.read_sockets())
+        server._client_connect()
+        self.assertNotIn(sock, server.read_sockets())
+        server._accept_resume = 0.
+        self.assertIn(sock, server.read_sockets())
+
+    def test_read_timeout_removes_connection(self):
+        server = self._server()
+        self._connect(server, 1)
+        server._client_connect()
+        con = server.connections[0]
+        self.addCleanup(con.socket().close)
+        with patch.object(con, '_socket') as sock:
+            sock.recv_into.side_effect = TimeoutError(
+                errno.ETIMEDOUT, 'Connection timed out')
+            server._read_connection(con)
+        self.assertEqual(server.connections, [])
+        sock.close.assert_called_once_with()
+        self.serial.disconnect.assert_called_once_with()
+
+    def test_write_timeout_removes_connection(self):
+        server = self._server()
+        self._connect(server, 1)
+        server._client_connect()
+        con = server.connections[0]
+        con.send(b'data')
+        self.addCleanup(con.socket().close)
+        with patch.object(con, '_socket') as sock:
+            sock.sendmsg.side_effect = TimeoutError(
+                errno.ETIMEDOUT, 'Connection timed out')
+            sock.send.side_effect = sock.sendmsg.side_effect
+            server._write_connection(con)
+        self.assertEqual(server.connections, [])
+
+    def test_accepted_socket_blocking(self):
+        server = self._server()
+        self._connect(server, 1)
+        server._client_connect()
+        self.assertTrue(server.connections[0].socket().getblocking())
+
+
+class TestTxPriority(ServerFixture):
+    def test_invalid_priority(self):
+        for value in (1.5, True, 'high'):
+            with self.assertRaises(ConfigError):
+                self._server(priority=value)
+
+    def test_priority_set_on_connection(self):
+        server = self._server(priority=3)
+        self._connect(server, 1)
+        server._client_connect()
+        self.assertEqual(server.connections[0].tx_priority, 3)
+
+    def test_lock_released_on_close(self):
+        server = self._server()
+        self._connect(server, 1)
+        server._client_connect()
+        con = server.connections[0]
+        server.close_connections()
+        self.serial.release.assert_called_once_with(con)
+
+
+class TestHistoryReplay(ServerFixture):
+    def test_history_replayed_to_new_connection(self):
+        self.serial.replay.side_effect = lambda send: send(b'history')
+        server = self._server()
+        self._connect(server, 1)
+        server._client_connect()
+        self.assertEqual(server.connections[0]._out_size, 7)
+
+    def test_replay_options(self):
+        server = self._server(replay={'bytes': 100, 'seconds': 5})
+        self._connect(server, 1)
+        server._client_connect()
+        self.serial.replay.assert_called_once_with(
+            server.connections[0].send, max_bytes=100, seconds=5)
+
+    def test_replay_limited_by_buffer(self):
+        server = self._server(buffer_limit=64)
+        self._connect(server, 1)
+        server._client_connect()
+        self.serial.replay.assert_called_once_with(
+            server.connections[0].send, max_bytes=64)
+
+    def test_replay_disabled(self):
+        server = self._server(replay=False)
+        self._connect(server, 1)
+        server._client_connect()
+        self.serial.replay.assert_not_called()
+
+    def test_invalid_replay(self):
+        for value in ('yes', {'bytes': -1}):
+            with self.assertRaises(ConfigError):
+                self._server(replay=value)
+
+    def test_no_replay_without_data(self):
+        server = self._server(data=False, control={'rts': True})
+        self._connect(server, 1)
+        server._client_connect()
+        self.serial.replay.assert_not_called()
+
+
+class TestBroadcastEncoding(ServerFixture):
+    def _broadcast(self, server, data):
+        """Send data to all connections, return last queued chunks"""
+        server._send_connections(data)
+        return [con._out_chunks[-1] for con in server.connections]
+
+    def test_raw_shared(self):
+        server = self._server()
+        self._connect(server, 3)
+        server._client_connect()
+        data = b'\xffraw'
+        for chunk in self._broadcast(server, data):
+            self.assertIs(chunk, data)
+
+    def test_telnet_escaped_once(self):
+        server = self._server('telnet')
+        self._connect(server, 30)
+        server._client_connect()
+        with patch(
+                'ser2tcp.connection_telnet.ConnectionTelnet.encode',
+                wraps=server.connections[0].encode) as encode:
+            chunks = self._broadcast(server, b'a\xffb')
+        encode.assert_called_once_with(b'a\xffb')
+        self.assertEqual(chunks[0], b'a\xff\xffb')
+        for chunk in chunks:
+            self.assertIs(chunk, chunks[0])
+
+    def test_control_escaped_once(self):
+        server = self._server(control={'rts': True})
+        self._connect(server, 5)
+        server._client_connect()
+        chunks = self._broadcast(server, b'\xff')
+        self.assertEqual(chunks[0], b'\xff\xff')
+        for chunk in chunks:
+            self.assertIs(chunk, chunks[0])
+
+    def test_control_without_data(self):
+        server = self._server(data=False, control={'rts': True})
+        self._connect(server, 2)
+        server._client_connect()
+        server._send_connections(b'data')
+        for con in server.connections:
+            self.assertEqual(con._out_size, 0)
+
+
+class TestRfc2217(ServerFixture):
+    def test_connection_class(self):
+        server = self._server('telnet', rfc2217=True)
+        self._connect(server, 1)
+        server._client_connect()
+        self.assertIsInstance(server.connections[0], ConnectionRfc2217)
+
+    def test_requires_telnet(self):
+        with self.assertRaises(ConfigError):
+            self._server(rfc2217=True)
+
+    def test_signal_report(self):
+        server = self._server('telnet', rfc2217=True)
+        self._connect(server, 1)
+        server._client_connect()
+        con = server.connections[0]
+        con.send_signal_report = Mock()
+        server.send_signal_report(4)
+        con.send_signal_report.assert_called_once_with(4)
+
+
+@unittest.skipUnless(shutil.which('openssl'), 'openssl not available')
+@unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+class TestSslHandshake(unittest.TestCase):
+    """TLS handshake of SSL clients does not block event loop"""
+
+    STALLED = 50
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.certfile = os.path.join(cls.tmp.name, 'server.crt')
+        cls.keyfile = os.path.join(cls.tmp.name, 'server.key')
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'ec',
+             '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes',
+             '-keyout', cls.keyfile, '-out', cls.certfile, '-days', '1',
+             '-subj', '/CN=localhost'],
+            check=True, capture_output=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.manager = ServersManager()
+        self.manager.MAX_TIMEOUT = .01
+        self.addCleanup(self.manager.close)
+        self.clients = []
+        self.addCleanup(self._close_clients)
+        self.ssl_proxy = self._proxy({
+            'protocol': 'ssl', 'address': '127.0.0.1', 'port': 0,
+            'ssl': {
+                'certfile': self.certfile, 'keyfile': self.keyfile,
+                'handshake_timeout': 2}})
+        self.ssl_server = self.ssl_proxy.servers[0]
+        self.tcp_proxy = self._proxy({
+            'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0})
+
+    def _close_clients(self):
+        for client in self.clients:
+            client.close()
+
+    def _proxy(self, server_config):
+        """Return proxy of new pty with one server"""
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(master)
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        proxy = SerialProxy({
+            'serial': {'port': os.ttyname(slave)},
+            'servers': [server_config],
+        }, log=MagicMock())
+        proxy.master = master
+        self.manager.add_server(proxy)
+        return proxy
+
+    def _connect(self, proxy):
+        client = socket.create_connection(
+            proxy.servers[0]._socket.getsockname())
+        client.settimeout(5)
+        self.clients.append(client)
+        return client
+
+    def _process_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            self.manager.process()
+
+    def _receive(self, client, size):
+        """Receive size bytes by non-blocking client while loop runs"""
+        client.setblocking(False)
+        data = bytearray()
+
+        def received():
+            try:
+                data.extend(client.recv(size - len(data)))
+            except (BlockingIOError, ssl.SSLWantReadError):
+                pass
+            return len(data) >= size
+        self._process_until(received)
+        return bytes(data)
+
+    def test_stalled_clients_do_not_block_other_port(self):
+        for index in range(self.STALLED):
+            client = self._connect(self.ssl_proxy)
+            if index % 2:
+                client.sendall(b'\x16\x03\x01')  # partial ClientHello
+        self._process_until(
+            lambda: len(self.ssl_server._handshakes) == self.STALLED)
+        self.assertFalse(self.ssl_proxy.is_connected)
+        client = self._connect(self.tcp_proxy)
+        self._process_until(lambda: self.tcp_proxy.servers[0].connections)
+        start = time.monotonic()
+        for _ in range(20):
+            os.write(self.tcp_proxy.master, b'ping')
+            self.assertEqual(self._receive(client, 4), b'ping')
+        elapsed = time.monotonic() - start
+        self.assertLess(elapsed, 1, f"20 round trips took {elapsed:.3f} s")
+        self.assertEqual(len(self.ssl_server._handshakes), self.STALLED)
+
+    def _tls_client(self):
+        """Return non-blocking TLS client after completed handshake"""
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.load_verify_locations(self.certfile)
+        client = context.wrap_socket(
+            self._connect(self.ssl_proxy), server_hostname='localhost',
+            do_handshake_on_connect=False)
+        client.setblocking(False)
+        self.clients.append(client)
+
+        def handshake():
+            try:
+                client.do_handshake()
+            except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                return False
+            return True
+        self._process_until(handshake)
+        return client
+
+    def test_client_connects_while_others_stall(self):
+        for _ in range(self.STALLED):
+            self._connect(self.ssl_proxy)
+        client = self._tls_client()
+        self._process_until(lambda: self.ssl_server.connections)
+        self.assertEqual(len(self.ssl_server._handshakes), self.STALLED)
+        os.write(self.ssl_proxy.master, b'secure')
+        self.assertEqual(self._receive(client, 6), b'secure')
+
+    def test_partial_record_does_not_block(self):
+        client = self._tls_client()
+        self._process_until(lambda: self.ssl_server.connections)
+        con = self.ssl_server.connections[0]
+        self.assertFalse(con.socket().getblocking())
+        # header of application data record, body is not sent
+        os.write(client.fileno(), b'\x17\x03\x03\x00\x20')
+        for _ in range(5):
+            self.manager.process()
+        self.assertEqual(self.ssl_server.connections, [con])
+        os.write(self.ssl_proxy.master, b'alive')
+        self.assertEqual(self._receive(client, 5), b'alive')
+
+    def test_buffered_record_drained(self):
+        client = self._tls_client()
+        self._process_until(lambda: self.ssl_server.connections)
+        con = self.ssl_server.connections[0]
+        received = bytearray()
+        client.setblocking(True)
+        client.sendall(b'x' * 16384)  # one record, larger than read buffer
+        with patch.object(con, 'on_received', side_effect=received.extend):
+            deadline = time.monotonic() + 5
+            while not received:
+                self.assertLess(time.monotonic(), deadline)
+                self.ssl_server._read_connection(con)
+        self.assertEqual(len(received), 16384)
+
+    def test_handshake_timeout(self):
+        stalled = [self._connect(self.ssl_proxy) for _ in range(5)]
+        self._process_until(lambda: len(self.ssl_server._handshakes) == 5)
+        with patch('ser2tcp.server._time.monotonic',
+                   return_value=time.monotonic() + 10):
+            self.ssl_server.process_stale()
+        self.assertEqual(self.ssl_server._handshakes, {})
+        for client in stalled:
+            self.assertEqual(client.recv(1), b'')
+
+    def test_handshake_timer(self):
+        self.ssl_server._handshake_timeout = .05
+        client = self._connect(self.ssl_proxy)
+        self._process_until(lambda: self.ssl_server._handshakes)
+        self._process_until(lambda: not self.ssl_server._handshakes)
+        self.assertEqual(client.recv(1), b'')
+
+    def test_invalid_handshake_timeout(self):
+        for value in (0, -1, True, '5'):
+            with self.assertRaises(ConfigError):
+                Server({
+                    'protocol': 'ssl', 'address': '127.0.0.1', 'port': 0,
+                    'ssl': {
+                        'certfile': self.certfile, 'keyfile': self.keyfile,
+                        'handshake_timeout': value}}, Mock(), log=Mock())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,300 @@
+"""Tests for ServersManager event loop"""
+
+import selectors
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import ANY, Mock
+
+from ser2tcp.server import Server
+from ser2tcp.server_manager import ServersManager
+
+
+def _make_serial():
+    """Mock SerialProxy accepting all connections"""
+    ser = Mock()
+    ser.connect.return_value = True
+    ser.can_add_connection.return_value = True
+    return ser
+
+
+class TestRegistration(unittest.TestCase):
+    def setUp(self):
+        self.manager = ServersManager()
+        self.sock_a, self.sock_b = socket.socketpair()
+
+    def tearDown(self):
+        self.manager.close()
+        self.sock_a.close()
+        self.sock_b.close()
+
+    def _events(self, sock):
+        return self.manager._selector.get_key(sock).events
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            ServersManager('unknown')
+
+    def test_register_read(self):
+        self.manager.register(self.sock_a, Mock())
+        self.assertEqual(self._events(self.sock_a), selectors.EVENT_READ)
+
+    def test_set_write_toggles_interest(self):
+        self.manager.register(self.sock_a, Mock(), Mock())
+        self.manager.set_write(self.sock_a, True)
+        self.assertEqual(
+            self._events(self.sock_a),
+            selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self.manager.set_write(self.sock_a, False)
+        self.assertEqual(self._events(self.sock_a), selectors.EVENT_READ)
+
+    def test_set_read_pauses_reading(self):
+        on_read = Mock()
+        self.manager.register(self.sock_a, on_read, Mock())
+        self.manager.set_read(self.sock_a, False)
+        self.sock_b.send(b'x')
+        self.manager.MAX_TIMEOUT = .01
+        self.manager.process()
+        on_read.assert_not_called()
+        self.manager.set_read(self.sock_a, True)
+        self.manager.process()
+        on_read.assert_called_once_with()
+
+    def test_set_read_keeps_write_interest(self):
+        self.manager.register(self.sock_a, Mock(), Mock())
+        self.manager.set_write(self.sock_a, True)
+        self.manager.set_read(self.sock_a, False)
+        self.assertEqual(self._events(self.sock_a), selectors.EVENT_WRITE)
+        self.manager.set_write(self.sock_a, False)
+        self.manager.set_write(self.sock_a, True)
+        self.assertEqual(self._events(self.sock_a), selectors.EVENT_WRITE)
+
+    def test_unregister_paused(self):
+        self.manager.register(self.sock_a, Mock())
+        self.manager.set_read(self.sock_a, False)
+        self.manager.unregister(self.sock_a)
+        self.manager.set_read(self.sock_a, True)
+        with self.assertRaises(KeyError):
+            self._events(self.sock_a)
+
+    def test_set_write_unregistered_ignored(self):
+        self.manager.set_write(self.sock_a, True)
+
+    def test_unregister_twice(self):
+        self.manager.register(self.sock_a, Mock())
+        self.manager.unregister(self.sock_a)
+        self.manager.unregister(self.sock_a)
+
+    def test_dispatch_to_handler(self):
+        on_read = Mock()
+        on_write = Mock()
+        self.manager.register(self.sock_a, on_read, on_write)
+        self.sock_b.send(b'x')
+        self.manager.process()
+        on_read.assert_called_once_with()
+        on_write.assert_not_called()
+
+    def test_dispatch_write_handler(self):
+        on_read = Mock()
+        on_write = Mock()
+        self.manager.register(self.sock_a, on_read, on_write)
+        self.manager.set_write(self.sock_a, True)
+        self.manager.process()
+        on_read.assert_not_called()
+        on_write.assert_called_once_with()
+
+    def test_handler_unregistered_during_dispatch_skipped(self):
+        """Events of file object closed by earlier handler are dropped"""
+        calls = []
+
+        def on_read_a():
+            calls.append('a')
+            self.manager.unregister(self.sock_b)
+
+        def on_read_b():
+            calls.append('b')
+            self.manager.unregister(self.sock_a)
+
+        self.manager.register(self.sock_a, on_read_a)
+        self.manager.register(self.sock_b, on_read_b)
+        self.sock_a.send(b'x')
+        self.sock_b.send(b'x')
+        self.manager.process()
+        self.assertEqual(len(calls), 1)
+
+    def test_legacy_server_synced(self):
+        legacy = Mock(spec=[
+            'read_sockets', 'write_sockets', 'process_read',
+            'process_write', 'process_stale', 'close'])
+        legacy.read_sockets.return_value = [self.sock_a]
+        legacy.write_sockets.return_value = []
+        self.manager.add_server(legacy)
+        self.sock_b.send(b'x')
+        self.manager.process()
+        legacy.process_read.assert_called_once_with([self.sock_a])
+        legacy.read_sockets.return_value = []
+        self.manager.process()
+        with self.assertRaises(KeyError):
+            self.manager._selector.get_key(self.sock_a)
+
+
+class TestTimers(unittest.TestCase):
+    def setUp(self):
+        self.manager = ServersManager()
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_timers_run_in_deadline_order(self):
+        calls = []
+        self.manager.call_later(.02, calls.append, 'b')
+        self.manager.call_later(.01, calls.append, 'a')
+        for _ in range(10):
+            self.manager.process()
+            if len(calls) == 2:
+                break
+        self.assertEqual(calls, ['a', 'b'])
+
+    def test_cancelled_timer_not_called(self):
+        callback = Mock()
+        timer = self.manager.call_later(0, callback)
+        timer.cancel()
+        self.manager.process()
+        callback.assert_not_called()
+
+    def test_select_timeout_from_next_deadline(self):
+        self.assertEqual(
+            self.manager._select_timeout(), self.manager.MAX_TIMEOUT)
+        self.manager.call_later(.3, Mock())
+        timer = self.manager.call_later(.2, Mock())
+        self.assertAlmostEqual(
+            self.manager._select_timeout(), .2, delta=.05)
+        timer.cancel()
+        self.assertAlmostEqual(
+            self.manager._select_timeout(), .3, delta=.05)
+
+    def test_stop_wakes_select(self):
+        threading.Timer(.05, self.manager.stop).start()
+        start = time.monotonic()
+        self.manager.process()
+        self.assertLess(
+            time.monotonic() - start, self.manager.MAX_TIMEOUT / 2)
+
+    def test_call_soon_threadsafe(self):
+        calls = []
+
+        def run():
+            for i in range(3):
+                self.manager.call_soon_threadsafe(calls.append, i)
+        threading.Timer(.05, run).start()
+        start = time.monotonic()
+        while len(calls) < 3:
+            self.manager.process()
+        self.assertLess(
+            time.monotonic() - start, self.manager.MAX_TIMEOUT / 2)
+        self.assertEqual(calls, [0, 1, 2])
+
+    def test_call_soon_threadsafe_one_wakeup(self):
+        for _ in range(100):
+            self.manager.call_soon_threadsafe(Mock())
+        self.assertEqual(len(self.manager._wakeup_r.recv(100)), 1)
+
+    def test_legacy_process_stale_by_timer(self):
+        legacy = Mock(spec=[
+            'read_sockets', 'write_sockets', 'process_read',
+            'process_write', 'process_stale', 'close'])
+        legacy.read_sockets.return_value = []
+        legacy.write_sockets.return_value = []
+        self.manager.add_server(legacy)
+        self.manager.process()
+        legacy.process_stale.assert_called_once_with()
+
+    def test_attached_server_process_stale_not_called(self):
+        server = Mock(spec=['attach', 'process_stale', 'close'])
+        self.manager.add_server(server)
+        self.manager.call_later(.01, Mock())
+        self.manager.process()
+        server.process_stale.assert_not_called()
+
+
+class TestServerEventLoop(unittest.TestCase):
+    BACKEND = 'selectors'
+
+    def setUp(self):
+        self.manager = ServersManager(self.BACKEND)
+        self.serial = _make_serial()
+        self.server = Server(
+            {'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0},
+            self.serial, log=Mock())
+        self.manager.add_server(self.server)
+        self.client = socket.create_connection(
+            self.server._socket.getsockname())
+
+    def tearDown(self):
+        self.client.close()
+        self.manager.close()
+
+    def _accept(self):
+        for _ in range(10):
+            self.manager.process()
+            if self.server.connections:
+                return self.server.connections[0]
+        self.fail("Connection not accepted")
+
+    def test_accepted_connection_registered(self):
+        con = self._accept()
+        key = self.manager._selector.get_key(con.socket())
+        on_read, on_write = key.data
+        self.assertEqual(on_read.args, (con,))
+        self.assertEqual(on_write.args, (con,))
+        self.assertEqual(key.events, selectors.EVENT_READ)
+
+    def test_process_read_without_event_loop(self):
+        """List based interface looks up connection by socket"""
+        con = self._accept()
+        self.client.send(b'abc')
+        self.server.process_read([con.socket()])
+        self.serial.send.assert_called_once_with(b'abc', ANY, 0)
+
+    def test_received_data_forwarded(self):
+        self._accept()
+        self.client.send(b'hello')
+        for _ in range(10):
+            self.manager.process()
+            if self.serial.send.called:
+                break
+        self.serial.send.assert_called_once_with(b'hello', ANY, 0)
+
+    def test_write_interest_only_while_pending(self):
+        con = self._accept()
+        self.server.send(b'data')
+        self.assertEqual(
+            self.manager._selector.get_key(con.socket()).events,
+            selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self.manager.process()
+        self.assertFalse(con.has_pending_data())
+        self.assertEqual(
+            self.manager._selector.get_key(con.socket()).events,
+            selectors.EVENT_READ)
+        self.assertEqual(self.client.recv(16), b'data')
+
+    def test_disconnect_unregisters(self):
+        con = self._accept()
+        sock = con.socket()
+        self.client.close()
+        for _ in range(10):
+            self.manager.process()
+            if not self.server.connections:
+                break
+        self.assertFalse(self.server.connections)
+        with self.assertRaises((KeyError, ValueError)):
+            self.manager._selector.get_key(sock)
+
+
+class TestServerSelectBackend(TestServerEventLoop):
+    BACKEND = 'select'
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Tests for AsyncioServersManager"""
+
+import asyncio
+import socket
+import threading
+import unittest
+from unittest.mock import ANY, Mock, patch
+
+from ser2tcp.server import Server
+from ser2tcp.server_manager import ServersManager
+from ser2tcp.server_manager_asyncio import AsyncioServersManager
+
+
+def _make_serial():
+    """Mock SerialProxy accepting all connections"""
+    ser = Mock()
+    ser.connect.return_value = True
+    ser.can_add_connection.return_value = True
+    return ser
+
+
+class TestAsyncioServersManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = AsyncioServersManager(loop=asyncio.new_event_loop())
+        self.serial = _make_serial()
+        self.server = Server(
+            {'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0},
+            self.serial, log=Mock())
+        self.manager.add_server(self.server)
+        self.client = socket.create_connection(
+            self.server._socket.getsockname())
+
+    def tearDown(self):
+        self.client.close()
+        self.manager.close()
+        self.manager.loop.close()
+
+    def _process_until(self, condition):
+        for _ in range(20):
+            self.manager.process()
+            if condition():
+                return
+        self.fail("Condition not reached")
+
+    def _accept(self):
+        self._process_until(lambda: self.server.connections)
+        return self.server.connections[0]
+
+    def test_backend_name(self):
+        self.assertEqual(self.manager.backend, 'asyncio')
+
+    def test_base_state_initialized(self):
+        with patch.object(ServersManager, '_open_backend') as open_backend:
+            manager = AsyncioServersManager(loop=self.manager.loop)
+        open_backend.assert_not_called()  # overridden, not selector
+        self.assertEqual(manager._servers, [])
+        self.assertIsNone(manager._legacy_timer)
+
+    def test_received_data_forwarded(self):
+        self._accept()
+        self.client.send(b'hello')
+        self._process_until(lambda: self.serial.send.called)
+        self.serial.send.assert_called_once_with(b'hello', ANY, 0)
+
+    def test_send_flushed_by_writer(self):
+        con = self._accept()
+        self.server.send(b'data')
+        self._process_until(lambda: not con.has_pending_data())
+        self.assertEqual(self.client.recv(16), b'data')
+
+    def test_paused_reading(self):
+        self._accept()
+        self.server.pause_reading(True)
+        self.client.send(b'hello')
+        self.manager.MAX_TIMEOUT = .01
+        self.manager.process()
+        self.serial.send.assert_not_called()
+        self.server.pause_reading(False)
+        self._process_until(lambda: self.serial.send.called)
+        self.serial.send.assert_called_once_with(b'hello', ANY, 0)
+
+    def test_disconnect_unregisters(self):
+        con = self._accept()
+        sock = con.socket()
+        self.assertIn(sock, self.manager._handlers)
+        self.client.close()
+        self._process_until(lambda: not self.server.connections)
+        self.assertNotIn(sock, self.manager._handlers)
+
+    def test_legacy_server_synced(self):
+        sock_a, sock_b = socket.socketpair()
+        legacy = Mock(spec=[
+            'read_sockets', 'write_sockets', 'process_read',
+            'process_write', 'process_stale', 'close'])
+        legacy.read_sockets.return_value = [sock_a]
+        legacy.write_sockets.return_value = []
+        self.manager.add_server(legacy)
+        sock_b.send(b'x')
+        self._process_until(lambda: legacy.process_read.called)
+        legacy.process_read.assert_called_with([sock_a])
+        self.manager.remove_server(legacy)
+        self.assertNotIn(sock_a, self.manager._handlers)
+        sock_a.close()
+        sock_b.close()
+
+
+class TestAsyncioTimers(unittest.TestCase):
+    def setUp(self):
+        self.manager = AsyncioServersManager(loop=asyncio.new_event_loop())
+
+    def tearDown(self):
+        self.manager.close()
+        self.manager.loop.close()
+
+    def test_legacy_process_stale_by_timer(self):
+        legacy = Mock(spec=[
+            'read_sockets', 'write_sockets', 'process_read',
+            'process_write', 'process_stale', 'close'])
+        legacy.read_sockets.return_value = []
+        legacy.write_sockets.return_value = []
+        self.manager.add_server(legacy)
+        self.manager.loop.run_until_complete(
+            asyncio.sleep(self.manager.LEGACY_INTERVAL * 2.5))
+        self.assertGreaterEqual(legacy.process_stale.call_count, 2)
+
+    def test_call_soon_threadsafe(self):
+        callback = Mock()
+        threading.Timer(
+            .05, self.manager.call_soon_threadsafe, (callback, 1)).start()
+        self.manager.process()
+        callback.assert_called_once_with(1)
+
+    def test_call_later_uses_loop_clock(self):
+        timer = self.manager.call_later(10, Mock())
+        self.assertAlmostEqual(
+            timer.when(), self.manager.time() + 10, delta=1)
+        timer.cancel()
+
+
+class TestAsyncioEmbedding(unittest.TestCase):
+    def test_serve_until_stop(self):
+        """serve() can be awaited from existing asyncio application"""
+        async def main():
+            manager = AsyncioServersManager(
+                loop=asyncio.get_running_loop())
+            manager.add_server(server)
+            manager.call_later(.01, callback)
+            manager.call_later(.05, manager.stop)
+            await manager.serve()
+
+        server = Mock(spec=['attach', 'close'])
+        callback = Mock()
+        asyncio.run(main())
+        server.attach.assert_called_once()
+        callback.assert_called_once_with()
+        server.close.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
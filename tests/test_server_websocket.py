@@ -75,6 +75,14 @@ class TestConnections(unittest.TestCase):
         self.assertTrue(srv.has_connections())
         srv._serial.connect.assert_called_once()
 
+    def test_add_connection_replays_history(self):
+        srv = make_ws_server()
+        srv._serial.replay.side_effect = \
+            lambda send: [send(b'ab'), send(b'cd')]
+        client = make_ws_client()
+        srv.add_connection(client)
+        client.ws_send.assert_called_once_with(b'abcd')
+
     def test_add_connection_serial_fail(self):
         srv = make_ws_server()
         srv._serial.connect.return_value = False
@@ -192,7 +200,7 @@ class TestDataForwarding(unittest.TestCase):
         client.ws_is_text = False
         srv.add_connection(client)
         srv.process_message(client)
-        srv._serial.send.assert_called_with(b'\x01\x02\x03')
+        srv._serial.send.assert_called_with(b'\x01\x02\x03', client, 0)
 
     def test_receive_binary_ignored_when_data_disabled(self):
         srv = make_ws_server(
@@ -204,6 +212,22 @@ class TestDataForwarding(unittest.TestCase):
         srv.process_message(client)
         srv._serial.send.assert_not_called()
 
+    def test_send_throughput_one_frame(self):
+        srv = ServerWebSocket(
+            {'protocol': 'websocket', 'endpoint': 'test',
+                'mode': 'throughput'},
+            make_ws_server()._serial, log=Mock())
+        loop = Mock()
+        srv.attach(loop)
+        client = make_ws_client()
+        srv.add_connection(client)
+        srv.send(b'\x01')
+        srv.send(b'\x02')
+        client.ws_send.assert_not_called()
+        loop.call_later.assert_called_once()
+        srv._coalescer.flush()
+        client.ws_send.assert_called_once_with(b'\x01\x02')
+
     def test_send_removes_failed_connection(self):
         srv = make_ws_server()
         client = make_ws_client()
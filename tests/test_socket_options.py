@@ -0,0 +1,138 @@
+"""Tests for server socket options"""
+
+import os
+import socket
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from ser2tcp.server import ConfigError, Server
+from ser2tcp.socket_options import SocketOptions, validate_config
+
+
+def _tcp_config(**options):
+    return {
+        'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0,
+        'socket_options': options}
+
+
+class TestValidateConfig(unittest.TestCase):
+    def test_no_options(self):
+        self.assertIsNone(validate_config({'protocol': 'tcp'}))
+
+    def test_valid(self):
+        self.assertIsNone(validate_config(_tcp_config(
+            nodelay=False, sndbuf=65536, rcvbuf=65536, keepalive=True,
+            keepalive_idle=10, keepalive_interval=5, keepalive_count=3,
+            user_timeout=10000, backlog=128)))
+
+    def test_not_object(self):
+        self.assertIn('object', validate_config(
+            {'protocol': 'tcp', 'socket_options': []}))
+
+    def test_unknown_option(self):
+        self.assertIn('Unknown', validate_config(_tcp_config(linger=1)))
+
+    def test_invalid_values(self):
+        self.assertIn('nodelay', validate_config(_tcp_config(nodelay=1)))
+        self.assertIn('sndbuf', validate_config(_tcp_config(sndbuf=0)))
+        self.assertIn('backlog', validate_config(_tcp_config(backlog=True)))
+
+    def test_websocket(self):
+        self.assertIn('WEBSOCKET', validate_config({
+            'protocol': 'websocket', 'endpoint': 'a',
+            'socket_options': {}}))
+
+
+class TestSocketOptions(unittest.TestCase):
+    def test_defaults(self):
+        self.assertEqual(
+            SocketOptions(nodelay=True).as_dict(),
+            {'backlog': socket.SOMAXCONN, 'nodelay': True})
+
+    def test_nodelay_overrides_mode(self):
+        options = SocketOptions({'nodelay': False}, nodelay=True)
+        self.assertFalse(options.as_dict()['nodelay'])
+
+    def test_keepalive_implied(self):
+        options = SocketOptions({'keepalive_idle': 10})
+        self.assertTrue(options.as_dict()['keepalive'])
+
+    def test_unix_socket_drops_tcp_options(self):
+        options = SocketOptions(
+            {'nodelay': True, 'keepalive_idle': 10, 'sndbuf': 8192},
+            tcp=False)
+        self.assertEqual(
+            options.as_dict(), {'sndbuf': 8192, 'backlog': socket.SOMAXCONN})
+
+    def test_apply_error_logged(self):
+        log = Mock()
+        sock = Mock()
+        sock.setsockopt.side_effect = OSError('invalid')
+        SocketOptions({'sndbuf': 8192}, log=log).apply_client(sock)
+        log.warning.assert_called()
+
+
+class TestServerSocketOptions(unittest.TestCase):
+    def setUp(self):
+        self.serial = Mock()
+        self.serial.connect.return_value = True
+        self.serial.can_add_connection.return_value = True
+
+    def _accept(self, config):
+        server = Server(config, self.serial, log=Mock())
+        self.addCleanup(server.close)
+        client = socket.create_connection(server._socket.getsockname())
+        self.addCleanup(client.close)
+        server._client_connect()
+        return server, server.connections[0].socket()
+
+    def test_invalid_raises(self):
+        with self.assertRaises(ConfigError):
+            Server(_tcp_config(sndbuf=-1), self.serial, log=Mock())
+
+    def test_accepted_socket(self):
+        server, sock = self._accept(_tcp_config(
+            nodelay=False, sndbuf=32768, rcvbuf=32768,
+            keepalive_idle=30, keepalive_interval=5, keepalive_count=4,
+            user_timeout=7000))
+        self.assertFalse(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(
+            sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        # linux doubles requested buffer size for bookkeeping
+        self.assertGreaterEqual(
+            sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), 32768)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            self.assertEqual(
+                sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), 30)
+        self.assertEqual(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT), 4)
+        if hasattr(socket, 'TCP_USER_TIMEOUT'):
+            self.assertEqual(
+                sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT),
+                7000)
+        self.assertEqual(server.socket_options['user_timeout'], 7000)
+
+    def test_nodelay_default_latency(self):
+        server, sock = self._accept(
+            {'protocol': 'tcp', 'address': '127.0.0.1', 'port': 0})
+        self.assertTrue(
+            sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertEqual(
+            server.socket_options,
+            {'backlog': socket.SOMAXCONN, 'nodelay': True})
+
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), 'ser2tcp.sock')
+        self.addCleanup(os.rmdir, os.path.dirname(path))
+        server = Server({
+            'protocol': 'socket', 'address': path,
+            'socket_options': {'nodelay': True, 'backlog': 8}},
+            self.serial, log=Mock())
+        self.addCleanup(server.close)
+        self.assertEqual(server.socket_options, {'backlog': 8})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""Tests for TX arbiter policies"""
+
+import unittest
+from unittest.mock import patch
+
+from ser2tcp.tx_arbiter import TxArbiter, validate_config, validate_priority
+
+
+def _write(arbiter, size=None):
+    """Consume next view (or its first size bytes), return written data"""
+    view = arbiter.peek()
+    if size is not None:
+        view = view[:size]
+    arbiter.consume(len(view))
+    return bytes(view)
+
+
+class TestValidate(unittest.TestCase):
+    def test_valid(self):
+        self.assertIsNone(validate_config({}))
+        self.assertIsNone(validate_config(
+            {'tx_policy': 'lock', 'tx_lock_timeout': 1.5}))
+        self.assertIsNone(validate_priority({'priority': -3}))
+        self.assertIsNone(validate_config({'tx_queue_limit': 1024}))
+
+    def test_invalid(self):
+        self.assertIsNotNone(validate_config({'tx_policy': 'random'}))
+        for value in (0, -1, True, '5'):
+            self.assertIsNotNone(validate_config({'tx_lock_timeout': value}))
+        for value in (0, 1.5, True, '5'):
+            self.assertIsNotNone(validate_config({'tx_queue_limit': value}))
+        for value in (1.5, True, 'high'):
+            self.assertIsNotNone(validate_priority({'priority': value}))
+
+
+class TestFifo(unittest.TestCase):
+    def test_arrival_order(self):
+        arbiter = TxArbiter()
+        arbiter.push(b'a1', 'a')
+        arbiter.push(b'b1', 'b')
+        arbiter.push(b'a2', 'a')
+        self.assertEqual(arbiter.size, 6)
+        self.assertEqual(arbiter.pop_all(), b'a1b1a2')
+        self.assertEqual(arbiter.size, 0)
+        self.assertIsNone(arbiter.peek())
+
+    def test_partial_write(self):
+        arbiter = TxArbiter()
+        arbiter.push(b'hello')
+        self.assertEqual(_write(arbiter, 2), b'he')
+        self.assertEqual(arbiter.size, 3)
+        self.assertEqual(_write(arbiter), b'llo')
+
+    def test_limit(self):
+        arbiter = TxArbiter(limit=4)
+        self.assertTrue(arbiter.push(b'abc', 'a'))
+        self.assertFalse(arbiter.push(b'de', 'b'))
+        self.assertTrue(arbiter.push(b'd', 'b'))
+        self.assertEqual(arbiter.dropped, 2)
+        self.assertEqual(_write(arbiter, 2), b'ab')
+        self.assertTrue(arbiter.push(b'ef', 'b'))
+        self.assertEqual(arbiter.pop_all(), b'cdef')
+
+
+class TestRoundRobin(unittest.TestCase):
+    def test_turns(self):
+        arbiter = TxArbiter('round_robin')
+        quantum = TxArbiter.QUANTUM
+        arbiter.push(b'a' * quantum * 3, 'a')
+        arbiter.push(b'b' * quantum, 'b')
+        self.assertEqual(
+            arbiter.pop_all(),
+            b'a' * quantum + b'b' * quantum + b'a' * quantum * 2)
+
+    def test_turn_ends_after_partial_writes(self):
+        arbiter = TxArbiter('round_robin')
+        quantum = TxArbiter.QUANTUM
+        arbiter.push(b'a' * quantum * 2, 'a')
+        arbiter.push(b'b', 'b')
+        self.assertEqual(_write(arbiter, 100), b'a' * 100)
+        self.assertEqual(_write(arbiter), b'a' * (quantum - 100))
+        self.assertEqual(_write(arbiter), b'b')
+        self.assertEqual(_write(arbiter), b'a' * quantum)
+        self.assertEqual(arbiter.size, 0)
+
+
+class TestLock(unittest.TestCase):
+    def test_other_dropped(self):
+        arbiter = TxArbiter('lock')
+        self.assertTrue(arbiter.push(b'a', 'a'))
+        self.assertFalse(arbiter.push(b'bb', 'b'))
+        self.assertEqual(arbiter.owner, 'a')
+        self.assertEqual(arbiter.dropped, 2)
+        self.assertEqual(arbiter.pop_all(), b'a')
+
+    def test_release(self):
+        arbiter = TxArbiter('lock')
+        arbiter.push(b'a', 'a')
+        arbiter.release('b')
+        self.assertEqual(arbiter.owner, 'a')
+        arbiter.release('a')
+        self.assertIsNone(arbiter.owner)
+        self.assertTrue(arbiter.push(b'b', 'b'))
+        self.assertEqual(arbiter.owner, 'b')
+
+    def test_timeout(self):
+        arbiter = TxArbiter('lock', lock_timeout=2)
+        with patch('ser2tcp.tx_arbiter._time.monotonic', return_value=10.):
+            arbiter.push(b'a', 'a')
+        with patch('ser2tcp.tx_arbiter._time.monotonic', return_value=11.):
+            self.assertFalse(arbiter.push(b'b', 'b'))
+            self.assertTrue(arbiter.push(b'a', 'a'))
+        with patch('ser2tcp.tx_arbiter._time.monotonic', return_value=12.5):
+            self.assertFalse(arbiter.push(b'b', 'b'))
+        with patch('ser2tcp.tx_arbiter._time.monotonic', return_value=13.5):
+            self.assertTrue(arbiter.push(b'b', 'b'))
+            self.assertEqual(arbiter.owner, 'b')
+
+
+class TestPriority(unittest.TestCase):
+    def test_highest_first(self):
+        arbiter = TxArbiter('priority')
+        arbiter.push(b'low', 'low', 0)
+        arbiter.push(b'high', 'high', 5)
+        arbiter.push(b'mid', 'mid', 1)
+        self.assertEqual(arbiter.pop_all(), b'highmidlow')
+
+    def test_new_high_priority_preempts_after_turn(self):
+        arbiter = TxArbiter('priority')
+        quantum = TxArbiter.QUANTUM
+        arbiter.push(b'l' * quantum * 2, 'low', 0)
+        self.assertEqual(_write(arbiter, 10), b'l' * 10)
+        arbiter.push(b'h', 'high', 1)
+        self.assertEqual(_write(arbiter), b'l' * (quantum - 10))
+        self.assertEqual(_write(arbiter), b'h')
+        self.assertEqual(_write(arbiter), b'l' * quantum)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,277 @@
+"""Tests for worker processes"""
+
+import logging
+import os
+import socket
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from ser2tcp.main import find_free_port
+from ser2tcp.serial_proxy import SerialProxy
+from ser2tcp.server_manager import ServersManager
+from ser2tcp.worker import RemoteSerialProxy, Worker, WorkerPool, \
+    is_local_port
+
+
+def _port_config(port, device='/dev/null', name='test'):
+    return {
+        'name': name,
+        'serial': {'port': device, 'baudrate': 115200},
+        'servers': [{
+            'protocol': 'tcp', 'address': '127.0.0.1', 'port': port}],
+    }
+
+
+class TestIsLocalPort(unittest.TestCase):
+    def test_tcp_is_remote(self):
+        self.assertFalse(is_local_port(_port_config(10001)))
+
+    def test_websocket_is_local(self):
+        config = _port_config(10001)
+        config['servers'].append(
+            {'protocol': 'websocket', 'endpoint': 'ws'})
+        self.assertTrue(is_local_port(config))
+
+
+class TestWorker(unittest.TestCase):
+    def setUp(self):
+        self.worker = Worker(0, log=logging.getLogger(__name__))
+
+    def tearDown(self):
+        self.worker.close()
+
+    def _open_pty(self):
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(master)
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        return master, os.ttyname(slave)
+
+    def _process_until(self, condition):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            self.worker._process_messages()
+            if condition():
+                return
+            time.sleep(.02)
+        self.fail("Condition not reached")
+
+    def test_create_port(self):
+        proxy = self.worker.create_port(_port_config(find_free_port()))
+        self.assertIsInstance(proxy, RemoteSerialProxy)
+        self.assertEqual(proxy.name, 'test')
+        self.assertEqual(proxy.serial_config['port'], '/dev/null')
+        self.assertFalse(proxy.is_connected)
+        self.assertEqual(proxy.servers[0].protocol, 'TCP')
+        self.assertEqual(proxy.servers[0].connections, [])
+        self.assertEqual(proxy.read_stats['reads'], 0)
+        self.assertEqual(proxy.tx_stats, {
+            'pending': 0, 'paused': False, 'policy': 'fifo',
+            'lock_owner': None, 'dropped': 0})
+        self.assertFalse(proxy.reconnect_stats['waiting'])
+        self.assertEqual(self.worker.ports_count, 1)
+
+    def test_create_port_error(self):
+        config = _port_config(find_free_port())
+        config['servers'][0]['protocol'] = 'unknown'
+        with self.assertRaises(ValueError):
+            self.worker.create_port(config)
+        self.assertEqual(self.worker.ports_count, 0)
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+    def test_client_served_by_worker(self):
+        master, device = self._open_pty()
+        port = find_free_port()
+        proxy = self.worker.create_port(_port_config(port, device))
+        client = socket.create_connection(('127.0.0.1', port), timeout=5)
+        try:
+            client.sendall(b'hello')
+            self.assertEqual(os.read(master, 16), b'hello')
+            os.write(master, b'world')
+            self.assertEqual(client.recv(16), b'world')
+            self._process_until(lambda: proxy.servers[0].connections)
+            self.assertTrue(proxy.is_connected)
+            con = proxy.servers[0].connections[0]
+            self.assertEqual(
+                con.address_str(),
+                '%s:%d' % client.getsockname())
+            proxy.servers[0]._remove_connection(con)
+            self.assertEqual(client.recv(16), b'')
+        finally:
+            client.close()
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+    def test_history_from_worker(self):
+        master, device = self._open_pty()
+        port = find_free_port()
+        config = _port_config(port, device)
+        config['history'] = 64
+        proxy = self.worker.create_port(config)
+        client = socket.create_connection(('127.0.0.1', port), timeout=5)
+        try:
+            client.sendall(b'x')
+            self.assertEqual(os.read(master, 16), b'x')
+            os.write(master, b'boot ok')
+            self.assertEqual(client.recv(16), b'boot ok')
+        finally:
+            client.close()
+        self.assertEqual(proxy.history_data(), b'boot ok')
+        self.assertEqual(proxy.history_data(max_bytes=2), b'ok')
+        self._process_until(lambda: proxy.history_stats['bytes'] == 7)
+
+    def test_delete_port_releases_socket(self):
+        port = find_free_port()
+        proxy = self.worker.create_port(_port_config(port))
+        proxy.close()
+        self.assertEqual(self.worker.ports_count, 0)
+        # port can be created again immediately after delete
+        proxy = self.worker.create_port(_port_config(port))
+        self.assertEqual(self.worker.ports_count, 1)
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'pty not available')
+    def test_monitor_forwarded(self):
+        master, device = self._open_pty()
+        port = find_free_port()
+        proxy = self.worker.create_port(_port_config(port, device))
+        callback = Mock()
+        proxy.add_monitor(callback)
+        client = socket.create_connection(('127.0.0.1', port), timeout=5)
+        try:
+            client.sendall(b'abc')
+            self.assertEqual(os.read(master, 16), b'abc')
+            os.write(master, b'xyz')
+            self.assertEqual(client.recv(16), b'xyz')
+            self._process_until(lambda: callback.call_count >= 2)
+        finally:
+            client.close()
+        self.assertEqual(
+            [call.args[1] for call in callback.call_args_list],
+            [b'abc', b'xyz'])
+
+    def test_request_async(self):
+        proxy = self.worker.create_port(_port_config(find_free_port()))
+        callback = Mock()
+        self.worker.request_async(
+            'disconnect', proxy.port_id, 0, '1.2.3.4:5', callback=callback)
+        self._process_until(lambda: callback.called)
+        error, snapshot = callback.call_args.args
+        self.assertEqual(str(error), 'Connection not found')
+        self.assertIsNone(snapshot)
+
+    def test_request_timeout_keeps_worker(self):
+        proxy = self.worker.create_port(_port_config(find_free_port()))
+        with self.assertRaises(TimeoutError):
+            self.worker.request('history', proxy.port_id, None, None, None,
+                                timeout=0)
+        self.assertTrue(self.worker.is_alive)
+        # late reply of timed out request is ignored
+        self.assertEqual(proxy.history_data(), b'')
+
+    def test_create_port_timeout_deletes_port(self):
+        port = find_free_port()
+        with patch('ser2tcp.worker.PORT_TIMEOUT', 0):
+            with self.assertRaises(TimeoutError):
+                self.worker.create_port(_port_config(port))
+        self.assertEqual(self.worker.ports_count, 0)
+        # port created by late add was deleted, address is free again
+        proxy = self.worker.create_port(_port_config(port))
+        self.assertEqual(proxy.servers[0].config['port'], port)
+
+    def _attach_loop(self):
+        manager = ServersManager()
+        manager.MAX_TIMEOUT = .01
+        self.addCleanup(manager.close)
+        self.worker.attach(manager)
+        return manager
+
+    def _process_loop_until(self, manager, condition):
+        deadline = time.time() + 5
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            manager.process()
+
+    def test_create_and_delete_port_async(self):
+        manager = self._attach_loop()
+        created = Mock()
+        self.worker.create_port_async(
+            _port_config(find_free_port()), created)
+        self._process_loop_until(manager, lambda: created.called)
+        error, proxy = created.call_args.args
+        self.assertIsNone(error)
+        self.assertIsInstance(proxy, RemoteSerialProxy)
+        self.assertEqual(self.worker.ports_count, 1)
+        closed = Mock()
+        proxy.close_async(closed)
+        self._process_loop_until(manager, lambda: closed.called)
+        closed.assert_called_once_with(None)
+        self.assertEqual(self.worker.ports_count, 0)
+
+    def test_create_port_async_error(self):
+        manager = self._attach_loop()
+        config = _port_config(find_free_port())
+        config['servers'][0]['protocol'] = 'unknown'
+        created = Mock()
+        self.worker.create_port_async(config, created)
+        self._process_loop_until(manager, lambda: created.called)
+        error, proxy = created.call_args.args
+        self.assertIsInstance(error, ValueError)
+        self.assertIsNone(proxy)
+
+    def test_create_port_async_timeout(self):
+        manager = self._attach_loop()
+        port = find_free_port()
+        created = Mock()
+        with patch('ser2tcp.worker.PORT_TIMEOUT', 0):
+            self.worker.create_port_async(_port_config(port), created)
+        manager._run_timers()  # timer expires before reply is read
+        created.assert_called_once()
+        self.assertIsInstance(created.call_args.args[0], TimeoutError)
+        self.assertEqual(self.worker.ports_count, 0)
+        # late add is deleted, address is free again
+        self.worker.create_port(_port_config(port))
+
+    def test_pending_request_fails_when_worker_dies(self):
+        self._attach_loop()
+        callback = Mock()
+        self.worker.request_async(
+            'history', 0, None, None, None, callback=callback)
+        self.worker.close()
+        self.assertIsInstance(callback.call_args.args[0], OSError)
+
+    def test_closed_worker(self):
+        proxy = self.worker.create_port(_port_config(find_free_port()))
+        self.worker.close()
+        self.assertFalse(self.worker.is_alive)
+        self.assertFalse(proxy.is_connected)
+        with self.assertRaises(OSError):
+            self.worker.create_port(_port_config(find_free_port()))
+        proxy.close()
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(2, log=logging.getLogger(__name__))
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_ports_distributed(self):
+        for _ in range(4):
+            self.pool.create_proxy(_port_config(find_free_port()))
+        self.assertEqual(
+            [w.ports_count for w in self.pool.workers], [2, 2])
+
+    def test_websocket_port_local(self):
+        config = _port_config(find_free_port())
+        config['servers'] = [{'protocol': 'websocket', 'endpoint': 'ws'}]
+        proxy = self.pool.create_proxy(config)
+        self.assertIsInstance(proxy, SerialProxy)
+        self.assertEqual(
+            [w.ports_count for w in self.pool.workers], [0, 0])
+        proxy.close()
+
+
+if __name__ == "__main__":
+    unittest.main()